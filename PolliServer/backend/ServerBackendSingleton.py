@@ -1,27 +1,66 @@
 # PolliServer/backend/ServerBackendSingleton.py
 from sqlalchemy.ext.asyncio import create_async_engine
-from sqlalchemy.ext.asyncio import async_sessionmaker
+from PolliServer.constants import *
+from PolliServer.backend.dialects import connection_string, is_in_memory
+from PolliServer.backend.pool import resolve_pool_config, engine_options, enable_sqlite_wal
+from PolliServer.backend.profiling import QueryProfilerSingleton
+from PolliServer.backend.replicas import DatabaseNode, ReplicaRouter
 from PolliServer.logger.logger import LoggerSingleton
+from models.models import Base
 
 logger = LoggerSingleton().get_logger()
 
+
+def create_node(name: str, role: str, db_config: dict, unhealthy_cooldown: float) -> DatabaseNode:
+    async_connection_string = connection_string(db_config)
+    logger.info(f"Async Backend connection string ({name}): {async_connection_string}")
+    pool_config = resolve_pool_config(db_config)
+    db_type = db_config.get('type', 'mysql')
+    engine = create_async_engine(async_connection_string, **engine_options(pool_config, db_type, is_in_memory(db_config)))
+    if db_type == 'sqlite' and not is_in_memory(db_config):
+        enable_sqlite_wal(engine)
+    QueryProfilerSingleton().attach(name, engine)
+    return DatabaseNode(name, role, engine, pool_config, unhealthy_cooldown)
+
+
 class ServerBackendSingleton:
+    """
+    The primary database, plus optional read replicas behind a ReplicaRouter.
+
+    `async_sessionmaker` / `engine` always refer to the primary (writes, background tasks);
+    read-only endpoints take sessions from `read_node()`, which is the primary if there are no replicas.
+    """
     _instance = None
     _async_sessionmaker = None
+    _engine = None
+    _primary = None
+    _router = None
+    _create_tables = False
 
-    def __new__(cls, db_config=None):
+    def __new__(cls, db_config=None, replica_configs=None, routing_config=None):
         if cls._instance is None:
             logger.info("Creating a new ServerBackendSingleton instance...")
 
             cls._instance = super(ServerBackendSingleton, cls).__new__(cls)
             if db_config:
-                async_connection_string = f"mysql+aiomysql://{db_config['user']}:{db_config['password']}@{db_config['address']}:{db_config['port']}/{db_config['database']}"
-                logger.info(f"Async Backend connection string: {async_connection_string}")
-
+                routing_config = routing_config or {}
+                cooldown = routing_config.get('unhealthy_cooldown_seconds', REPLICA_UNHEALTHY_COOLDOWN_SECONDS)
                 try:
-                    engine = create_async_engine(async_connection_string, echo=True)
-                    cls._instance._async_sessionmaker = async_sessionmaker(engine, expire_on_commit=False)
-                    logger.info("Successfully created async sessionmaker!")
+                    primary = create_node('primary', 'primary', db_config, cooldown)
+                    replicas = [create_node(replica_config.get('name') or f"replica{i}", 'replica', replica_config, cooldown)
+                                for i, replica_config in enumerate(replica_configs or [], start=1)]
+                    cls._instance._primary = primary
+                    cls._instance._create_tables = db_config.get('create_tables', db_config.get('type') == 'sqlite')
+                    cls._instance._engine = primary.engine
+                    cls._instance._async_sessionmaker = primary.sessionmaker
+                    cls._instance._router = ReplicaRouter(
+                        primary, replicas,
+                        strategy=routing_config.get('strategy', REPLICA_ROUTING_STRATEGY),
+                        max_staleness=routing_config.get('max_staleness_seconds', REPLICA_MAX_STALENESS_SECONDS),
+                        swarm_status_max_staleness=routing_config.get('swarm_status_max_staleness_seconds',
+                                                                      REPLICA_SWARM_STATUS_MAX_STALENESS_SECONDS),
+                        probe_interval=routing_config.get('probe_interval_seconds', REPLICA_PROBE_INTERVAL_SECONDS))
+                    logger.info(f"Successfully created async sessionmaker! ({len(replicas)} read replicas)")
                 except Exception as e:
                     logger.error(f"Failed to create async sessionmaker. Error: {e}")
 
@@ -30,3 +69,59 @@ class ServerBackendSingleton:
     @property
     def async_sessionmaker(self):
         return self._async_sessionmaker
+
+    @property
+    def engine(self):
+        return self._engine
+
+    @property
+    def primary(self):
+        return self._primary
+
+    @property
+    def router(self):
+        return self._router
+
+    def read_node(self, max_staleness=None):
+        """The database node to read from (see ReplicaRouter.choose)."""
+        return self._router.choose(max_staleness)
+
+    def read_sessionmaker(self, max_staleness=None):
+        """Sessionmaker for a read-only session outside of get_db (e.g. streamed responses)."""
+        return self.read_node(max_staleness).sessionmaker
+
+    def nodes(self):
+        return [self._primary] + self._router.replicas
+
+    async def create_tables(self):
+        """
+        Creates any missing tables on the primary, if its config asks for it ('create_tables', default
+        true for SQLite only): a local SQLite database starts out empty, whereas MySQL tables belong to PolliOS.
+        """
+        if self._primary is None or not self._create_tables:
+            return
+        async with self._engine.begin() as connection:
+            await connection.run_sync(Base.metadata.create_all)
+        logger.server_info("Created missing tables on the primary database")
+
+    async def warm_up(self):
+        """Pre-opens the configured number of pool connections on every database, so the first requests do not pay for connecting."""
+        if self._primary is None:
+            return 0
+        return sum([await node.warm_up() for node in self.nodes()])
+
+    async def dispose(self):
+        """Closes every database's pooled connections."""
+        if self._primary is None:
+            return
+        for node in self.nodes():
+            await node.engine.dispose()
+
+    def pool_status(self):
+        """Per-database pool status and health, and the replica routing stats."""
+        if self._primary is None:
+            return None
+        return {
+            'databases': {node.name: node.pool_status() for node in self.nodes()},
+            'routing': self._router.stats(),
+        }
@@ -0,0 +1,100 @@
+# PolliServer/backend/dialects.py
+from sqlalchemy import Integer, cast, func
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import FunctionElement
+
+# Database types accepted in the 'databases' section of the backend YAML
+SUPPORTED_DATABASE_TYPES = ('mysql', 'sqlite')
+
+# SQLite's default limit on the number of SELECTs in one UNION (SQLITE_MAX_COMPOUND_SELECT)
+SQLITE_MAX_COMPOUND_SELECT = 500
+
+
+def connection_string(db_config: dict) -> str:
+    """
+    SQLAlchemy async URL for a database entry. SQLite entries take a 'path' (a file, or ':memory:',
+    the default) instead of address/port/user/password/database.
+    """
+    if db_config.get('type') == 'sqlite':
+        path = db_config.get('path') or ':memory:'
+        return 'sqlite+aiosqlite://' if path == ':memory:' else f"sqlite+aiosqlite:///{path}"
+    return f"mysql+aiomysql://{db_config['user']}:{db_config['password']}@{db_config['address']}:{db_config['port']}/{db_config['database']}"
+
+
+def is_in_memory(db_config: dict) -> bool:
+    return db_config.get('type') == 'sqlite' and (db_config.get('path') or ':memory:') == ':memory:'
+
+
+def dialect_name(db) -> str:
+    """'mysql' or 'sqlite', for an AsyncSession or (async) engine."""
+    return db.bind.dialect.name if hasattr(db, 'bind') else db.dialect.name
+
+
+def upsert(db, table):
+    """The dialect's INSERT construct supporting upserts, for an AsyncSession's database."""
+    return sqlite_insert(table) if dialect_name(db) == 'sqlite' else mysql_insert(table)
+
+
+# --- Portable SQL functions --- #
+# The grabbers bin timestamps with integer microsecond arithmetic in SQL. MySQL has functions for
+# this; SQLite (which stores DateTime columns as 'YYYY-MM-DD HH:MM:SS.ffffff' text) does not.
+
+class microseconds_between(FunctionElement):
+    """Microseconds from the first datetime argument to the second (second - first), as an integer."""
+    type = Integer()
+    inherit_cache = True
+
+
+@compiles(microseconds_between)
+def _microseconds_between_default(element, compiler, **kw):
+    # MySQL: TIMESTAMPDIFF(MICROSECOND, start, ts). Independent of the session time zone.
+    start, timestamp = list(element.clauses)
+    return f"TIMESTAMPDIFF(MICROSECOND, {compiler.process(start, **kw)}, {compiler.process(timestamp, **kw)})"
+
+
+def _sqlite_epoch_microseconds(timestamp):
+    # Whole seconds from strftime('%s'), plus the 6-digit fraction SQLAlchemy stores after the seconds.
+    # strftime gets the text without the fraction: it rounds to milliseconds first, so e.g. ':59.9996' would count as the next second.
+    return cast(func.strftime('%s', func.substr(timestamp, 1, 19)), Integer) * 1000000 + cast(func.substr(timestamp, 21, 6), Integer)
+
+
+@compiles(microseconds_between, 'sqlite')
+def _microseconds_between_sqlite(element, compiler, **kw):
+    start, timestamp = list(element.clauses)
+    return compiler.process(_sqlite_epoch_microseconds(timestamp) - _sqlite_epoch_microseconds(start), **kw)
+
+
+class floor_div(FunctionElement):
+    """FLOOR(a / b) for non-negative a and positive b, as an integer."""
+    type = Integer()
+    inherit_cache = True
+
+
+@compiles(floor_div)
+def _floor_div_default(element, compiler, **kw):
+    numerator, denominator = list(element.clauses)
+    return f"FLOOR({compiler.process(numerator, **kw)} / {compiler.process(denominator, **kw)})"
+
+
+@compiles(floor_div, 'sqlite')
+def _floor_div_sqlite(element, compiler, **kw):
+    # Integer division truncates, which is the floor for non-negative operands
+    numerator, denominator = list(element.clauses)
+    return f"(CAST({compiler.process(numerator, **kw)} AS INTEGER) / CAST({compiler.process(denominator, **kw)} AS INTEGER))"
+
+
+class least(FunctionElement):
+    """Smallest of the arguments (LEAST in MySQL, multi-argument MIN in SQLite)."""
+    inherit_cache = True
+
+
+@compiles(least)
+def _least_default(element, compiler, **kw):
+    return f"LEAST({compiler.process(element.clauses, **kw)})"
+
+
+@compiles(least, 'sqlite')
+def _least_sqlite(element, compiler, **kw):
+    return f"MIN({compiler.process(element.clauses, **kw)})"
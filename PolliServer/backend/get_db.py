@@ -1,8 +1,44 @@
 # PolliServer/backend/get_db.py
+from sqlalchemy.exc import DBAPIError, TimeoutError as PoolTimeoutError
+
 from PolliServer.backend.ServerBackendSingleton import ServerBackendSingleton
+from PolliServer.backend.pool import timed_connection
+
+
+async def _read_session(max_staleness=None):
+    backend = ServerBackendSingleton()
+    node = backend.read_node(max_staleness)
+    session = node.sessionmaker()
+    try:
+        await timed_connection(session, node.pool_stats)
+    except (DBAPIError, PoolTimeoutError, OSError) as e:
+        # A replica that cannot hand out a connection is taken out of rotation; this request uses the primary
+        await session.close()
+        if node is backend.primary:
+            raise
+        node.mark_unhealthy(e)
+        node = backend.primary
+        session = node.sessionmaker()
+        await timed_connection(session, node.pool_stats)
+    async with session:
+        yield session
+
 
-# Async dependency to get the database session
+# Async dependency to get the database session (a read replica, if any are configured and usable)
 async def get_db():
+    async for session in _read_session():
+        yield session
+
+
+# Read session within the swarm-status staleness bound: the primary, unless a replica is close enough behind it
+async def get_swarm_status_db():
+    async for session in _read_session(ServerBackendSingleton().router.swarm_status_max_staleness):
+        yield session
+
+
+# Session on the primary, for writes and reads that must see the latest data
+async def get_primary_db():
     backend = ServerBackendSingleton()
     async with backend.async_sessionmaker() as session:
+        await timed_connection(session, backend.primary.pool_stats)
         yield session
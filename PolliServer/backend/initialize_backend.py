@@ -2,31 +2,73 @@
 
 import yaml
 from PolliServer.backend.ServerBackendSingleton import ServerBackendSingleton
+from PolliServer.backend.dialects import SUPPORTED_DATABASE_TYPES
+from PolliServer.backend.profiling import QueryProfilerSingleton
+from PolliServer.cache.response_cache import ResponseCacheSingleton
 from PolliServer.logger.logger import LoggerSingleton
 
 logger = LoggerSingleton().get_logger()
 
 def initialize_backend_from_config(config_path):
-    
+    """
+    Configures the response cache, statement profiling and database backend from the YAML config:
+
+        databases:
+          - {type: mysql, address: ..., port: 3306, user: ..., password: ..., database: ...}          # primary
+          - {type: mysql, role: replica, name: replica1, address: ..., ...}                           # read replicas
+        # or, for local serving and benchmarks without MySQL:
+        #   - {type: sqlite, path: polli.db}    # path ':memory:' (the default) for an in-memory database
+        routing:                                    # optional, see ReplicaRouter
+          strategy: round_robin                     # or least_loaded
+          max_staleness_seconds: null               # lag bound for all reads
+          swarm_status_max_staleness_seconds: 10    # lag bound for /swarm-status
+          unhealthy_cooldown_seconds: 30
+          probe_interval_seconds: 5
+        profiling:                                  # optional, see QueryProfilerSingleton
+          slow_query_ms: 500
+          explain: false
+    """
     # Load and read the YAML file
     with open(config_path, 'r') as file:
         config_data = yaml.safe_load(file)
 
-    # Extract the first database config (assuming it's the only one for now)
-    db_config = config_data['databases'][0]
+    # Configure the response cache (optional 'cache' section)
+    ResponseCacheSingleton(cache_config=config_data.get('cache') or {})
+
+    # Configure the slow statement log (optional 'profiling' section), before the engines it instruments exist
+    QueryProfilerSingleton(profiling_config=config_data.get('profiling') or {})
+
+    # The primary is the database with 'role: primary', or else the first one; any others are read replicas
+    databases = config_data['databases']
+    primary = next((db for db in databases if db.get('role') == 'primary'), databases[0])
+    replicas = [db for db in databases if db is not primary and db.get('role', 'replica') == 'replica']
+
+    for db_config in [primary] + replicas:
+        if db_config['type'] not in SUPPORTED_DATABASE_TYPES:
+            logger.server_error(f"Unsupported database type: {db_config['type']}")
+            return
 
-    if db_config['type'] != 'mysql':
-        logger.server_error(f"Unsupported database type: {db_config['type']}")
-        return
-    
     # Create the ServerBackendSingleton using the extracted parameters
     ServerBackendSingleton(
-        db_config={
-            'address': db_config['address'],
-            'port': db_config['port'],
-            'user': db_config['user'],
-            'password': db_config['password'],
-            'database': db_config['database']
-        }
+        db_config=extract_db_config(primary),
+        replica_configs=[extract_db_config(db_config) for db_config in replicas],
+        routing_config=config_data.get('routing') or {},
     )
     logger.server_info("ServerBackendSingleton initialized!")
+
+
+def extract_db_config(db_config):
+    # Optional engine settings, see resolve_pool_config
+    options = {key: db_config[key] for key in ('echo', 'statement_timeout_ms', 'pool', 'create_tables') if key in db_config}
+    if db_config['type'] == 'sqlite':
+        return {'type': 'sqlite', 'name': db_config.get('name'), 'path': db_config.get('path', ':memory:'), **options}
+    return {
+        'type': db_config['type'],
+        'name': db_config.get('name'),
+        'address': db_config['address'],
+        'port': db_config['port'],
+        'user': db_config['user'],
+        'password': db_config['password'],
+        'database': db_config['database'],
+        **options,
+    }
@@ -0,0 +1,149 @@
+# PolliServer/backend/pool.py
+import asyncio
+import time
+from collections import deque
+from typing import Dict, Optional
+
+from sqlalchemy import event
+from sqlalchemy.pool import AsyncAdaptedQueuePool, StaticPool
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+
+from PolliServer.constants import *
+
+
+def resolve_pool_config(db_config: dict) -> dict:
+    """
+    Pool, echo and statement-timeout settings for a database entry of the backend YAML, with defaults
+    from constants.py for anything not set:
+
+        databases:
+          - type: mysql
+            ...
+            echo: false                  # true logs every statement, 'debug' also logs result rows
+            statement_timeout_ms: 30000  # MySQL max_execution_time, applies to SELECTs; null disables
+            pool:
+              size: 10
+              max_overflow: 20
+              timeout: 30                # seconds to wait for a connection before failing
+              recycle: 3600              # seconds before a connection is replaced
+              pre_ping: true
+              warmup: 4                  # connections opened at startup
+    """
+    pool = db_config.get('pool') or {}
+    return {
+        'size': pool.get('size', DB_POOL_SIZE),
+        'max_overflow': pool.get('max_overflow', DB_POOL_MAX_OVERFLOW),
+        'timeout': pool.get('timeout', DB_POOL_TIMEOUT_SECONDS),
+        'recycle': pool.get('recycle', DB_POOL_RECYCLE_SECONDS),
+        'pre_ping': pool.get('pre_ping', DB_POOL_PRE_PING),
+        'warmup': pool.get('warmup', DB_POOL_WARMUP_CONNECTIONS),
+        'echo': db_config.get('echo', DB_ECHO),
+        'statement_timeout_ms': db_config.get('statement_timeout_ms', DB_STATEMENT_TIMEOUT_MS),
+    }
+
+
+def engine_options(pool_config: dict, db_type: str = 'mysql', in_memory: bool = False) -> dict:
+    """Keyword arguments for create_async_engine from a resolved pool config."""
+    if in_memory:
+        # One shared connection: every new connection to ':memory:' would be a separate, empty database
+        return {'echo': pool_config['echo'], 'poolclass': StaticPool, 'connect_args': {'check_same_thread': False}}
+    options = {
+        'echo': pool_config['echo'],
+        'pool_size': pool_config['size'],
+        'max_overflow': pool_config['max_overflow'],
+        'pool_timeout': pool_config['timeout'],
+        'pool_recycle': pool_config['recycle'],
+        'pool_pre_ping': pool_config['pre_ping'],
+    }
+    if db_type == 'sqlite':
+        # aiosqlite defaults to NullPool (a new connection per checkout) for file databases
+        options['poolclass'] = AsyncAdaptedQueuePool
+        options['connect_args'] = {'timeout': SQLITE_BUSY_TIMEOUT_SECONDS}
+    elif pool_config['statement_timeout_ms']:
+        options['connect_args'] = {'init_command': f"SET SESSION max_execution_time={int(pool_config['statement_timeout_ms'])}"}
+    return options
+
+
+class PoolStats:
+    """
+    Connection pool counters: connections opened, checkouts, checkout wait times (as measured by
+    get_db) and checkout timeouts. Attached to an engine's pool events by `attach`.
+    """
+
+    def __init__(self, window: int = DB_POOL_WAIT_WINDOW):
+        self.connects = 0
+        self.checkouts = 0
+        self.timeouts = 0
+        self.waits = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.recent_waits = deque(maxlen=window)
+
+    def attach(self, engine):
+        sync_engine = engine.sync_engine
+
+        @event.listens_for(sync_engine, 'connect')
+        def on_connect(dbapi_connection, connection_record):
+            self.connects += 1
+
+        @event.listens_for(sync_engine, 'checkout')
+        def on_checkout(dbapi_connection, connection_record, connection_proxy):
+            self.checkouts += 1
+
+    def record_wait(self, seconds: float):
+        self.waits += 1
+        self.total_wait += seconds
+        self.max_wait = max(self.max_wait, seconds)
+        self.recent_waits.append(seconds)
+
+    def stats(self) -> Dict[str, object]:
+        recent = sorted(self.recent_waits)
+
+        def percentile(p: float) -> Optional[float]:
+            return recent[min(len(recent) - 1, int(p * len(recent)))] * 1000 if recent else None
+
+        return {
+            'connects': self.connects,
+            'checkouts': self.checkouts,
+            'timeouts': self.timeouts,
+            'wait_ms': {
+                'mean': self.total_wait / self.waits * 1000 if self.waits else None,
+                'max': self.max_wait * 1000,
+                'p50': percentile(0.5),
+                'p95': percentile(0.95),
+                'window': len(recent),
+            },
+        }
+
+
+async def timed_connection(session, pool_stats: Optional[PoolStats]):
+    """Checks out the session's connection now, recording how long it took (pool wait, plus connect / pre-ping)."""
+    started = time.perf_counter()
+    try:
+        await session.connection()
+    except PoolTimeoutError:
+        if pool_stats is not None:
+            pool_stats.timeouts += 1
+        raise
+    if pool_stats is not None:
+        pool_stats.record_wait(time.perf_counter() - started)
+
+
+async def warm_up(engine, connections: int) -> int:
+    """Opens up to `connections` pool connections concurrently and returns them to the pool."""
+    async def open_one():
+        async with engine.connect():
+            pass
+
+    results = await asyncio.gather(*(open_one() for _ in range(connections)), return_exceptions=True)
+    return sum(1 for result in results if not isinstance(result, BaseException))
+
+
+def enable_sqlite_wal(engine):
+    """File-backed SQLite: WAL journaling, so readers do not block on the rollup refresher's writes."""
+    @event.listens_for(engine.sync_engine, 'connect')
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('PRAGMA synchronous=NORMAL')
+        cursor.close()
@@ -0,0 +1,185 @@
+# PolliServer/backend/profiling.py
+import os
+import re
+import sys
+import time
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from greenlet import getcurrent
+from sqlalchemy import event
+
+from PolliServer.constants import *
+from PolliServer.logger.logger import LoggerSingleton
+
+logger = LoggerSingleton().get_logger()
+
+POLLISERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Frames in these directories are plumbing, not the code that asked for a statement
+_PLUMBING_DIRS = tuple(os.path.join(POLLISERVER_DIR, name) + os.sep for name in ('backend', 'metrics', 'cache', 'logger'))
+
+
+class RequestStatements:
+    """DB statements of one request. Shared (by reference) with every task the request spawns."""
+    __slots__ = ('label', 'count', 'seconds', 'rows')
+
+    def __init__(self, label: str = ''):
+        self.label = label  # e.g. 'GET /swarm-status', for the slow statement log
+        self.count = 0
+        self.seconds = 0.0
+        self.rows = 0
+
+
+# The statements of the request being served, or None (e.g. in background tasks). Set by MetricsMiddleware.
+current_statements: ContextVar[Optional[RequestStatements]] = ContextVar('current_statements', default=None)
+
+
+def normalize_sql(statement: str, max_chars: int = PROFILING_MAX_SQL_CHARS) -> str:
+    """One line of SQL, with long placeholder lists (IN, VALUES) folded, for grouping and logging."""
+    normalized = re.sub(r'\s+', ' ', statement).strip()
+    normalized = re.sub(r'(\?|%s|%\(\w+\)s)(, (\?|%s|%\(\w+\)s)){3,}', r'\1, ...', normalized)
+    return normalized if len(normalized) <= max_chars else normalized[:max_chars] + ' ...'
+
+
+def result_rows(cursor, context) -> Optional[int]:
+    """Rows in a statement's result, where the driver knows them up front (buffered MySQL cursors), else None."""
+    if cursor.description is None or context.execution_options.get('stream_results') or cursor.rowcount < 0:
+        return None
+    return cursor.rowcount
+
+
+def calling_frames(depth: int = PROFILING_CALLER_DEPTH) -> Optional[str]:
+    """
+    The innermost `depth` PolliServer frames outside the backend plumbing, as 'function (path:line) < caller ...',
+    e.g. the binning helper, the grabber and the endpoint that issued a statement. Under the async engine,
+    statements run in a greenlet whose own stack ends at SQLAlchemy, so the stacks of the parent greenlets
+    (where the awaiting coroutines are) are walked as well.
+    """
+    callers = []
+    frame = sys._getframe(1)
+    greenlet = getcurrent()
+    while len(callers) < depth:
+        while frame is not None and len(callers) < depth:
+            filename = frame.f_code.co_filename
+            if filename.startswith(POLLISERVER_DIR) and not filename.startswith(_PLUMBING_DIRS):
+                callers.append(f"{frame.f_code.co_name} ({os.path.relpath(filename, os.path.dirname(POLLISERVER_DIR))}:{frame.f_lineno})")
+            frame = frame.f_back
+        greenlet = greenlet.parent
+        if greenlet is None:
+            break
+        frame = greenlet.gr_frame
+    return ' < '.join(callers) or None
+
+
+class QueryProfilerSingleton:
+    """
+    Times every statement of the engines it is attached to (see ServerBackendSingleton), adds it to the
+    current request's RequestStatements, and writes statements slower than slow_query_ms to the profile
+    log, optionally with their EXPLAIN plan. Configured from the 'profiling' section of the backend YAML:
+
+        profiling:
+          slow_query_ms: 500        # null disables the slow statement log
+          log_parameters: true      # false to keep parameter values out of the log
+          explain: false            # also log the plan of slow SELECTs (re-planned at most every explain_interval_seconds per statement)
+          explain_interval_seconds: 300
+    """
+    _instance = None
+
+    def __new__(cls, profiling_config=None):
+        if cls._instance is None:
+            cls._instance = super(QueryProfilerSingleton, cls).__new__(cls)
+            cls._instance.databases = {}
+            cls._instance.explained = {}  # Normalized SQL -> when its plan was last logged
+            cls._instance.configure({})
+        if profiling_config is not None:
+            cls._instance.configure(profiling_config)
+        return cls._instance
+
+    def configure(self, profiling_config: dict):
+        slow_query_ms = profiling_config.get('slow_query_ms', PROFILING_SLOW_QUERY_MS)
+        self.slow_query_seconds = slow_query_ms / 1000 if slow_query_ms is not None else None
+        self.log_parameters = profiling_config.get('log_parameters', PROFILING_LOG_PARAMETERS)
+        self.explain = profiling_config.get('explain', PROFILING_EXPLAIN)
+        self.explain_interval = profiling_config.get('explain_interval_seconds', PROFILING_EXPLAIN_INTERVAL_SECONDS)
+
+    def attach(self, database: str, engine):
+        """Instruments an (async) engine's statements under the given database name. Idempotent per name."""
+        if database in self.databases:
+            return
+        stats = self.databases[database] = {'statements': 0, 'seconds': 0.0, 'errors': 0, 'slow': 0}
+        sync_engine = engine.sync_engine
+
+        @event.listens_for(sync_engine, 'before_cursor_execute')
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            conn.info.setdefault('profiling_started', []).append(time.perf_counter())
+
+        @event.listens_for(sync_engine, 'after_cursor_execute')
+        def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            elapsed = time.perf_counter() - conn.info['profiling_started'].pop()
+            stats['statements'] += 1
+            stats['seconds'] += elapsed
+            rows = result_rows(cursor, context)
+            request = current_statements.get()
+            if request is not None:
+                request.count += 1
+                request.seconds += elapsed
+                request.rows += rows or 0
+            if self.slow_query_seconds is not None and elapsed >= self.slow_query_seconds:
+                stats['slow'] += 1
+                self.log_slow_statement(database, conn, statement, parameters, context, executemany, elapsed, rows, request)
+
+        @event.listens_for(sync_engine, 'handle_error')
+        def handle_error(exception_context):
+            connection = exception_context.connection
+            if exception_context.statement is not None and connection is not None and connection.info.get('profiling_started'):
+                connection.info['profiling_started'].pop()
+                stats['errors'] += 1
+
+    def log_slow_statement(self, database, conn, statement, parameters, context, executemany, elapsed, rows, request):
+        sql = normalize_sql(statement)
+        message = (f"Slow statement on {database}: {elapsed * 1000:.0f} ms, "
+                   f"{rows if rows is not None else 'unknown'} rows, from {calling_frames() or 'unknown caller'}"
+                   f"{' during ' + request.label if request is not None and request.label else ''}: {sql}")
+        if self.log_parameters:
+            params = repr(parameters)
+            message += f" | parameters: {params if len(params) <= PROFILING_MAX_PARAMETER_CHARS else params[:PROFILING_MAX_PARAMETER_CHARS] + ' ...'}"
+        if self.explain and not executemany and not context.execution_options.get('stream_results'):
+            plan = self.explain_statement(conn, sql, statement, parameters)
+            if plan:
+                message += '\n' + plan
+        logger.profile(message)
+
+    def explain_statement(self, conn, sql: str, statement: str, parameters) -> Optional[str]:
+        """The statement's plan, one indented line per plan row, unless it is not a SELECT or was explained recently."""
+        if not sql.upper().startswith(('SELECT', 'WITH')):
+            return None
+        now = time.monotonic()
+        if now - self.explained.get(sql, float('-inf')) < self.explain_interval:
+            return None
+        if len(self.explained) >= PROFILING_EXPLAIN_MEMO_SIZE:
+            self.explained.clear()
+        self.explained[sql] = now
+
+        prefix = 'EXPLAIN QUERY PLAN ' if conn.dialect.name == 'sqlite' else 'EXPLAIN '
+        # A raw DBAPI cursor on the same connection: not seen by these events, nor by the caller's result
+        cursor = conn.connection.cursor()
+        try:
+            cursor.execute(prefix + statement, parameters)
+            columns = [column[0] for column in cursor.description]
+            plan_rows = cursor.fetchall()
+        except Exception as e:
+            return f"  EXPLAIN failed: {e}"
+        finally:
+            cursor.close()
+
+        if 'detail' in columns:  # SQLite
+            lines = [f"  {row[columns.index('detail')]}" for row in plan_rows]
+        else:
+            lines = ['  ' + ', '.join(f"{name}={value}" for name, value in zip(columns, row) if value is not None) for row in plan_rows]
+        if len(lines) > PROFILING_MAX_PLAN_ROWS:
+            lines = lines[:PROFILING_MAX_PLAN_ROWS] + [f"  ... ({len(lines) - PROFILING_MAX_PLAN_ROWS} more plan rows)"]
+        return '\n'.join(lines)
+
+    def stats(self) -> Dict[str, Dict[str, object]]:
+        """Per database: statements executed, seconds spent in them, errors, and statements over the slow threshold."""
+        return {database: dict(stats) for database, stats in self.databases.items()}
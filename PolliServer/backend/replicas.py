@@ -0,0 +1,165 @@
+# PolliServer/backend/replicas.py
+import asyncio
+import itertools
+import time
+from typing import Dict, List, Optional
+
+from sqlalchemy import func
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.future import select
+
+from PolliServer.constants import *
+from PolliServer.backend.pool import PoolStats, warm_up
+from PolliServer.logger.logger import LoggerSingleton
+from models.models import PodRecord
+
+logger = LoggerSingleton().get_logger()
+
+
+class DatabaseNode:
+    """One database (the primary or a read replica): its engine, sessionmaker, pool stats and health."""
+
+    def __init__(self, name: str, role: str, engine, pool_config: dict, unhealthy_cooldown: float = REPLICA_UNHEALTHY_COOLDOWN_SECONDS):
+        self.name = name
+        self.role = role
+        self.engine = engine
+        self.pool_config = pool_config
+        self.sessionmaker = async_sessionmaker(engine, expire_on_commit=False)
+        self.pool_stats = PoolStats()
+        self.pool_stats.attach(engine)
+        self.unhealthy_cooldown = unhealthy_cooldown
+        self.unhealthy_until = 0.0
+        self.failures = 0
+        self.last_error = None
+        self.lag_seconds = None  # Replicas: seconds behind the primary, as of the last probe
+
+    @property
+    def healthy(self) -> bool:
+        return time.monotonic() >= self.unhealthy_until
+
+    def mark_unhealthy(self, error: Exception):
+        """Takes the node out of rotation for unhealthy_cooldown seconds."""
+        self.unhealthy_until = time.monotonic() + self.unhealthy_cooldown
+        self.failures += 1
+        self.last_error = str(error)
+        logger.server_warning(f"Database {self.name} marked unhealthy for {self.unhealthy_cooldown}s: {error}")
+
+    def mark_healthy(self):
+        self.unhealthy_until = 0.0
+
+    def in_use(self) -> int:
+        pool = self.engine.pool
+        return pool.checkedout() if hasattr(pool, 'checkedout') else 0
+
+    async def warm_up(self) -> int:
+        if not self.pool_config['warmup'] or not hasattr(self.engine.pool, 'size'):
+            return 0
+        opened = await warm_up(self.engine, min(self.pool_config['warmup'], self.pool_config['size']))
+        logger.server_info(f"Connection pool of {self.name} warmed up: {opened}/{self.pool_config['warmup']} connections opened")
+        return opened
+
+    def pool_status(self) -> Dict[str, object]:
+        """Pool configuration, current checked-out / idle / overflow counts, checkout waits and health."""
+        status = {
+            'role': self.role,
+            'healthy': self.healthy,
+            'failures': self.failures,
+            'last_error': self.last_error,
+            'lag_seconds': self.lag_seconds,
+            'config': dict(self.pool_config),
+            'pool': type(self.engine.pool).__name__,
+        }
+        pool = self.engine.pool
+        if hasattr(pool, 'size'):  # Not StaticPool (in-memory SQLite), which is a single shared connection
+            status.update(size=pool.size(), checked_out=pool.checkedout(), idle=pool.checkedin(), overflow=max(pool.overflow(), 0))
+        status.update(self.pool_stats.stats())
+        return status
+
+
+class ReplicaRouter:
+    """
+    Routes read sessions across the replicas, falling back to the primary when none is usable.
+
+    A replica is usable while it is healthy and, if a staleness bound is given, its last measured lag
+    is within the bound. Lag is measured by `probe` as the difference between the newest
+    PodRecord.last_seen_time on the primary and on the replica, which is the freshness swarm-status
+    depends on and works on any dialect.
+    """
+
+    def __init__(self, primary: DatabaseNode, replicas: List[DatabaseNode], strategy: str = REPLICA_ROUTING_STRATEGY,
+                 max_staleness: Optional[float] = REPLICA_MAX_STALENESS_SECONDS,
+                 swarm_status_max_staleness: Optional[float] = REPLICA_SWARM_STATUS_MAX_STALENESS_SECONDS,
+                 probe_interval: float = REPLICA_PROBE_INTERVAL_SECONDS):
+        if strategy not in ('round_robin', 'least_loaded'):
+            raise ValueError(f"Unknown replica routing strategy: {strategy}. Expected 'round_robin' or 'least_loaded'")
+        self.primary = primary
+        self.replicas = replicas
+        self.strategy = strategy
+        self.max_staleness = max_staleness
+        self.swarm_status_max_staleness = swarm_status_max_staleness
+        self.probe_interval = probe_interval
+        self._turn = itertools.count()
+        self.reads = {node.name: 0 for node in [primary] + replicas}
+
+    def usable(self, node: DatabaseNode, max_staleness: Optional[float]) -> bool:
+        if not node.healthy:
+            return False
+        return max_staleness is None or (node.lag_seconds is not None and node.lag_seconds <= max_staleness)
+
+    def choose(self, max_staleness: Optional[float] = None) -> DatabaseNode:
+        """Picks the node for a read session. The tighter of max_staleness and the router's own bound applies."""
+        bounds = [bound for bound in (max_staleness, self.max_staleness) if bound is not None]
+        bound = min(bounds) if bounds else None
+        candidates = [node for node in self.replicas if self.usable(node, bound)]
+        if not candidates:
+            node = self.primary
+        elif self.strategy == 'least_loaded':
+            node = min(candidates, key=DatabaseNode.in_use)
+        else:
+            node = candidates[next(self._turn) % len(candidates)]
+        self.reads[node.name] += 1
+        return node
+
+    async def probe(self):
+        """Measures each replica's lag behind the primary; replicas that fail the probe are marked unhealthy."""
+        if not self.replicas:
+            return
+        stmt = select(func.max(PodRecord.last_seen_time))
+
+        async def newest(node: DatabaseNode):
+            async with node.sessionmaker() as db:
+                return (await db.execute(stmt)).scalar()
+
+        results = await asyncio.gather(*(newest(node) for node in [self.primary] + self.replicas), return_exceptions=True)
+        primary_newest, replica_newest = results[0], results[1:]
+        for node, newest_seen in zip(self.replicas, replica_newest):
+            if isinstance(newest_seen, Exception):
+                node.mark_unhealthy(newest_seen)
+                continue
+            node.mark_healthy()
+            if isinstance(primary_newest, Exception) or primary_newest is None:
+                node.lag_seconds = None  # Unknown: only unbounded reads go to this replica
+            elif newest_seen is None:
+                node.lag_seconds = None
+            else:
+                node.lag_seconds = max((primary_newest - newest_seen).total_seconds(), 0.0)
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            'strategy': self.strategy,
+            'max_staleness_seconds': self.max_staleness,
+            'swarm_status_max_staleness_seconds': self.swarm_status_max_staleness,
+            'reads': dict(self.reads),
+        }
+
+
+async def run_replica_prober(router: ReplicaRouter):
+    """Background task: re-measures replica health and lag every router.probe_interval seconds."""
+    while True:
+        try:
+            await router.probe()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.server_error(f"Error probing replicas: {e}")
+        await asyncio.sleep(router.probe_interval)
@@ -0,0 +1,329 @@
+# PolliServer/bench/generate.py
+"""
+Synthetic fleet data for local serving and benchmarks.
+
+Fills the models/models.py schema with a fleet of pods in one or more swarms over the last --days
+days: FrameLog at the pods' frame rate during daylight, specimens with a skewed (Zipf) taxon
+distribution and a midday activity peak, FrameRecords for the frames that produced specimens, pod
+sensor readings, hourly weather per swarm, pollination events and the PodRecord status rows.
+
+    python -m PolliServer.bench.generate --sqlite bench.db --pods 12 --days 90
+    python -m PolliServer.bench.generate --config backend.yaml --pods 40 --days 30 --frame-interval 2
+"""
+import argparse
+import asyncio
+import datetime
+import math
+import random
+import time
+from typing import Dict, List
+
+from sqlalchemy import insert
+
+from PolliServer.backend.ServerBackendSingleton import ServerBackendSingleton
+from PolliServer.backend.initialize_backend import initialize_backend_from_config
+from PolliServer.logger.logger import LoggerSingleton
+from models.models import (Base, PodRecord, SpecimenRecord, FrameLog, FrameRecord, SensorRecord,
+                           PollinationRecord, WeatherRecord)
+
+logger = LoggerSingleton().get_logger()
+
+# (Class, Order, Family, Genus) lineages of the synthetic taxa; species are generated per genus
+LINEAGES = [
+    ('Insecta', 'Hymenoptera', 'Apidae', 'Apis'),
+    ('Insecta', 'Hymenoptera', 'Apidae', 'Bombus'),
+    ('Insecta', 'Hymenoptera', 'Apidae', 'Xylocopa'),
+    ('Insecta', 'Hymenoptera', 'Halictidae', 'Lasioglossum'),
+    ('Insecta', 'Hymenoptera', 'Megachilidae', 'Osmia'),
+    ('Insecta', 'Hymenoptera', 'Vespidae', 'Vespula'),
+    ('Insecta', 'Diptera', 'Syrphidae', 'Eristalis'),
+    ('Insecta', 'Diptera', 'Syrphidae', 'Syrphus'),
+    ('Insecta', 'Diptera', 'Bombyliidae', 'Bombylius'),
+    ('Insecta', 'Lepidoptera', 'Nymphalidae', 'Vanessa'),
+    ('Insecta', 'Lepidoptera', 'Pieridae', 'Pieris'),
+    ('Insecta', 'Coleoptera', 'Coccinellidae', 'Coccinella'),
+]
+SPECIES_PER_GENUS = 4
+PLANTS = ['Taraxacum officinale', 'Trifolium repens', 'Helianthus annuus', 'Lavandula angustifolia', 'Echinacea purpurea']
+
+DAYLIGHT_HOURS = (6, 20)  # Pods record between these UTC hours
+# Most specimens are swarm-mode detections that pass the dashboard filters (SPECIMEN_COUNT_CONDITIONS in
+# helpers/getters.py: S1 and S2 scores > 0.3, bbox_rel_area > 0.005, polli_mode 'swarm'); the rest do not
+SWARM_MODE_FRACTION = 0.9
+LOW_CONFIDENCE_FRACTION = 0.05
+INSERT_BATCH_ROWS = 5000
+
+
+def build_taxa() -> List[Dict[str, str]]:
+    """Synthetic species with their full lineage, most common first."""
+    taxa = []
+    taxon_id = 100000
+    for class_name, order, family, genus in LINEAGES:
+        for i in range(SPECIES_PER_GENUS):
+            taxon_id += 1
+            taxa.append({'species': f'{genus} sp{i + 1}', 'genus': genus, 'family': family, 'order': order,
+                         'class': class_name, 'taxonID': str(taxon_id)})
+    return taxa
+
+
+def zipf_weights(n: int, exponent: float = 1.1) -> List[float]:
+    return [1 / (rank ** exponent) for rank in range(1, n + 1)]
+
+
+def activity(timestamp: datetime.datetime) -> float:
+    """Relative insect activity: zero at night, peaking at solar noon, scaled by season."""
+    hour = timestamp.hour + timestamp.minute / 60
+    start, end = DAYLIGHT_HOURS
+    if not start <= hour < end:
+        return 0.0
+    diurnal = math.sin(math.pi * (hour - start) / (end - start))
+    seasonal = 0.6 + 0.4 * math.sin(2 * math.pi * (timestamp.timetuple().tm_yday - 80) / 365)
+    return diurnal * seasonal
+
+
+class FleetGenerator:
+    def __init__(self, args, now: datetime.datetime):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.end = now
+        self.start = now - datetime.timedelta(days=args.days)
+        self.taxa = build_taxa()
+        self.taxon_weights = zipf_weights(len(self.taxa))
+        self.swarms = [f'swarm{i + 1}' for i in range(args.swarms)]
+        self.pods = [{'podID': f'pod{i + 1:03d}', 'swarm_name': self.swarms[i % args.swarms],
+                      'latitude': 45.0 + self.rng.uniform(-0.5, 0.5), 'longitude': -122.0 + self.rng.uniform(-0.5, 0.5),
+                      'loc_name': f'site{i % max(1, args.pods // 3) + 1}'}
+                     for i in range(args.pods)]
+
+    def run_name(self, swarm_name: str, timestamp: datetime.datetime) -> str:
+        # One run per swarm per calendar month
+        return f"{swarm_name}_{timestamp.strftime('%Y-%m')}"
+
+    def daylight_seconds(self):
+        """Yields the start of every daylight hour in the span."""
+        hour = self.start.replace(minute=0, second=0, microsecond=0)
+        while hour < self.end:
+            if DAYLIGHT_HOURS[0] <= hour.hour < DAYLIGHT_HOURS[1]:
+                yield hour
+            hour += datetime.timedelta(hours=1)
+
+    def frame_logs(self):
+        interval = self.args.frame_interval
+        for hour in self.daylight_seconds():
+            for pod in self.pods:
+                # Pods are occasionally offline for an hour
+                if self.rng.random() < 0.02:
+                    continue
+                offset = self.rng.uniform(0, interval)
+                while offset < 3600:
+                    timestamp = hour + datetime.timedelta(seconds=offset)
+                    if timestamp >= self.end:
+                        break
+                    yield {'timestamp': timestamp, 'podID': pod['podID'], 'camera_device': f"{pod['podID']}-cam0"}
+                    offset += interval * self.rng.uniform(0.9, 1.1)
+
+    def specimens_and_frames(self):
+        """Yields (specimen, frame_record) pairs; each specimen comes from its own frame."""
+        per_hour = self.args.specimens_per_pod_day / (DAYLIGHT_HOURS[1] - DAYLIGHT_HOURS[0])
+        for hour in self.daylight_seconds():
+            for pod in self.pods:
+                expected = per_hour * activity(hour + datetime.timedelta(minutes=30)) * 1.57  # 1.57: mean of sin over the day is 2/pi
+                for _ in range(self._poisson(expected)):
+                    timestamp = hour + datetime.timedelta(seconds=self.rng.uniform(0, 3600))
+                    if timestamp >= self.end:
+                        continue
+                    yield self._specimen(pod, timestamp)
+
+    def _poisson(self, expected: float) -> int:
+        # Knuth's method; expected counts per pod-hour are small
+        threshold, count, product = math.exp(-expected), 0, self.rng.random()
+        while product > threshold:
+            count += 1
+            product *= self.rng.random()
+        return count
+
+    def _specimen(self, pod, timestamp):
+        taxon = self.rng.choices(self.taxa, weights=self.taxon_weights)[0]
+        polli_mode = 'swarm' if self.rng.random() < SWARM_MODE_FRACTION else 'survey'
+        if self.rng.random() < LOW_CONFIDENCE_FRACTION:
+            s1_score, score = self.rng.uniform(0.05, 0.3), self.rng.uniform(0.05, 0.3)
+            w, h = self.rng.randint(20, 100), self.rng.randint(20, 100)
+        else:
+            s1_score, score = self.rng.uniform(0.35, 1.0), 0.35 + 0.65 * self.rng.betavariate(5, 2)
+            w, h = self.rng.randint(110, 300), self.rng.randint(110, 300)  # At least 0.0058 of the frame
+        run_name = self.run_name(pod['swarm_name'], timestamp)
+        media_id = f"{pod['podID']}_{timestamp.strftime('%Y%m%d%H%M%S%f')}"
+        x, y = self.rng.randint(0, 1800), self.rng.randint(0, 1000)
+        specimen = {
+            'bboxLL_x': x, 'bboxLL_y': y, 'bboxUR_x': x + w, 'bboxUR_y': y + h,
+            'bbox_rel_area': w * h / (1920 * 1080),
+            'S1_score': s1_score, 'S1_tag': 'yolov8-s1', 'S1_class': 'insect',
+            'S2_tag': 'polli-s2', 'S2_taxonID': taxon['taxonID'], 'S2_taxonID_str': taxon['species'],
+            'S2_taxonID_common_str': taxon['genus'], 'S2_taxonID_score': score, 'S2_taxonRank': '10',
+            'L10_taxonID': taxon['taxonID'], 'L10_taxonID_str': taxon['species'], 'L10_taxonScore': score,
+            'L20_taxonID': taxon['genus'], 'L20_taxonID_str': taxon['genus'], 'L20_taxonScore': min(1.0, score + 0.1),
+            'L30_taxonID': taxon['family'], 'L30_taxonID_str': taxon['family'], 'L30_taxonScore': min(1.0, score + 0.15),
+            'L40_taxonID': taxon['order'], 'L40_taxonID_str': taxon['order'], 'L40_taxonScore': min(1.0, score + 0.2),
+            'L50_taxonID': taxon['class'], 'L50_taxonID_str': taxon['class'], 'L50_taxonScore': 1.0,
+            'S2a_score': self.rng.uniform(0.5, 1.0), 'S2a_tag': 'polli-s2a',
+            'target': 'pollinator', 'polli_mode': polli_mode,
+            'mediaID': media_id, 'mediaPath': f"/media/{pod['podID']}/{media_id}.jpg", 'mediaType': 'jpg',
+            'height_px': 1080, 'width_px': 1920, 'media_persist_policy': 'specimen',
+            'timestamp': timestamp, 'run_name': run_name, 'podID': pod['podID'], 'swarm_name': pod['swarm_name'],
+            'latitude': pod['latitude'], 'longitude': pod['longitude'], 'loc_name': pod['loc_name'],
+            'polliOS_version': '0.5.0',
+        }
+        frame = {
+            'mediaID': media_id, 'mediaType': 'jpg', 'target': 'pollinator', 'polli_mode': polli_mode,
+            'height_px': 1080, 'width_px': 1920, 'persist_policy': 'specimen', 'timestamp': timestamp,
+            'camera_device': f"{pod['podID']}-cam0", 'camera_lens': 'wide', 'camera_focal_length': 4.74,
+            'camera_FoV': 78.0, 'camera_aperture': 1.8, 'camera_exposure': self.rng.uniform(0.001, 0.01),
+            'camera_iso': self.rng.choice([100, 200, 400]), 'camera_flash': False, 'camera_shutter_speed': 1 / 500,
+            'run_name': run_name, 'podID': pod['podID'], 'swarm_name': pod['swarm_name'],
+            'latitude': pod['latitude'], 'longitude': pod['longitude'], 'altitude': 120.0, 'loc_name': pod['loc_name'],
+            'synced': True, 'processed': True, 'queued': False,
+        }
+        return specimen, frame
+
+    def sensor_records(self):
+        step = datetime.timedelta(minutes=self.args.sensor_interval_minutes)
+        timestamp = self.start
+        while timestamp < self.end:
+            temperature = 12 + 10 * max(activity(timestamp), 0.0) + self.rng.gauss(0, 1)
+            for pod in self.pods:
+                yield {'timestamp': timestamp + datetime.timedelta(seconds=self.rng.uniform(0, 30)), 'podID': pod['podID'],
+                       'latitude': pod['latitude'] + self.rng.gauss(0, 1e-5), 'longitude': pod['longitude'] + self.rng.gauss(0, 1e-5),
+                       'altitude': 120.0 + self.rng.gauss(0, 2), 'temperature': temperature + self.rng.gauss(0, 0.5),
+                       'humidity': self.rng.uniform(30, 90), 'pressure': self.rng.uniform(1000, 1025),
+                       'battery_level': self.rng.uniform(20, 100), 'rssi': self.rng.uniform(-85, -40)}
+            timestamp += step
+
+    def weather_records(self):
+        timestamp = self.start.replace(minute=0, second=0, microsecond=0)
+        while timestamp < self.end:
+            for i, swarm_name in enumerate(self.swarms):
+                daylight = activity(timestamp)
+                yield {'swarm_name': swarm_name, 'run_name': self.run_name(swarm_name, timestamp),
+                       'latitude': 45.0, 'longitude': -122.0, 'owm_city_id': 5746545 + i, 'loc_name': f'{swarm_name}-city',
+                       'timestamp': timestamp, 'cloud_coverage': self.rng.randint(0, 100), 'rain_last_3h': max(0.0, self.rng.gauss(0, 1)),
+                       'wind_degree': self.rng.uniform(0, 360), 'wind_speed': abs(self.rng.gauss(3, 2)),
+                       'humidity': self.rng.randint(30, 95), 'pressure': self.rng.randint(1000, 1025),
+                       'temperature': 283 + 12 * daylight + self.rng.gauss(0, 1), 'snow_last_3h': 0.0,
+                       'status': 'Clouds', 'detailed_status': 'scattered clouds', 'owm_code': '802', 'owm_icon_name': '03d',
+                       'aqi': self.rng.randint(1, 5), 'coi': self.rng.uniform(200, 300), 'nh3i': self.rng.uniform(0, 5),
+                       'noi': self.rng.uniform(0, 5), 'no2i': self.rng.uniform(0, 20), 'o3i': self.rng.uniform(20, 100),
+                       'so2i': self.rng.uniform(0, 5), 'pm2_5i': self.rng.uniform(0, 25), 'pm10i': self.rng.uniform(0, 40),
+                       'uv_index': 8 * daylight}
+            timestamp += datetime.timedelta(hours=1)
+
+    def pollination_record(self, specimen):
+        plant = self.rng.choice(PLANTS)
+        return {'timestamp': specimen['timestamp'], 'run_name': specimen['run_name'], 'swarm_name': specimen['swarm_name'],
+                'polli_mode': specimen['polli_mode'], 'S3_tag': 'polli-s3', 'brain_tag': 'brain-v1', 'brain_arch': 'pairwise',
+                'brain_event_descriptor': 'visit', 'brain_type': 'rule', 'joint_bbox_overlap': self.rng.uniform(0.1, 0.9),
+                'S2_taxonID_poll': specimen['S2_taxonID'], 'S2_taxonID_str_poll': specimen['S2_taxonID_str'],
+                'S2_taxonID_score_poll': specimen['S2_taxonID_score'], 'S2_taxonRank_poll': '10',
+                'S2_taxonID_str_plant': plant, 'S2_taxonID_score_plant': self.rng.uniform(0.5, 1.0), 'S2_taxonRank_plant': '10'}
+
+    def pod_records(self):
+        for pod in self.pods:
+            yield {'name': pod['podID'], 'pod_name': pod['podID'], 'address': f"10.0.0.{self.pods.index(pod) + 10}",
+                   'swarm_name': pod['swarm_name'], 'stream_type': 'snapshot', 'downsample_fps': 1,
+                   'connection_status': self.rng.choice(['connected'] * 9 + ['disconnected']),
+                   'last_seen_time': self.end - datetime.timedelta(seconds=self.rng.uniform(0, 120)),
+                   'last_frame_time': self.end - datetime.timedelta(seconds=self.rng.uniform(0, 60)),
+                   'last_specimen_created_time': self.end - datetime.timedelta(minutes=self.rng.uniform(0, 90)),
+                   'queue_length': self.rng.randint(0, 20), 'total_frames': 0, 'total_specimens': 0,
+                   'last_S1_class': 'insect', 'last_S2_class': self.rng.choice(self.taxa)['species'],
+                   'location_name': pod['loc_name'], 'latitude': pod['latitude'], 'longitude': pod['longitude'],
+                   'rssi': self.rng.randint(-85, -40), 'battery_level': self.rng.uniform(20, 100),
+                   'pod_firmware_name': 'PolliOS', 'pod_firmware_version': '0.5.0'}
+
+
+async def insert_batches(db, model, rows, batch_rows: int = INSERT_BATCH_ROWS) -> int:
+    """Inserts rows from an iterable in executemany batches, committing after each."""
+    total = 0
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_rows:
+            await db.execute(insert(model), batch)
+            await db.commit()
+            total += len(batch)
+            batch = []
+    if batch:
+        await db.execute(insert(model), batch)
+        await db.commit()
+        total += len(batch)
+    return total
+
+
+async def generate(args) -> Dict[str, int]:
+    backend = ServerBackendSingleton()
+    async with backend.engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+
+    generator = FleetGenerator(args, datetime.datetime.utcnow())
+    counts = {}
+    async with backend.async_sessionmaker() as db:
+        started = time.perf_counter()
+        counts['pod_records'] = await insert_batches(db, PodRecord, generator.pod_records())
+        counts['frame_log'] = await insert_batches(db, FrameLog, generator.frame_logs())
+        counts['weather_records'] = await insert_batches(db, WeatherRecord, generator.weather_records())
+        counts['sensor_records'] = await insert_batches(db, SensorRecord, generator.sensor_records())
+
+        specimens, frames, pollinations = [], [], []
+        counts.update(specimen_record=0, frame_records=0, pollination_records=0)
+        for specimen, frame in generator.specimens_and_frames():
+            specimens.append(specimen)
+            frames.append(frame)
+            if generator.rng.random() < args.pollination_fraction:
+                pollinations.append(generator.pollination_record(specimen))
+            if len(specimens) >= INSERT_BATCH_ROWS:
+                counts['specimen_record'] += await insert_batches(db, SpecimenRecord, specimens)
+                counts['frame_records'] += await insert_batches(db, FrameRecord, frames)
+                specimens, frames = [], []
+        counts['specimen_record'] += await insert_batches(db, SpecimenRecord, specimens)
+        counts['frame_records'] += await insert_batches(db, FrameRecord, frames)
+        counts['pollination_records'] = await insert_batches(db, PollinationRecord, pollinations)
+        logger.server_info(f"Generated {counts} in {time.perf_counter() - started:.1f}s")
+    return counts
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Fill a database with synthetic PolliOS fleet data")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--config", help="Backend YAML; data is written to its primary database")
+    target.add_argument("--sqlite", help="SQLite database file to create or extend")
+    parser.add_argument("--pods", type=int, default=12)
+    parser.add_argument("--swarms", type=int, default=2)
+    parser.add_argument("--days", type=float, default=30, help="Days of history, ending now (UTC)")
+    parser.add_argument("--frame-interval", type=float, default=5.0, help="Seconds between logged frames per pod, during daylight")
+    parser.add_argument("--specimens-per-pod-day", type=float, default=150.0, help="Mean specimens per pod per day, at peak season")
+    parser.add_argument("--sensor-interval-minutes", type=float, default=5.0)
+    parser.add_argument("--pollination-fraction", type=float, default=0.05, help="Fraction of specimens with a pollination event")
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args(argv)
+
+
+def init_backend(args):
+    """Initializes ServerBackendSingleton from --config, or for the --sqlite file."""
+    if args.config:
+        initialize_backend_from_config(args.config)
+    else:
+        ServerBackendSingleton(db_config={'type': 'sqlite', 'path': args.sqlite})
+
+
+async def main(args):
+    init_backend(args)
+    try:
+        counts = await generate(args)
+    finally:
+        await ServerBackendSingleton().dispose()
+        logger.close_logs()
+    for table, count in counts.items():
+        print(f"{table}: {count}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
@@ -0,0 +1,204 @@
+# PolliServer/bench/run.py
+"""
+Endpoint benchmark: drives the data endpoints of PolliServer/server.py at increasing concurrency and
+reports latency percentiles, throughput, response sizes and DB statements per request as JSON.
+
+The app runs in-process against the backend YAML (or a SQLite file, e.g. one filled by
+PolliServer.bench.generate), so DB statements can be counted; the response cache is bypassed so
+every request exercises its grabber, and the count rollups are brought up to date first. Compare against a saved baseline to catch regressions:
+
+    python -m PolliServer.bench.run --sqlite bench.db --concurrency 1,8,32 --output bench.json
+    python -m PolliServer.bench.run --sqlite bench.db --baseline bench.json --max-regression 0.25
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import sys
+import time
+from typing import Dict, List, Optional
+
+import httpx
+from sqlalchemy import event
+
+from PolliServer.constants import *
+from PolliServer.backend.ServerBackendSingleton import ServerBackendSingleton
+from PolliServer.bench.generate import init_backend
+from PolliServer.helpers.rollups import create_rollup_tables, refresh_rollups
+from PolliServer.logger.logger import LoggerSingleton
+
+logger = LoggerSingleton().get_logger()
+
+
+def bench_endpoints(now: datetime.datetime) -> Dict[str, tuple]:
+    """Benchmark name -> (path, params), with dates relative to now. Management, asset and hub endpoints are left out."""
+    week_ago = now - datetime.timedelta(days=7)
+    return {
+        'podIDs': ('/podIDs', {}),
+        'swarms': ('/swarms', {}),
+        'runs': ('/runs', {}),
+        'dates': ('/dates', {}),
+        'taxa': ('/taxa', {'min_count': 10}),
+        'swarm-status': ('/swarm-status', {}),
+        'swarm-stats': ('/swarm-stats', {}),
+        'frame_counts': ('/frame_counts', {'hours': [24, 72], 'compare': 'true'}),
+        'frame-log-array-data': ('/frame-log-array-data', {'span': 24, 'n_bins': 48}),
+        'frame-log-array-data-week': ('/frame-log-array-data', {'span': 168, 'n_bins': 168, 'format': 'columnar'}),
+        'specimen-log-array-data': ('/specimen-log-array-data', {'span': 24, 'n_bins': 48}),
+        'weather-log-array-data': ('/weather-log-array-data', {'span': 72, 'n_bins': 24}),
+        'weather-log-array-data-mean': ('/weather-log-array-data', {'span': 72, 'n_bins': 24, 'aggregate': 'mean'}),
+        'frame-log-stats': ('/frame-log-stats', {'span': 24}),
+        'specimen-log-stats': ('/specimen-log-stats', {'span': 24}),
+        'clade-activity-array-data': ('/clade-activity-array-data', {
+            'clade': 'Genus', 'n_bins': 28,
+            'start_date': week_ago.strftime(DATETIME_FORMAT_STRING), 'end_date': now.strftime(DATETIME_FORMAT_STRING)}),
+        'specimen-detail-timeline': ('/specimen-detail-timeline', {
+            'start_date': week_ago.strftime(DATE_FORMAT_STRING), 'end_date': now.strftime(DATE_FORMAT_STRING)}),
+        'export-specimen': ('/export/specimen', {'start': week_ago.isoformat()}),
+    }
+
+
+class StatementCounter:
+    """Counts statements executed on every database of the backend."""
+
+    def __init__(self, backend: ServerBackendSingleton):
+        self.count = 0
+        for node in backend.nodes():
+            event.listen(node.engine.sync_engine, 'before_cursor_execute', self.on_execute)
+
+    def on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+
+def percentile(sorted_values: List[float], p: float) -> Optional[float]:
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(p * len(sorted_values)))]
+
+
+async def bench_level(client: httpx.AsyncClient, path: str, params: dict, concurrency: int, requests: int,
+                      counter: StatementCounter) -> Dict[str, object]:
+    """Sends `requests` requests with `concurrency` in flight at a time."""
+    latencies, sizes, statuses = [], [], {}
+    queue = asyncio.Queue()
+    for _ in range(requests):
+        queue.put_nowait(None)
+
+    async def worker():
+        while not queue.empty():
+            queue.get_nowait()
+            started = time.perf_counter()
+            response = await client.get(path, params=params, headers={'Cache-Control': 'no-cache'})
+            body = await response.aread()
+            latencies.append(time.perf_counter() - started)
+            sizes.append(len(body))
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    statements_before = counter.count
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'concurrency': concurrency,
+        'requests': requests,
+        'statuses': {str(status): count for status, count in sorted(statuses.items())},
+        'throughput_rps': requests / elapsed if elapsed else None,
+        'latency_ms': {name: percentile(latencies, p) * 1000 for name, p in (('p50', 0.5), ('p95', 0.95), ('p99', 0.99))},
+        'mean_response_bytes': sum(sizes) / len(sizes) if sizes else 0,
+        'statements_per_request': (counter.count - statements_before) / requests,
+    }
+
+
+async def run(args) -> Dict[str, object]:
+    from PolliServer.server import app  # After the backend is initialized, as start_server.py does
+
+    backend = ServerBackendSingleton()
+    if ROLLUPS_ENABLED:
+        # The app's lifespan (which starts the rollup refresher) does not run under ASGITransport
+        async with backend.async_sessionmaker() as db:
+            await create_rollup_tables(db)
+            await refresh_rollups(db, settle_seconds=0)  # Nothing else writes to the database
+    counter = StatementCounter(backend)
+    endpoints = bench_endpoints(datetime.datetime.utcnow())
+    if args.endpoints:
+        endpoints = {name: endpoints[name] for name in args.endpoints.split(',')}
+
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://bench', timeout=None) as client:
+        for name, (path, params) in endpoints.items():
+            # One unmeasured request, so catalog builds and first connections are not counted
+            await client.get(path, params=params)
+            results[name] = {'path': path, 'params': params,
+                             'levels': [await bench_level(client, path, params, concurrency, args.requests, counter)
+                                        for concurrency in args.concurrency]}
+            level = results[name]['levels'][0]
+            print(f"{name}: p50 {level['latency_ms']['p50']:.1f} ms at concurrency {level['concurrency']}", file=sys.stderr)
+
+    return {
+        'generated_at': datetime.datetime.utcnow().isoformat(),
+        'database': backend.engine.dialect.name,
+        'requests_per_level': args.requests,
+        'endpoints': results,
+    }
+
+
+def regressions(report: Dict[str, object], baseline: Dict[str, object], max_regression: float) -> List[str]:
+    """Endpoint/concurrency levels whose p95 latency grew by more than max_regression (a fraction) over the baseline."""
+    found = []
+    for name, result in report['endpoints'].items():
+        baseline_levels = {level['concurrency']: level for level in baseline.get('endpoints', {}).get(name, {}).get('levels', [])}
+        for level in result['levels']:
+            before = baseline_levels.get(level['concurrency'])
+            if before is None or not before['latency_ms']['p95']:
+                continue
+            growth = level['latency_ms']['p95'] / before['latency_ms']['p95'] - 1
+            if growth > max_regression:
+                found.append(f"{name} @ concurrency {level['concurrency']}: p95 {before['latency_ms']['p95']:.1f} -> "
+                             f"{level['latency_ms']['p95']:.1f} ms (+{growth:.0%})")
+    return found
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the PolliServer endpoints")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--config", help="Backend YAML")
+    target.add_argument("--sqlite", help="SQLite database file (see PolliServer.bench.generate)")
+    parser.add_argument("--concurrency", type=lambda value: [int(level) for level in value.split(',')], default=[1, 4, 16],
+                        help="Comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=50, help="Requests per endpoint per concurrency level")
+    parser.add_argument("--endpoints", help="Comma-separated subset of endpoint names")
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    parser.add_argument("--baseline", help="Earlier JSON report to compare p95 latencies against")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="Allowed p95 growth over the baseline, as a fraction")
+    return parser.parse_args(argv)
+
+
+async def main(args) -> int:
+    init_backend(args)
+    try:
+        report = await run(args)
+    finally:
+        await ServerBackendSingleton().dispose()
+        logger.close_logs()
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(output)
+    else:
+        print(output)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            found = regressions(report, json.load(file), args.max_regression)
+        for regression in found:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        return 1 if found else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(parse_args())))
@@ -0,0 +1,171 @@
+# PolliServer/cache/http_encoding.py
+import hashlib
+import zlib
+from collections import OrderedDict
+from typing import List, Optional
+
+from fastapi import Request
+from fastapi.responses import Response, StreamingResponse
+from starlette.datastructures import MutableHeaders
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from PolliServer.constants import *
+
+# brotli and zstandard are optional: gzip is always available
+try:
+    import brotli
+except ImportError:
+    brotli = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+def compute_etag(body: bytes) -> str:
+    """Strong ETag of a response body."""
+    return f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+
+
+def available_encodings() -> List[str]:
+    """Content codings this server can produce, in order of preference."""
+    installed = {'br': brotli is not None, 'zstd': zstandard is not None, 'gzip': True}
+    return [encoding for encoding in COMPRESSION_ENCODINGS if installed.get(encoding)]
+
+
+def choose_encoding(accept_encoding: str, encodings: Optional[List[str]] = None) -> Optional[str]:
+    """
+    Picks the content coding for an Accept-Encoding header: the first of `encodings` (default: every
+    available coding, in server preference order) the client accepts with a non-zero q-value.
+    """
+    accepted = {}
+    for item in accept_encoding.lower().split(','):
+        coding, _, params = item.strip().partition(';')
+        q = 1.0
+        for param in params.split(';'):
+            name, _, value = param.strip().partition('=')
+            if name == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if coding:
+            accepted[coding] = q
+    for encoding in (encodings if encodings is not None else available_encodings()):
+        if accepted.get(encoding, accepted.get('*', 0.0)) > 0:
+            return encoding
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == 'br':
+        return brotli.compress(body, quality=COMPRESSION_BROTLI_QUALITY)
+    if encoding == 'zstd':
+        return zstandard.ZstdCompressor(level=COMPRESSION_ZSTD_LEVEL).compress(body)
+    compressor = zlib.compressobj(COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)  # 16+: gzip container
+    return compressor.compress(body) + compressor.flush()
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against an ETag, as RFC 9110 requires for GET."""
+    if if_none_match.strip() == '*':
+        return True
+    opaque = etag.removeprefix('W/')
+    return any(candidate.strip().removeprefix('W/') == opaque for candidate in if_none_match.split(','))
+
+
+class CompressedBodies:
+    """
+    LRU of compressed bodies keyed by (ETag, coding), so an unchanged body is compressed only once.
+    Bodies larger than max_body_size are compressed every time rather than kept.
+    """
+
+    def __init__(self, max_size: int, max_body_size: int):
+        self.max_size = max_size
+        self.max_body_size = max_body_size
+        self.entries = OrderedDict()
+
+    def get(self, etag: str, encoding: str, body: bytes) -> bytes:
+        if len(body) > self.max_body_size:
+            return compress(body, encoding)
+        key = (etag, encoding)
+        compressed = self.entries.get(key)
+        if compressed is None:
+            compressed = compress(body, encoding)
+            self.entries[key] = compressed
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+        self.entries.move_to_end(key)
+        return compressed
+
+
+def _copy_headers(response: Response, excluded: tuple) -> MutableHeaders:
+    # From the raw list, so repeated headers (e.g. set-cookie) keep every value
+    return MutableHeaders(raw=[(name, value) for name, value in response.raw_headers if name not in excluded])
+
+
+async def gzip_stream(body_iterator):
+    # Flushed per chunk, so streamed records reach the client as soon as they are produced
+    compressor = zlib.compressobj(COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    async for chunk in body_iterator:
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
+
+
+class HTTPEncodingMiddleware(BaseHTTPMiddleware):
+    """
+    ETag / If-None-Match validation and response compression for GET requests.
+
+    Buffered 200 responses get a strong ETag (computed from the body, unless the response already
+    carries one, as cached responses do) and 'Cache-Control: no-cache', so clients revalidate each poll
+    and an unchanged response is answered with an empty 304. Bodies of at least COMPRESSION_MIN_SIZE
+    bytes are compressed with the best coding the client accepts (br, zstd if installed, then gzip);
+    the coding is appended to the ETag, so each representation has its own validator.
+
+    Only JSON and text responses (COMPRESSION_CONTENT_TYPES) are buffered. Streamed responses are not:
+    text streams (COMPRESSION_STREAMED_CONTENT_TYPES) are gzipped chunk by chunk, binary exports are
+    passed through unchanged, as are files and already-compressed media (e.g. the .gz models and assets).
+    """
+
+    compressed_bodies = CompressedBodies(COMPRESSION_MEMO_SIZE, COMPRESSION_MEMO_MAX_BODY_SIZE)
+
+    async def dispatch(self, request: Request, call_next):
+        if request.method != 'GET':
+            return await call_next(request)
+
+        response = await call_next(request)
+        if response.status_code != 200 or 'content-encoding' in response.headers:
+            return response
+
+        accept_encoding = request.headers.get('accept-encoding', '')
+        content_type = response.headers.get('content-type', '')
+        if content_type.startswith(CACHE_UNCACHEABLE_CONTENT_TYPES):
+            if not content_type.startswith(COMPRESSION_STREAMED_CONTENT_TYPES) or choose_encoding(accept_encoding, ['gzip']) is None:
+                return response
+            headers = _copy_headers(response, (b'content-length',))
+            headers['Content-Encoding'] = 'gzip'
+            headers.add_vary_header('Accept-Encoding')
+            return StreamingResponse(gzip_stream(response.body_iterator), status_code=response.status_code, headers=headers)
+        if not content_type.startswith(COMPRESSION_CONTENT_TYPES):
+            return response
+
+        body = b''.join([chunk async for chunk in response.body_iterator])
+        headers = _copy_headers(response, (b'content-length', b'etag'))
+        etag = response.headers.get('etag') or compute_etag(body)
+        headers.setdefault('cache-control', 'no-cache')
+        headers.add_vary_header('Accept-Encoding')
+
+        encoding = choose_encoding(accept_encoding) if len(body) >= COMPRESSION_MIN_SIZE else None
+        if encoding is not None:
+            body = self.compressed_bodies.get(etag, encoding, body)
+            etag = f'{etag[:-1]}-{encoding}"'
+            headers['Content-Encoding'] = encoding
+        headers['ETag'] = etag
+
+        if etag_matches(request.headers.get('if-none-match', ''), etag):
+            not_modified = MutableHeaders(raw=[(name, value) for name, value in headers.raw
+                                               if name in (b'etag', b'cache-control', b'vary', b'x-cache')])
+            return Response(status_code=304, headers=not_modified)
+        return Response(content=body, status_code=response.status_code, headers=headers)
@@ -0,0 +1,244 @@
+# PolliServer/cache/response_cache.py
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import Request
+from fastapi.responses import Response
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from PolliServer.constants import *
+from PolliServer.cache.http_encoding import compute_etag
+from PolliServer.logger.logger import LoggerSingleton
+
+logger = LoggerSingleton().get_logger()
+
+
+class CachedResponse:
+    def __init__(self, body: bytes, status_code: int, raw_headers: List[Tuple[bytes, bytes]]):
+        self.body = body
+        self.status_code = status_code
+        self.raw_headers = raw_headers  # Includes content-type; repeated headers (e.g. set-cookie) keep every value
+        if status_code == 200:  # Error responses are shared between coalesced requests, never stored or validated
+            # Once per stored body, not per hit
+            self.raw_headers = [header for header in raw_headers if header[0] != b'etag'] + \
+                               [(b'etag', compute_etag(body).encode('latin-1'))]
+
+    def to_response(self, cache_status: str) -> Response:
+        response = Response(content=self.body, status_code=self.status_code)
+        response.raw_headers.extend(self.raw_headers)
+        response.headers['X-Cache'] = cache_status
+        return response
+
+
+class EndpointCache:
+    """
+    TTL + LRU cache of responses for a single endpoint, with hit/miss counters, and the requests currently
+    computing a response (so concurrent identical requests can wait for it rather than repeat it).
+    """
+
+    def __init__(self, ttl: float, max_size: int):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.entries = OrderedDict()  # key -> (expires_at, CachedResponse)
+        self.hits = 0
+        self.misses = 0
+        self.bypasses = 0
+        self.evictions = 0
+        self.in_flight = {}  # key -> Future of the CachedResponse being computed (None if it cannot be shared)
+        self.coalesced = 0
+
+    def get(self, key) -> Optional[CachedResponse]:
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, cached = entry
+        if expires_at <= time.monotonic():
+            del self.entries[key]
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return cached
+
+    def set(self, key, cached: CachedResponse):
+        self.entries[key] = (time.monotonic() + self.ttl, cached)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def purge(self):
+        self.entries.clear()
+
+    def stats(self) -> Dict[str, object]:
+        lookups = self.hits + self.misses
+        return {
+            'ttl': self.ttl,
+            'max_size': self.max_size,
+            'size': len(self.entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'bypasses': self.bypasses,
+            'evictions': self.evictions,
+            'in_flight': len(self.in_flight),
+            'coalesced': self.coalesced,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+
+class ResponseCacheSingleton:
+    """
+    Per-endpoint response caches, configured from the 'cache' section of the backend YAML:
+
+        cache:
+          enabled: true
+          default_ttl: 30          # seconds; overrides the per-endpoint defaults in CACHE_DEFAULT_ENDPOINTS
+          default_max_size: 128    # entries per endpoint
+          coalesce: true           # concurrent identical requests share one computation, even with enabled: false
+          endpoints:
+            /swarm-status: {ttl: 5, max_size: 4}
+            /dates: {ttl: 300}
+            /specimen-detail-timeline: {ttl: 0}   # ttl 0 disables caching for an endpoint
+    """
+    _instance = None
+
+    def __new__(cls, cache_config=None):
+        if cls._instance is None:
+            cls._instance = super(ResponseCacheSingleton, cls).__new__(cls)
+            cls._instance.configure({})
+        if cache_config is not None:
+            cls._instance.configure(cache_config)
+        return cls._instance
+
+    def configure(self, cache_config: dict):
+        self.enabled = cache_config.get('enabled', CACHE_ENABLED)
+        self.coalesce = cache_config.get('coalesce', CACHE_COALESCE)
+        default_ttl = cache_config.get('default_ttl')
+        default_max_size = cache_config.get('default_max_size', CACHE_DEFAULT_MAX_SIZE)
+
+        policies = {path: {'ttl': default_ttl if default_ttl is not None else ttl, 'max_size': default_max_size}
+                    for path, ttl in CACHE_DEFAULT_ENDPOINTS.items()}
+        for path, policy in (cache_config.get('endpoints') or {}).items():
+            merged = policies.get(path, {'ttl': default_ttl if default_ttl is not None else CACHE_DEFAULT_TTL,
+                                         'max_size': default_max_size})
+            merged.update(policy or {})
+            policies[path] = merged
+
+        self.caches = {path: EndpointCache(policy['ttl'], policy['max_size'])
+                       for path, policy in policies.items() if policy['ttl'] and policy['ttl'] > 0}
+        logger.server_info(f"Response cache {'enabled' if self.enabled else 'disabled'}"
+                           f"{', coalescing' if self.coalesce else ''} for {sorted(self.caches)}")
+
+    def cache_for(self, path: str) -> Optional[EndpointCache]:
+        if not self.enabled and not self.coalesce:
+            return None
+        return self.caches.get(path)
+
+    @staticmethod
+    def make_key(query_params) -> tuple:
+        # Parameter order and repeated-value order do not change results, so normalize both away
+        normalized = {}
+        for name, value in query_params.multi_items():
+            if value != '':
+                normalized.setdefault(name, []).append(value)
+        return tuple(sorted((name, tuple(sorted(values))) for name, values in normalized.items()))
+
+    def purge(self, path: Optional[str] = None) -> int:
+        caches = [self.caches[path]] if path in self.caches else ([] if path else list(self.caches.values()))
+        purged = sum(len(cache.entries) for cache in caches)
+        for cache in caches:
+            cache.purge()
+        return purged
+
+    def stats(self) -> Dict[str, object]:
+        return {'enabled': self.enabled, 'coalesce': self.coalesce, 'endpoints': {path: cache.stats() for path, cache in self.caches.items()}}
+
+
+class ResponseCacheMiddleware(BaseHTTPMiddleware):
+    """
+    Serves cached responses for configured GET endpoints. Clients can bypass (and refresh) the cache
+    for a request by sending 'Cache-Control: no-cache'. Only 200, non-streamed responses are stored.
+
+    A cache miss for a key that another request is already computing waits for that response instead
+    of running the endpoint again (X-Cache: COALESCED). Bypassing requests never wait on an earlier one.
+    """
+
+    async def dispatch(self, request: Request, call_next):
+        caches = ResponseCacheSingleton()
+        cache = caches.cache_for(request.url.path) if request.method == 'GET' else None
+        if cache is None:
+            return await call_next(request)
+
+        key = ResponseCacheSingleton.make_key(request.query_params)
+        if 'no-cache' in request.headers.get('cache-control', ''):
+            cache.bypasses += 1
+            cache_status = 'BYPASS'
+        else:
+            cached = cache.get(key) if caches.enabled else None
+            if cached is not None:
+                return cached.to_response('HIT')
+            flight = cache.in_flight.get(key) if caches.coalesce else None
+            while flight is not None:
+                cached = await self.wait_for(flight)
+                if cached is not None:
+                    cache.coalesced += 1
+                    return cached.to_response('COALESCED')
+                # Cancelled: one of the waiting requests takes over and the others wait for it
+                flight = cache.in_flight.get(key) if flight.cancelled() else None
+            cache_status = 'MISS'
+
+        flight = None
+        if caches.coalesce and key not in cache.in_flight:
+            flight = cache.in_flight[key] = asyncio.get_running_loop().create_future()
+        try:
+            cached = await self.compute(request, call_next)
+        except asyncio.CancelledError:
+            if flight is not None:
+                flight.cancel()  # Waiting requests compute the response themselves
+            raise
+        except Exception as e:
+            if flight is not None:
+                flight.set_exception(e)
+                flight.exception()  # Marks it retrieved, so no warning is logged if nobody was waiting
+            raise
+        finally:
+            if flight is not None:
+                del cache.in_flight[key]
+
+        if isinstance(cached, Response):  # Not shareable
+            if flight is not None:
+                flight.set_result(None)
+            return cached
+        if flight is not None:
+            flight.set_result(cached)
+        if caches.enabled and cached.status_code == 200:
+            cache.set(key, cached)
+        return cached.to_response(cache_status)
+
+    @staticmethod
+    async def compute(request: Request, call_next):
+        """The endpoint's response, buffered as a CachedResponse, or the response itself if it is streamed."""
+        response = await call_next(request)
+        # Streamed responses (e.g. NDJSON) are passed through rather than buffered
+        if response.headers.get('content-type', '').startswith(CACHE_UNCACHEABLE_CONTENT_TYPES):
+            return response
+        body = b''.join([chunk async for chunk in response.body_iterator])
+        raw_headers = [(name, value) for name, value in response.raw_headers if name != b'content-length']
+        return CachedResponse(body, response.status_code, raw_headers)
+
+    @staticmethod
+    async def wait_for(flight: asyncio.Future) -> Optional[CachedResponse]:
+        """
+        The response another request is computing, or None if this request has to compute its own: the
+        response is streamed, or the computing request was cancelled (e.g. its client disconnected).
+        Shielded, so cancelling a waiting request never cancels the computation. Errors are shared.
+        """
+        try:
+            return await asyncio.shield(flight)
+        except asyncio.CancelledError:
+            if flight.cancelled():
+                return None
+            raise
@@ -7,6 +7,119 @@ DATE_FORMAT_STRING = "%Y-%m-%d"
 
 # Swarm status constants
 LAST_SEEN_THRESHOLD_MINUTES = 10000
+SWARM_STATUS_FEED_PROBE_SECONDS = 2  # /swarm-status/stream: change probe period while anyone is subscribed
+SWARM_STATUS_FEED_REFRESH_SECONDS = 30  # Full recompute at least this often, for the 24 h frame counts
+SWARM_STATUS_FEED_KEEPALIVE_SECONDS = 15  # Comment sent on idle streams, so proxies keep them open
+SWARM_STATUS_FEED_QUEUE_SIZE = 32  # Diffs buffered per subscriber; one further behind is sent a new snapshot
+SWARM_STATUS_DELTA_MAX_AGE_SECONDS = 5  # /swarm-status?since= recomputes the status if older than this (unless the stream feed is live)
+SWARM_STATUS_MAX_REMOVED_PODS = 1000  # Removed pods remembered for deltas; a since= older than the oldest forgotten one gets every pod
+
+# Database connection pool constants (overridable per database in the backend YAML, see resolve_pool_config)
+DB_POOL_SIZE = 10
+DB_POOL_MAX_OVERFLOW = 20
+DB_POOL_TIMEOUT_SECONDS = 30  # Wait for a free connection before failing the request
+DB_POOL_RECYCLE_SECONDS = 3600  # Below MySQL's wait_timeout, so idle connections are never dropped server-side
+DB_POOL_PRE_PING = True
+DB_POOL_WARMUP_CONNECTIONS = 4  # Connections opened at startup
+DB_POOL_WAIT_WINDOW = 1000  # Recent checkout waits kept for percentiles
+DB_ECHO = False  # SQL statement logging: False, True, or 'debug'
+DB_STATEMENT_TIMEOUT_MS = None  # MySQL max_execution_time for SELECTs, e.g. 30000; None disables (streamed exports run long)
+SQLITE_BUSY_TIMEOUT_SECONDS = 30  # SQLite: wait this long for a write lock before failing
+
+# Read replica routing constants (overridable from the 'routing' section of the backend YAML)
+REPLICA_ROUTING_STRATEGY = 'round_robin'  # Or 'least_loaded' (fewest checked-out connections)
+REPLICA_MAX_STALENESS_SECONDS = None  # Lag bound for all reads; None: any healthy replica
+REPLICA_SWARM_STATUS_MAX_STALENESS_SECONDS = 10  # /swarm-status falls back to the primary beyond this lag
+REPLICA_UNHEALTHY_COOLDOWN_SECONDS = 30  # Replicas that fail are out of rotation for this long
+REPLICA_PROBE_INTERVAL_SECONDS = 5  # Health and lag probe period
+
+# Rollup (pre-aggregated count) constants
+ROLLUPS_ENABLED = True
+ROLLUP_RESOLUTIONS = (60, 3600, 86400)  # Bucket widths in seconds, finest first. Each must divide the next.
+ROLLUP_REFRESH_INTERVAL_SECONDS = 30
+ROLLUP_REFRESH_BATCH_ROWS = 500000  # Max source rows folded in per refresh step
+ROLLUP_SETTLE_SECONDS = 60  # Only ids that were the max id this long ago are folded (ids are assigned before commit)
+ROLLUP_RECOUNT_INTERVAL_SECONDS = 900  # Recent buckets are recounted from raw rows this often, and on startup
+ROLLUP_RECOUNT_HOURS = 6  # How far back the recount goes (whole buckets at each resolution)
+
+# Distinct-value catalog constants
+CATALOG_REFRESH_INTERVAL_SECONDS = 10
+CATALOG_MAX_AGE_SECONDS = 60  # Requests refresh the catalog themselves if it is older than this
+
+# Response formats of the array-data endpoints ('rows': one object per bin; 'columnar': shared arrays)
+ARRAY_DATA_FORMAT_PATTERN = "^(rows|columnar)$"
+
+# /specimen-detail-timeline constants
+TIMELINE_MIN_TAXON_COUNT = 25  # Minimum specimen count of a taxon for it to appear (default of min_taxon_count)
+TIMELINE_PAGE_SIZE = 5000  # Default rows per page
+TIMELINE_MAX_PAGE_SIZE = 50000
+TIMELINE_STREAM_BATCH_ROWS = 1000  # Rows fetched per server-side cursor round trip when streaming
+
+# /export constants
+EXPORT_BATCH_ROWS = 50000  # Rows per server-side cursor round trip, Arrow record batch and Parquet row group
+EXPORT_PARQUET_COMPRESSION = 'snappy'
+
+# Response cache constants (overridable from the 'cache' section of the backend YAML)
+CACHE_ENABLED = True
+CACHE_COALESCE = True  # Concurrent identical requests to the cached endpoints share one computation
+CACHE_DEFAULT_TTL = 30  # Seconds, for endpoints configured without a ttl
+CACHE_DEFAULT_MAX_SIZE = 128  # Entries per endpoint
+CACHE_UNCACHEABLE_CONTENT_TYPES = ("application/x-ndjson", "text/event-stream",  # Streamed, never buffered
+                                   "application/vnd.apache.arrow.stream", "application/vnd.apache.parquet")
+CACHE_DEFAULT_ENDPOINTS = {  # Endpoint path -> ttl in seconds
+    '/podIDs': 60,
+    '/swarms': 60,
+    '/runs': 60,
+    '/dates': 60,
+    '/swarm-status': 5,
+    '/swarm-stats': 30,
+    '/frame_counts': 15,
+    '/frame-log-stats': 30,
+    '/specimen-log-stats': 30,
+    '/frame-log-array-data': 30,
+    '/specimen-log-array-data': 30,
+    '/weather-log-array-data': 60,
+    '/clade-activity-array-data': 60,
+}
+
+# HTTP compression constants
+COMPRESSION_MIN_SIZE = 1024  # Bytes; smaller bodies are sent uncompressed
+COMPRESSION_ENCODINGS = ('br', 'zstd', 'gzip')  # Server preference; br and zstd only if brotli / zstandard are installed
+COMPRESSION_GZIP_LEVEL = 6
+COMPRESSION_BROTLI_QUALITY = 5
+COMPRESSION_ZSTD_LEVEL = 3
+COMPRESSION_MEMO_SIZE = 256  # Compressed bodies kept per (ETag, coding), so unchanged responses are compressed once
+COMPRESSION_MEMO_MAX_BODY_SIZE = 1024 * 1024  # Bytes; larger bodies are compressed per response rather than memoized
+COMPRESSION_CONTENT_TYPES = ("application/json", "text/")  # Buffered, ETagged and compressed; others (files, gzip) pass through
+COMPRESSION_STREAMED_CONTENT_TYPES = ("application/x-ndjson",)  # Streams gzipped chunk by chunk; other streams pass through
+
+# DB statement profiling constants (overridable from the 'profiling' section of the backend YAML)
+PROFILING_SLOW_QUERY_MS = 500  # Statements at least this slow go to the profile log; None disables
+PROFILING_LOG_PARAMETERS = True
+PROFILING_EXPLAIN = False  # Also log the plan of slow SELECTs
+PROFILING_EXPLAIN_INTERVAL_SECONDS = 300  # Per normalized statement, so a repeatedly slow query is not re-planned every time
+PROFILING_EXPLAIN_MEMO_SIZE = 1000
+PROFILING_MAX_SQL_CHARS = 2000
+PROFILING_MAX_PARAMETER_CHARS = 500
+PROFILING_MAX_PLAN_ROWS = 40
+PROFILING_CALLER_DEPTH = 4  # PolliServer frames shown per slow statement, innermost first
+
+# /metrics constants
+METRICS_ENABLED = True
+METRICS_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)  # Seconds
+METRICS_DB_TIME_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)  # Seconds of DB time per request
+METRICS_QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)  # DB statements per request
+METRICS_ROW_COUNT_BUCKETS = (0, 10, 100, 1000, 10000, 100000, 1000000)  # DB rows per request
+METRICS_SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)  # Response bytes
+METRICS_SLOW_REQUEST_SECONDS = 1.0  # Requests at least this slow are also written to the profile log
+
+# Logger constants (see PolliServer/logger/logger.py)
+LOG_FLUSH_INTERVAL_SECONDS = 1.0  # The writer thread writes queued records at least this often
+LOG_BATCH_RECORDS = 256  # ... or as soon as this many are queued (errors are written right away)
+LOG_QUEUE_MAX_RECORDS = 100000  # Beyond this, records are sampled rather than queued, so logging never blocks or grows unbounded
+LOG_OVERLOAD_SAMPLE_EVERY = 100  # While overloaded, keep 1 in this many info/debug/profile records (warnings and errors up to twice the limit)
+LOG_MAX_BYTES = 50 * 1024 * 1024  # Log files are rotated to .1, .2, ... at this size; 0 disables rotation
+LOG_BACKUP_COUNT = 5  # Rotated files kept per log
 
 # Image constants
 THUMBNAIL_SIZE = (150, 150)
@@ -0,0 +1,162 @@
+# PolliServer/helpers/binning.py
+import datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import and_, or_, case, func, literal_column
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from PolliServer.backend.dialects import microseconds_between, floor_div, least
+
+
+class TimeBins:
+    """
+    Evenly spaced time bins covering [start, end).
+
+    Bin i covers [start + i * interval, start + (i + 1) * interval). The bin index of a row is computed
+    in the database from its timestamp, so a single grouped query returns every bin at once.
+    """
+
+    def __init__(self, start: datetime.datetime, end: datetime.datetime, n_bins: int):
+        if n_bins < 1:
+            raise ValueError(f"n_bins must be >= 1, got {n_bins}")
+        self.start = start
+        self.end = end
+        self.n_bins = n_bins
+        self.interval = (end - start) / n_bins
+        # Bin width in whole microseconds, as used by the SQL bucket math
+        self.interval_us = max(1, self.interval // datetime.timedelta(microseconds=1))
+
+    @classmethod
+    def trailing(cls, span: int, n_bins: int, end: Optional[datetime.datetime] = None):
+        """Bins covering the last <span> hours, ending now (UTC) unless end is given."""
+        end = end or datetime.datetime.utcnow()
+        return cls(end - datetime.timedelta(hours=span), end, n_bins)
+
+    @property
+    def midpoints(self) -> List[datetime.datetime]:
+        return [self.start + (i * self.interval) + (self.interval / 2) for i in range(self.n_bins)]
+
+    def midpoint_labels(self, format_string: str) -> List[str]:
+        """Bin midpoints formatted once each, indexed by bin, for building responses from bin indices."""
+        return [midpoint.strftime(format_string) for midpoint in self.midpoints]
+
+    def bin_start(self, index: int) -> datetime.datetime:
+        return self.start + index * self.interval
+
+    def bin_end(self, index: int) -> datetime.datetime:
+        return self.start + (index + 1) * self.interval
+
+    def index_of(self, timestamp: datetime.datetime) -> Optional[int]:
+        """Python-side equivalent of index_expr(), for rows already in memory."""
+        if timestamp < self.start or timestamp >= self.end:
+            return None
+        offset_us = (timestamp - self.start) // datetime.timedelta(microseconds=1)
+        return min(offset_us // self.interval_us, self.n_bins - 1)
+
+    def span_condition(self, timestamp_column):
+        return and_(timestamp_column >= self.start, timestamp_column < self.end)
+
+    def index_expr(self, timestamp_column):
+        """SQL expression evaluating to the bin index of timestamp_column (rows must lie in the span)."""
+        offset_us = microseconds_since(self.start, timestamp_column)
+        return least(floor_div(offset_us, self.interval_us), self.n_bins - 1)
+
+
+def microseconds_since(start: datetime.datetime, timestamp_column):
+    # MySQL: TIMESTAMPDIFF(MICROSECOND, start, ts). Independent of the session time zone.
+    return microseconds_between(start, timestamp_column)
+
+
+async def grab_binned_aggregates(db: AsyncSession,
+                                 bins: TimeBins,
+                                 timestamp_column,
+                                 aggregates: Dict[str, object],
+                                 group_by: Sequence = (),
+                                 conditions: Sequence = ()) -> Dict[Tuple, Dict[str, object]]:
+    """
+    Computes aggregates for every (group, bin) combination in a single grouped query.
+
+    Args:
+        db (AsyncSession): Database session for executing queries.
+        bins (TimeBins): Time bins to aggregate into.
+        timestamp_column: Column the rows are binned on.
+        aggregates (Dict[str, object]): Label -> SQL aggregate expression, e.g. {'count': func.count()}.
+        group_by (Sequence): Additional columns to group on (e.g. podID).
+        conditions (Sequence): Additional WHERE conditions.
+
+    Returns:
+        Dict[Tuple, Dict[str, object]]: Maps (*group_values, bin_index) to {label: value}.
+            Empty (group, bin) combinations are absent.
+    """
+    bin_index = bins.index_expr(timestamp_column).label('bin_index')
+    labelled = [expr.label(label) for label, expr in aggregates.items()]
+
+    # Group on the alias: the bin expression carries bound parameters, which MySQL would not match
+    # against the select list under ONLY_FULL_GROUP_BY
+    query = select(*group_by, bin_index, *labelled).\
+            where(and_(bins.span_condition(timestamp_column), *conditions)).\
+            group_by(*group_by, literal_column('bin_index'))
+
+    result = await db.execute(query)
+
+    n_groups = len(group_by)
+    labels = list(aggregates.keys())
+    binned = {}
+    for row in result.all():
+        key = tuple(row[:n_groups]) + (int(row[n_groups]),)
+        binned[key] = dict(zip(labels, row[n_groups + 1:]))
+    return binned
+
+
+async def grab_binned_counts(db: AsyncSession,
+                             bins: TimeBins,
+                             timestamp_column,
+                             group_by: Sequence = (),
+                             conditions: Sequence = ()) -> Dict[Tuple, int]:
+    """Row counts per (group, bin). Shorthand for grab_binned_aggregates with a single COUNT(*)."""
+    binned = await grab_binned_aggregates(db, bins, timestamp_column, {'count': func.count()}, group_by, conditions)
+    return {key: values['count'] for key, values in binned.items()}
+
+
+async def grab_window_counts(db: AsyncSession,
+                             timestamp_column,
+                             windows: Sequence[Tuple[datetime.datetime, datetime.datetime]],
+                             group_by: Sequence = (),
+                             conditions: Sequence = (),
+                             window_conditions: Optional[Sequence] = None) -> Dict[Tuple, int]:
+    """
+    Row counts per (group, window) for any number of (possibly overlapping) [start, end) windows,
+    computed in a single conditional-aggregation query.
+
+    Args:
+        db (AsyncSession): Database session for executing queries.
+        timestamp_column: Column the windows apply to.
+        windows (Sequence[Tuple[datetime, datetime]]): (start, end) of each window.
+        group_by (Sequence): Additional columns to group on (e.g. podID).
+        conditions (Sequence): Additional WHERE conditions applying to every window.
+        window_conditions (Optional[Sequence]): Extra condition per window, ANDed with its time range.
+
+    Returns:
+        Dict[Tuple, int]: Maps (*group_values, window_index) to a count. Zero counts are absent.
+    """
+    in_window = [and_(timestamp_column >= start, timestamp_column < end) for start, end in windows]
+    if window_conditions is not None:
+        in_window = [and_(window, condition) for window, condition in zip(in_window, window_conditions)]
+    columns = [func.sum(case((window, 1), else_=0)).label(f'window_{i}') for i, window in enumerate(in_window)]
+
+    # The overall time range lets the timestamp index narrow the scan before the per-window CASEs
+    overall = and_(timestamp_column >= min(start for start, _ in windows), timestamp_column < max(end for _, end in windows))
+    query = select(*group_by, *columns).where(and_(overall, or_(*in_window), *conditions))
+    if group_by:
+        query = query.group_by(*group_by)
+
+    result = await db.execute(query)
+
+    n_groups = len(group_by)
+    counts = {}
+    for row in result.all():
+        for i, count in enumerate(row[n_groups:]):
+            if count:
+                counts[tuple(row[:n_groups]) + (i,)] = int(count)
+    return counts
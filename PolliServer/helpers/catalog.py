@@ -0,0 +1,194 @@
+# PolliServer/helpers/catalog.py
+import asyncio
+import time
+from typing import List, Optional
+
+from sqlalchemy import Date, and_, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from PolliServer.constants import *
+from PolliServer.helpers.versioning import format_token, new_epoch, parse_since
+from PolliServer.logger.logger import LoggerSingleton
+from models.models import FrameLog, SpecimenRecord
+
+logger = LoggerSingleton().get_logger()
+
+
+def _sorted_values(values) -> list:
+    # NULLs sort last
+    return sorted(values, key=lambda value: (value is None, value))
+
+
+class CatalogSingleton:
+    """
+    Distinct pods, swarms, runs and dates seen in specimen_record (and pods seen in frame_log), plus a
+    taxon-frequency index: the specimen count and first/last seen time of every S2 taxon.
+
+    Built once with a full scan, then extended by scanning only rows above the last seen id, so the
+    /podIDs, /swarms, /runs, /dates and /taxa endpoints, the array-data grabbers and the timeline's common-taxa
+    filter never run SELECT DISTINCT or GROUP BY over the whole table. Rows are only ever added to these
+    tables, so the sets only grow and the taxon counts can be accumulated.
+
+    Since the distinct-value lists only grow, the version each value first appeared in is enough for
+    delta responses: ?since=<version token> returns the values added since (see added_since).
+    """
+    _instance = None
+    LISTS = ('podIDs', 'swarms', 'runs', 'dates')  # Distinct-value lists served with versions
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(CatalogSingleton, cls).__new__(cls)
+            cls._instance.specimen_last_id = 0
+            cls._instance.frame_last_id = 0
+            cls._instance.specimen_combinations = set()  # (podID, swarm_name, run_name)
+            cls._instance.specimen_dates = set()  # 'YYYY-MM-DD'
+            cls._instance.frame_podIDs = set()
+            cls._instance.taxa = {}  # S2_taxonID -> {'taxonID_str', 'taxonRank', 'count', 'first_seen', 'last_seen'}
+            cls._instance.refreshed_at = None
+            cls._instance.epoch = new_epoch()
+            cls._instance.version = 0  # Bumped by every refresh that adds a value to one of the LISTS
+            cls._instance.value_versions = {name: {} for name in cls.LISTS}  # List name -> value -> version it appeared in
+            cls._instance._lock = asyncio.Lock()
+        return cls._instance
+
+    async def refresh(self, db: AsyncSession):
+        async with self._lock:
+            # Bound each scan by the current max id, so rows inserted meanwhile are picked up next time
+            max_specimen_id = (await db.execute(select(func.max(SpecimenRecord.id)))).scalar_one()
+            if max_specimen_id is not None and max_specimen_id > self.specimen_last_id:
+                new_rows = and_(SpecimenRecord.id > self.specimen_last_id, SpecimenRecord.id <= max_specimen_id)
+                query = select(SpecimenRecord.podID, SpecimenRecord.swarm_name, SpecimenRecord.run_name,
+                               func.date(SpecimenRecord.timestamp, type_=Date)).where(new_rows).distinct()
+                result = await db.execute(query)
+                for podID, swarm_name, run_name, date in result.all():
+                    self.specimen_combinations.add((podID, swarm_name, run_name))
+                    if date is not None:
+                        self.specimen_dates.add(date.strftime(DATE_FORMAT_STRING))
+                await self._refresh_taxa(db, new_rows)
+                self.specimen_last_id = max_specimen_id
+
+            max_frame_id = (await db.execute(select(func.max(FrameLog.id)))).scalar_one()
+            if max_frame_id is not None and max_frame_id > self.frame_last_id:
+                new_rows = and_(FrameLog.id > self.frame_last_id, FrameLog.id <= max_frame_id)
+                result = await db.execute(select(FrameLog.podID).where(new_rows).distinct())
+                self.frame_podIDs.update(result.scalars().all())
+                self.frame_last_id = max_frame_id
+
+            self._record_versions()
+            self.refreshed_at = time.monotonic()
+
+    def _list(self, name: str) -> list:
+        return {'podIDs': self.pod_ids, 'swarms': self.swarms, 'runs': self.runs, 'dates': self.dates}[name]()
+
+    def _record_versions(self):
+        added = {name: [value for value in self._list(name) if value not in self.value_versions[name]] for name in self.LISTS}
+        if any(added.values()):
+            self.version += 1
+            for name, values in added.items():
+                for value in values:
+                    self.value_versions[name][value] = self.version
+
+    async def _refresh_taxa(self, db: AsyncSession, new_rows):
+        # Fold the per-taxon counts of the new rows into the index
+        query = select(SpecimenRecord.S2_taxonID,
+                       func.max(SpecimenRecord.S2_taxonID_str),
+                       func.max(SpecimenRecord.S2_taxonRank),
+                       func.count(),
+                       func.min(SpecimenRecord.timestamp),
+                       func.max(SpecimenRecord.timestamp)).\
+                where(new_rows, SpecimenRecord.S2_taxonID.isnot(None)).\
+                group_by(SpecimenRecord.S2_taxonID)
+        result = await db.execute(query)
+        for taxonID, taxonID_str, taxonRank, count, first_seen, last_seen in result.all():
+            taxon = self.taxa.get(taxonID)
+            if taxon is None:
+                self.taxa[taxonID] = {'taxonID_str': taxonID_str, 'taxonRank': taxonRank, 'count': count,
+                                      'first_seen': first_seen, 'last_seen': last_seen}
+                continue
+            taxon['count'] += count
+            taxon['taxonID_str'] = taxon['taxonID_str'] or taxonID_str
+            taxon['taxonRank'] = taxon['taxonRank'] or taxonRank
+            if first_seen is not None and (taxon['first_seen'] is None or first_seen < taxon['first_seen']):
+                taxon['first_seen'] = first_seen
+            if last_seen is not None and (taxon['last_seen'] is None or last_seen > taxon['last_seen']):
+                taxon['last_seen'] = last_seen
+
+    async def ensure_fresh(self, db: AsyncSession, max_age: float = CATALOG_MAX_AGE_SECONDS):
+        # Normally a no-op: the background refresher keeps the catalog well within max_age
+        if self.refreshed_at is None or time.monotonic() - self.refreshed_at > max_age:
+            await self.refresh(db)
+
+    # --- Lookups --- #
+
+    def pod_ids(self) -> List[str]:
+        return _sorted_values({podID for podID, _, _ in self.specimen_combinations if podID is not None})
+
+    def swarms(self) -> List[str]:
+        return _sorted_values({swarm_name for _, swarm_name, _ in self.specimen_combinations if swarm_name is not None})
+
+    def runs(self) -> List[str]:
+        return _sorted_values({run_name for _, _, run_name in self.specimen_combinations if run_name is not None})
+
+    def dates(self) -> List[str]:
+        return sorted(self.specimen_dates)
+
+    @property
+    def token(self) -> str:
+        return format_token(self.epoch, self.version)
+
+    def added_since(self, name: str, since: Optional[str]) -> Optional[dict]:
+        """
+        The values of a list (one of LISTS) added since the version of the since token, or the whole list
+        (with 'full': true) if the token is not one of ours. None if nothing was added.
+        """
+        since_version = parse_since(since, self.epoch, self.version)
+        if since_version is None:
+            return {'version': self.token, 'full': True, 'added': self._list(name)}
+        added = [value for value, version in self.value_versions[name].items() if version > since_version]
+        if not added:
+            return None
+        return {'version': self.token, 'added': _sorted_values(added)}
+
+    def specimen_pod_ids(self, swarm_name: Optional[str] = None, run_name: Optional[str] = None) -> list:
+        # Pods with specimens in the given swarm and/or run (NULL podIDs included, as SELECT DISTINCT would)
+        return _sorted_values({podID for podID, pod_swarm_name, pod_run_name in self.specimen_combinations
+                               if (not swarm_name or pod_swarm_name == swarm_name) and (not run_name or pod_run_name == run_name)})
+
+    def frame_pod_ids(self) -> list:
+        return _sorted_values(self.frame_podIDs)
+
+    def common_taxon_ids(self, min_count: int) -> List[str]:
+        # S2_taxonIDs with at least min_count specimens
+        return sorted(taxonID for taxonID, taxon in self.taxa.items() if taxon['count'] >= min_count)
+
+    def taxa_list(self, min_count: int = 1, taxonRank: Optional[str] = None) -> List[dict]:
+        # Taxa ordered by specimen count (descending), then taxonID
+        taxa = [{'taxonID': taxonID,
+                 'taxonID_str': taxon['taxonID_str'],
+                 'taxonRank': taxon['taxonRank'],
+                 'count': taxon['count'],
+                 'first_seen': taxon['first_seen'].strftime(DATETIME_FORMAT_STRING) if taxon['first_seen'] else None,
+                 'last_seen': taxon['last_seen'].strftime(DATETIME_FORMAT_STRING) if taxon['last_seen'] else None}
+                for taxonID, taxon in self.taxa.items()
+                if taxon['count'] >= min_count and (not taxonRank or taxon['taxonRank'] == taxonRank)]
+        return sorted(taxa, key=lambda taxon: (-taxon['count'], taxon['taxonID']))
+
+
+async def get_catalog(db: AsyncSession) -> CatalogSingleton:
+    catalog = CatalogSingleton()
+    await catalog.ensure_fresh(db)
+    return catalog
+
+
+async def run_catalog_refresher(sessionmaker, interval: float = CATALOG_REFRESH_INTERVAL_SECONDS):
+    """Background task: builds the catalog, then extends it with new rows every <interval> seconds."""
+    while True:
+        try:
+            async with sessionmaker() as db:
+                await CatalogSingleton().refresh(db)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.server_error(f"Error refreshing catalog: {e}")
+        await asyncio.sleep(interval)
@@ -0,0 +1,147 @@
+# PolliServer/helpers/export.py
+import datetime
+from typing import List, Optional
+
+from sqlalchemy import and_, types
+from sqlalchemy.future import select
+
+from PolliServer.constants import *
+from PolliServer.helpers.grabbers import select_fields
+from models.models import SpecimenRecord, FrameRecord, SensorRecord, PollinationRecord
+
+# pyarrow is optional: without it the export endpoint answers 501
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+# Exportable tables, by the record_type used in /export/{record_type}
+EXPORT_MODELS = {
+    'specimen': SpecimenRecord,
+    'frame': FrameRecord,
+    'sensor': SensorRecord,
+    'pollination': PollinationRecord,
+}
+
+# format -> (media type, file extension)
+EXPORT_FORMATS = {
+    'arrow': ('application/vnd.apache.arrow.stream', 'arrows'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+
+
+def arrow_type(column_type):
+    """Arrow type for a SQLAlchemy column type. Unrecognized types are exported as strings."""
+    if isinstance(column_type, types.Boolean):
+        return pa.bool_()
+    if isinstance(column_type, types.Integer):
+        return pa.int64()
+    if isinstance(column_type, types.Float):
+        return pa.float64()
+    if isinstance(column_type, types.DateTime):
+        return pa.timestamp('us')
+    if isinstance(column_type, types.Date):
+        return pa.date32()
+    return pa.string()
+
+
+def build_export_query(record_type: str,
+                       start: Optional[datetime.datetime] = None,
+                       end: Optional[datetime.datetime] = None,
+                       podID: Optional[List[str]] = None,
+                       swarm_name: Optional[str] = None,
+                       run_name: Optional[str] = None,
+                       fields: Optional[List[str]] = None):
+    """
+    Builds the export query for a record type, ordered by (timestamp, id).
+
+    Returns:
+        Tuple[Select, List[Column]]: The query, and the selected columns in order.
+
+    Raises:
+        ValueError: For an unknown record type or field, or a filter the table does not support.
+    """
+    if record_type not in EXPORT_MODELS:
+        raise ValueError(f"Unknown record type: {record_type}. Expected one of {list(EXPORT_MODELS)}")
+    model = EXPORT_MODELS[record_type]
+    table_columns = model.__table__.columns
+
+    columns = [table_columns[field] for field in select_fields(fields, table_columns.keys())]
+
+    conditions = []
+    if start:
+        conditions.append(model.timestamp >= start)
+    if end:
+        conditions.append(model.timestamp < end)
+    for name, value in (('podID', podID), ('swarm_name', swarm_name), ('run_name', run_name)):
+        if not value:
+            continue
+        if name not in table_columns:
+            raise ValueError(f"{record_type} records cannot be filtered by {name}")
+        conditions.append(table_columns[name].in_(value) if name == 'podID' else table_columns[name] == value)
+
+    query = select(*columns).where(and_(*conditions)).order_by(model.timestamp, model.id)
+    return query, columns
+
+
+class _ChunkSink:
+    """Write-only file object collecting a writer's output, so it can be streamed out chunk by chunk."""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def writable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return False
+
+    def drain(self) -> bytes:
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+async def stream_export(sessionmaker, query, columns, export_format: str = 'arrow'):
+    """
+    Yields the query results as an Arrow IPC stream or a Parquet file.
+
+    Rows are read through a server-side cursor EXPORT_BATCH_ROWS at a time. Each batch is converted
+    column by column into an Arrow record batch and written out (as one Parquet row group) before the
+    next is fetched, so memory use does not grow with the size of the export.
+    """
+    schema = pa.schema([pa.field(column.key, arrow_type(column.type)) for column in columns])
+    sink = _ChunkSink()
+    if export_format == 'parquet':
+        writer = pq.ParquetWriter(sink, schema, compression=EXPORT_PARQUET_COMPRESSION)
+    else:
+        writer = pa.ipc.new_stream(sink, schema)
+
+    async with sessionmaker() as db:
+        result = await db.stream(query.execution_options(yield_per=EXPORT_BATCH_ROWS))
+        async for rows in result.partitions():
+            arrays = [pa.array(values, type=field.type) for values, field in zip(zip(*rows), schema)]
+            writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=schema))
+            yield sink.drain()
+
+    writer.close()
+    yield sink.drain()
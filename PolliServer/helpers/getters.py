@@ -1,88 +1,53 @@
 # PolliServer/helpers/getters.py
-from datetime import datetime, timedelta
-from typing import Dict
+from typing import Dict, List
 from sqlalchemy import select, and_, func, desc
 from sqlalchemy.ext.asyncio import AsyncSession
 from models.models import FrameLog, SensorRecord, SpecimenRecord
+from PolliServer.helpers.stat_getters import get_span_counts, percent_change
 
 
-async def get_frame_counts(db: AsyncSession, hours: int = 24, podID: str = None, compare: bool = False):
-    # Calculate the datetime for <hours> ago
-    hours_ago = datetime.utcnow() - timedelta(hours=hours)
+# Filters applied by get_specimen_counts: confident, reasonably sized detections made in swarm mode
+SPECIMEN_COUNT_CONDITIONS = [
+    SpecimenRecord.S1_score > 0.3,
+    SpecimenRecord.S2_taxonID_score > 0.3,
+    SpecimenRecord.bbox_rel_area > 0.005,
+    SpecimenRecord.polli_mode == "swarm",
+]
 
-    # Define the base query
-    base_query = select(func.count())
 
-    # If podID is provided, add it to the filters
-    if podID:
-        base_query = base_query.where(FrameLog.podID == podID)
+def _format_span_counts(span_counts: Dict[int, Dict[str, int]], compare: bool):
+    # {span: {'current', 'previous'}} -> {span: {'current', ['previous',] 'span', ['diff']}}
+    formatted = {}
+    for hours, counts in span_counts.items():
+        if compare:
+            formatted[hours] = {'current': counts['current'], 'previous': counts['previous'], 'span': hours,
+                                'diff': percent_change(counts['current'], counts['previous'])}
+        else:
+            formatted[hours] = {'current': counts['current'], 'span': hours}
+    return formatted
 
-    # Query for the current period
-    current_query = base_query.where(FrameLog.timestamp >= hours_ago)
-    current_result = await db.execute(current_query)
-    current_count = current_result.scalar_one()
 
-    if compare:
-        # Calculate the datetime for <hours> ago from the start of the current period
-        previous_hours_ago = hours_ago - timedelta(hours=hours)
+async def get_frame_span_counts(db: AsyncSession, spans: List[int], podID: str = None, compare: bool = False):
+    # Frame counts for several spans (hours) at once, keyed by span. Counts come from the rollups where possible.
+    span_counts = await get_span_counts(db, 'frame_log', spans, compare=compare, podIDs=[podID] if podID else None)
+    return _format_span_counts(span_counts, compare)
 
-        # Query for the previous period
-        previous_query = base_query.where(and_(FrameLog.timestamp >= previous_hours_ago, FrameLog.timestamp < hours_ago))
-        previous_result = await db.execute(previous_query)
-        previous_count = previous_result.scalar_one()
 
-        # Calculate the percent difference
-        diff = ((current_count - previous_count) / previous_count) * 100 if previous_count else 0
+async def get_specimen_span_counts(db: AsyncSession, spans: List[int], podID: str = None, swarm_name: str = None, compare: bool = False):
+    # Specimen counts for several spans (hours) at once, keyed by span, with the SPECIMEN_COUNT_CONDITIONS filters
+    span_counts = await get_span_counts(db, 'specimen_record', spans, compare=compare, podIDs=[podID] if podID else None,
+                                        swarm_name=swarm_name, conditions=SPECIMEN_COUNT_CONDITIONS)
+    return _format_span_counts(span_counts, compare)
 
-        # Return the counts for the current and previous periods, the span, and the percent difference
-        return {'current': current_count, 'previous': previous_count, 'span': hours, 'diff': diff}
 
-    # If not comparing, return the count for the current period and the span
-    return {'current': current_count, 'span': hours}
+async def get_frame_counts(db: AsyncSession, hours: int = 24, podID: str = None, compare: bool = False):
+    # Returns {'current', 'span'}, plus {'previous', 'diff'} if comparing with the previous period
+    return (await get_frame_span_counts(db, [hours], podID, compare))[hours]
 
 
 async def get_specimen_counts(db: AsyncSession, hours: int, podID: str = None, swarm_name: str = None, compare: bool = False):
-    # Calculate the datetime for <hours> ago
-    hours_ago = datetime.utcnow() - timedelta(hours=hours)
-
-    # Define the base query with the required filters
-    base_query = select(func.count()).where(and_(
-        SpecimenRecord.S1_score > 0.3,
-        SpecimenRecord.S2_taxonID_score > 0.3,
-        SpecimenRecord.bbox_rel_area > 0.005,
-        SpecimenRecord.polli_mode == "swarm"
-    ))
-
-    # If podID is provided, add it to the filters
-    if podID:
-        base_query = base_query.where(SpecimenRecord.podID == podID)
-
-    # If swarm_name is provided, add it to the filters
-    if swarm_name:
-        base_query = base_query.where(SpecimenRecord.swarm_name == swarm_name)
-
-    # Query for the current period
-    current_query = base_query.where(SpecimenRecord.timestamp >= hours_ago)
-    current_result = await db.execute(current_query)
-    current_count = current_result.scalar_one()
-
-    if compare:
-        # Calculate the datetime for <hours> ago from the start of the current period
-        previous_hours_ago = hours_ago - timedelta(hours=hours)
-
-        # Query for the previous period
-        previous_query = base_query.where(and_(SpecimenRecord.timestamp >= previous_hours_ago, SpecimenRecord.timestamp < hours_ago))
-        previous_result = await db.execute(previous_query)
-        previous_count = previous_result.scalar_one()
-
-        # Calculate the percent difference
-        diff = ((current_count - previous_count) / previous_count) * 100 if previous_count else 0
-
-        # Return the counts for the current and previous periods, the span, and the percent difference
-        return {'current': current_count, 'previous': previous_count, 'span': hours, 'diff': diff}
-
-    # If not comparing, return the count for the current period and the span
-    return {'current': current_count, 'span': hours}
+    # Returns {'current', 'span'}, plus {'previous', 'diff'} if comparing with the previous period
+    return (await get_specimen_span_counts(db, [hours], podID, swarm_name, compare))[hours]
 
 async def get_recent_location(db: AsyncSession, podID: str):
     # Query the SensorRecord table for the most recent record for this podID with non-empty latitude and longitude
@@ -97,4 +62,30 @@ async def get_recent_location(db: AsyncSession, podID: str):
         return {'latitude': record.latitude, 'longitude': record.longitude}
 
     # If no record was found, return None
-    return None
\ No newline at end of file
+    return None
+
+
+async def get_frame_span_counts_by_pod(db: AsyncSession, podIDs: List[str], spans: List[int], compare: bool = False):
+    # Frame counts for all the given pods and spans in one grouped read: {podID: {span: {...}}}.
+    # Pods without frames are included with zero counts.
+    pod_span_counts = await get_span_counts(db, 'frame_log', spans, compare=compare, podIDs=podIDs, group_by_pod=True)
+    return {podID: _format_span_counts(pod_span_counts[podID], compare) for podID in podIDs}
+
+async def get_frame_counts_by_pod(db: AsyncSession, podIDs: List[str], hours: int = 24) -> Dict[str, int]:
+    # Frame counts over the last <hours> for all the given pods at once (0 for pods without frames)
+    pod_span_counts = await get_span_counts(db, 'frame_log', [hours], compare=False, podIDs=podIDs, group_by_pod=True)
+    return {podID: pod_span_counts[podID][hours]['current'] for podID in podIDs}
+
+async def get_recent_locations(db: AsyncSession, podIDs: List[str]) -> Dict[str, Dict[str, float]]:
+    # Most recent SensorRecord location for each of the given pods, in one greatest-per-group query
+    has_location = and_(SensorRecord.latitude.isnot(None), SensorRecord.longitude.isnot(None))
+    latest = select(SensorRecord.podID, func.max(SensorRecord.timestamp).label('latest_timestamp')).\
+             where(and_(SensorRecord.podID.in_(podIDs), has_location)).\
+             group_by(SensorRecord.podID).subquery()
+    stmt = select(SensorRecord.podID, SensorRecord.latitude, SensorRecord.longitude).\
+           join(latest, and_(SensorRecord.podID == latest.c.podID, SensorRecord.timestamp == latest.c.latest_timestamp)).\
+           where(has_location)
+    result = await db.execute(stmt)
+
+    # Pods without a located SensorRecord are absent
+    return {podID: {'latitude': latitude, 'longitude': longitude} for podID, latitude, longitude in result.all()}
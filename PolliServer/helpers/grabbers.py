@@ -1,5 +1,7 @@
 # PolliOS/PolliServer/helpers/grabbers.py
+import bisect
 import datetime
+import json
 from sqlalchemy import and_, or_, func
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
@@ -9,69 +11,48 @@ import traceback
 from PolliServer.constants import *
 from models.models import SpecimenRecord, PodRecord, FrameLog, WeatherRecord
 from PolliServer.logger.logger import LoggerSingleton
-from PolliServer.helpers.getters import get_frame_counts, get_recent_location
+from PolliServer.helpers.getters import get_frame_counts_by_pod, get_recent_locations
+from PolliServer.helpers.binning import TimeBins, grab_binned_aggregates, grab_binned_counts
+from PolliServer.helpers.rollups import grab_rollup_binned_counts
+from PolliServer.helpers.catalog import get_catalog
+from PolliServer.helpers.pagination import encode_cursor, after_cursor
 
 logger = LoggerSingleton().get_logger()
 
 
+def select_fields(requested: Optional[List[str]], available: List[str]) -> List[str]:
+    """
+    Resolves a fields= selection. Accepts repeated and/or comma-separated names, e.g. ['a,b', 'c'].
+    Returns all available fields if nothing was requested; raises ValueError for unknown fields.
+    """
+    if not requested:
+        return list(available)
+    selected = []
+    for name in (name.strip() for value in requested for name in value.split(',')):
+        if name and name not in selected:
+            selected.append(name)
+    unknown = [name for name in selected if name not in available]
+    if unknown:
+        raise ValueError(f"Unknown fields: {unknown}. Expected any of {list(available)}")
+    return selected
+
 # NOTE: For @app.get("/frame-log-array-data") endpoint
-async def grab_frame_log_array_data(db: AsyncSession, span: int, n_bins: int, swarm_name: Optional[str] = None, run_name: Optional[str] = None):
-    # Convert span from hours to a timedelta
-    span_delta = datetime.timedelta(hours=span)
-    end_datetime = datetime.datetime.utcnow()
-    start_datetime = end_datetime - span_delta
-
-    # Calculate the time interval for each bin
-    bin_interval = span_delta / n_bins
-
-    # Initialize a list to hold the midpoint of each time bin
-    bin_midpoints = [start_datetime + (i * bin_interval) + (bin_interval / 2) for i in range(n_bins)]
-
-    # Query all unique podIDs within the span to pre-populate the structure
-    pod_ids_query = select(FrameLog.podID).distinct()
-    result = await db.execute(pod_ids_query)
-    all_podIDs = [row[0] for row in result.all()]
-
-    # Initialize a structure to hold the data for each podID for each time bin
-    frame_log_dict = {podID: {bin_midpoint.strftime(DATETIME_FORMAT_STRING): 0 for bin_midpoint in bin_midpoints} for podID in all_podIDs}
-
-    for i in range(n_bins):
-        # Calculate the start and end time for the current bin
-        bin_start_time = start_datetime + i * bin_interval
-        bin_end_time = bin_start_time + bin_interval
-
-        # Build the query to count frames and group by podID
-        query = select(FrameLog.podID, func.count(FrameLog.id)).\
-                filter(FrameLog.timestamp.between(bin_start_time, bin_end_time)).\
-                group_by(FrameLog.podID)
-                
-                # FUTURE: Add filters for swarm_name and run_name, if provided
-
-        # Execute the query
-        result = await db.execute(query)
-        frames_per_pod = result.all()
-
-        # Update the structure with actual counts
-        for podID, count in frames_per_pod:
-            frame_log_dict[podID][bin_midpoints[i].strftime(DATETIME_FORMAT_STRING)] = count
-
-    # Convert the dictionary to the list of objects expected by the frontend
-    final_data = []
-    for podID, bins in frame_log_dict.items():
-        for bin_midpoint, count in bins.items():
-            final_data.append({
-                "time_bin_midpoint": bin_midpoint,
-                "count": count,
-                "podID": podID
-            })
+async def grab_frame_log_array_data(db: AsyncSession, span: int, n_bins: int, swarm_name: Optional[str] = None, run_name: Optional[str] = None, columnar: bool = False):
+    bins = TimeBins.trailing(span, n_bins)
+
+    # All unique podIDs, to pre-populate the structure
+    all_podIDs = (await get_catalog(db)).frame_pod_ids()
 
-    # Sort final_data by time_bin_midpoint
-    final_data_sorted = sorted(final_data, key=lambda x: datetime.datetime.strptime(x["time_bin_midpoint"], DATETIME_FORMAT_STRING))
+    # Count frames for every (podID, bin), from the rollups where possible
+    # FUTURE: Add filters for swarm_name and run_name, if provided
+    counts = await grab_rollup_binned_counts(db, 'frame_log', bins)
 
-    return final_data_sorted
+    if columnar:
+        return build_binned_count_columns(bins, all_podIDs, counts)
+    return build_binned_count_rows(bins, all_podIDs, counts)
 
 # NOTE: For @app.get("/specimen-log-array-data") endpoint
-async def grab_specimen_log_array_data(db: AsyncSession, span: int, n_bins: int, swarm_name: Optional[str] = None, run_name: Optional[str] = None):
+async def grab_specimen_log_array_data(db: AsyncSession, span: int, n_bins: int, swarm_name: Optional[str] = None, run_name: Optional[str] = None, columnar: bool = False):
     """
     Fetches specimen log data, aggregated into time bins, optionally filtered by swarm_name and/or run_name.
     
@@ -81,80 +62,93 @@ async def grab_specimen_log_array_data(db: AsyncSession, span: int, n_bins: int,
         n_bins (int): Number of bins to divide the time span into.
         swarm_name (Optional[str]): Name of the swarm to filter by. Default is None.
         run_name (Optional[str]): Name of the run to filter by. Default is None.
+        columnar (bool): Whether to return the columnar format (see build_binned_count_columns). Default is False.
     
     Returns:
         List[Dict]: A list of dictionaries, each representing a time bin with the following keys:
             - "time_bin_midpoint": The midpoint of the time bin, as a string in DATETIME_FORMAT_STRING format.
             - "count": The number of specimens recorded in this time bin.
             - "podID": The ID of the pod.
+        Or, if columnar, a single dictionary of arrays.
     
     This function mimics the structure and logic of grab_frame_log_array_data, but queries the SpecimenRecord table.
     """
-    # Convert span from hours to a timedelta
-    span_delta = datetime.timedelta(hours=span)
-    end_datetime = datetime.datetime.utcnow()
-    start_datetime = end_datetime - span_delta
+    bins = TimeBins.trailing(span, n_bins)
 
-    # Calculate the time interval for each bin
-    bin_interval = span_delta / n_bins
+    # All unique podIDs in the swarm/run, to pre-populate the structure
+    all_podIDs = (await get_catalog(db)).specimen_pod_ids(swarm_name, run_name)
 
-    # Initialize a list to hold the midpoint of each time bin
-    bin_midpoints = [start_datetime + (i * bin_interval) + (bin_interval / 2) for i in range(n_bins)]
+    # Count specimens for every (podID, bin), from the rollups where possible
+    counts = await grab_rollup_binned_counts(db, 'specimen_record', bins, swarm_name=swarm_name, run_name=run_name)
+
+    if columnar:
+        return build_binned_count_columns(bins, all_podIDs, counts)
+    return build_binned_count_rows(bins, all_podIDs, counts)
+
+def build_binned_count_rows(bins: TimeBins, all_podIDs: List[str], counts: dict):
+    """
+    Expands sparse {(podID, bin_index): count} results into the list of objects expected by the frontend,
+    with a zero entry for every pod and bin that had no rows.
+
+    Rows are emitted in time order (then in all_podIDs order) directly from the bin indices, so nothing
+    needs re-sorting, and each bin midpoint is formatted once.
+    """
+    midpoint_labels = bins.midpoint_labels(DATETIME_FORMAT_STRING)
 
-    # Query all unique podIDs within the span to pre-populate the structure
-    pod_ids_query = select(SpecimenRecord.podID).distinct()
-    if swarm_name:
-        pod_ids_query = pod_ids_query.filter(SpecimenRecord.swarm_name == swarm_name)
-    if run_name:
-        pod_ids_query = pod_ids_query.filter(SpecimenRecord.run_name == run_name)
-    result = await db.execute(pod_ids_query)
-    all_podIDs = [row[0] for row in result.all()]
-
-    # Initialize a structure to hold the data for each podID for each time bin
-    specimen_log_dict = {podID: {bin_midpoint.strftime(DATETIME_FORMAT_STRING): 0 for bin_midpoint in bin_midpoints} for podID in all_podIDs}
-
-    for i in range(n_bins):
-        # Calculate the start and end time for the current bin
-        bin_start_time = start_datetime + i * bin_interval
-        bin_end_time = bin_start_time + bin_interval
-
-        # Build the query to count specimens and group by podID
-        query = select(SpecimenRecord.podID, func.count(SpecimenRecord.id)).\
-                filter(SpecimenRecord.timestamp.between(bin_start_time, bin_end_time))
-        if swarm_name:
-            query = query.filter(SpecimenRecord.swarm_name == swarm_name)
-        if run_name:
-            query = query.filter(SpecimenRecord.run_name == run_name)
-        query = query.group_by(SpecimenRecord.podID)
-
-        # Execute the query
-        result = await db.execute(query)
-        specimens_per_pod = result.all()
-
-        # Update the structure with actual counts
-        for podID, count in specimens_per_pod:
-            specimen_log_dict[podID][bin_midpoints[i].strftime(DATETIME_FORMAT_STRING)] = count
-
-    # Convert the dictionary to the list of objects expected by the frontend
     final_data = []
-    for podID, bins in specimen_log_dict.items():
-        for bin_midpoint, count in bins.items():
+    for bin_index, time_bin_midpoint in enumerate(midpoint_labels):
+        for podID in all_podIDs:
             final_data.append({
-                "time_bin_midpoint": bin_midpoint,
-                "count": count,
+                "time_bin_midpoint": time_bin_midpoint,
+                "count": counts.get((podID, bin_index), 0),
                 "podID": podID
             })
 
-    # Sort final_data by time_bin_midpoint
-    final_data_sorted = sorted(final_data, key=lambda x: datetime.datetime.strptime(x["time_bin_midpoint"], DATETIME_FORMAT_STRING))
+    return final_data
+
+def build_binned_count_columns(bins: TimeBins, all_podIDs: List[str], counts: dict):
+    """
+    Columnar (struct-of-arrays) equivalent of build_binned_count_rows:
 
-    return final_data_sorted
+        {"time_bin_midpoints": [midpoint, ...],    # n_bins
+         "podIDs": [podID, ...],                   # n_pods
+         "counts": [[count, ...], ...]}            # n_pods x n_bins; counts[i][j] is podIDs[i] in bin j
+    """
+    pod_indices = {podID: i for i, podID in enumerate(all_podIDs)}
+    matrix = [[0] * bins.n_bins for _ in all_podIDs]
+    for (podID, bin_index), count in counts.items():
+        i = pod_indices.get(podID)
+        if i is not None:
+            matrix[i][bin_index] = count
+
+    return {
+        "time_bin_midpoints": bins.midpoint_labels(DATETIME_FORMAT_STRING),
+        "podIDs": list(all_podIDs),
+        "counts": matrix,
+    }
+
+# Weather fields returned when lite=True
+WEATHER_LITE_FIELDS = ["cloud_coverage", "wind_speed", "humidity", "temperature", "uv_index"]
+
+# Numeric weather measurements that can be aggregated per bin
+WEATHER_NUMERIC_FIELDS = ["cloud_coverage", "rain_last_3h", "wind_degree", "wind_speed", "humidity", "pressure",
+                          "temperature", "snow_last_3h", "aqi", "coi", "nh3i", "noi", "no2i", "o3i", "so2i",
+                          "pm2_5i", "pm10i", "uv_index"]
+
+WEATHER_AGGREGATES = {
+    'mean': func.avg,
+    'min': func.min,
+    'max': func.max,
+}
 
 # NOTE: For @app.get("/weather-log-array-data") endpoint
-async def grab_weather_log_array_data(db: AsyncSession, span: int, n_bins: int, swarm_name: Optional[str] = None, lite: bool = False):
+async def grab_weather_log_array_data(db: AsyncSession, span: int, n_bins: int, swarm_name: Optional[str] = None, lite: bool = False, aggregate: Optional[str] = None, fields: Optional[List[str]] = None, columnar: bool = False):
     """
     Fetches weather log data, aggregated into time bins, optionally filtered by swarm_name.
-    If 'lite' is True, only returns a subset of the weather data.
+    If 'lite' is True, only returns a subset of the weather data; 'fields' selects the returned fields explicitly.
+
+    By default each bin holds the record nearest to the bin midpoint. If 'aggregate' is given, each bin
+    instead holds the mean, min or max of every numeric field over the records in that bin, computed in SQL.
 
     Args:
         db (AsyncSession): Database session for executing queries.
@@ -162,49 +156,110 @@ async def grab_weather_log_array_data(db: AsyncSession, span: int, n_bins: int,
         n_bins (int): Number of bins to divide the time span into.
         swarm_name (Optional[str]): Name of the swarm to filter by. Default is None.
         lite (bool): Whether to return a lite version of the data. Default is False.
+        aggregate (Optional[str]): One of 'mean', 'min' or 'max'. Default is None (nearest record).
+        fields (Optional[List[str]]): Weather fields to return, overriding 'lite'. Default is None.
+        columnar (bool): Whether to return one array per field instead of one object per bin. Default is False.
     
     Returns:
         List[Dict]: A list of dictionaries, each representing a time bin with weather data.
+        Or, if columnar: {"time_bin_midpoints": [...], "fields": {field: [value per bin, None if missing]}}.
     """
-    span_delta = datetime.timedelta(hours=span)
-    end_datetime = datetime.datetime.utcnow()
-    start_datetime = end_datetime - span_delta
-    bin_interval = span_delta / n_bins
-    bin_midpoints = [start_datetime + (i * bin_interval) + (bin_interval / 2) for i in range(n_bins)]
+    if aggregate is not None and aggregate not in WEATHER_AGGREGATES:
+        raise ValueError(f"Unsupported aggregate: {aggregate}. Expected one of {list(WEATHER_AGGREGATES)}")
+
+    bins = TimeBins.trailing(span, n_bins)
+    bin_midpoints = bins.midpoints
+    midpoint_labels = bins.midpoint_labels(DATETIME_FORMAT_STRING)
 
-    query = select(WeatherRecord).where(WeatherRecord.timestamp.between(start_datetime, end_datetime))
+    conditions = []
     if swarm_name:
-        query = query.filter(WeatherRecord.swarm_name == swarm_name)
-    
-    result = await db.execute(query)
-    weather_records = result.scalars().all()
+        conditions.append(WeatherRecord.swarm_name == swarm_name)
+
+    if aggregate:
+        if fields:
+            fields = select_fields(fields, WEATHER_NUMERIC_FIELDS)
+        else:
+            fields = [field for field in WEATHER_NUMERIC_FIELDS if not lite or field in WEATHER_LITE_FIELDS]
+        aggregate_func = WEATHER_AGGREGATES[aggregate]
+        aggregates = {field: aggregate_func(getattr(WeatherRecord, field)) for field in fields}
+        binned = await grab_binned_aggregates(db, bins, WeatherRecord.timestamp, aggregates, conditions=conditions)
+
+        if columnar:
+            columns = {field: [None] * n_bins for field in fields}
+            for (bin_index,), values in binned.items():
+                for field, value in values.items():
+                    columns[field][bin_index] = float(value) if aggregate == 'mean' and value is not None else value
+            return {"time_bin_midpoints": midpoint_labels, "fields": columns}
+
+        final_data = []
+        for (bin_index,), values in sorted(binned.items()):
+            data = {field: float(value) if aggregate == 'mean' else value for field, value in values.items() if value is not None}
+            final_data.append({"time_bin_midpoint": midpoint_labels[bin_index], "data": data})
+        return final_data
+
+    # Columnar projection of only the requested fields, ordered by time for the nearest-record search
+    if fields:
+        fields = select_fields(fields, WeatherRecord.__table__.columns.keys())
+    else:
+        fields = WEATHER_LITE_FIELDS if lite else WeatherRecord.__table__.columns.keys()
+    query = select(WeatherRecord.timestamp, *[getattr(WeatherRecord, field) for field in fields]).\
+            where(WeatherRecord.timestamp.between(bins.start, bins.end), *conditions).\
+            order_by(WeatherRecord.timestamp)
 
-    # Initialize a dictionary to hold the closest record to each bin midpoint
-    closest_records = {}
+    result = await db.execute(query)
+    rows = result.all()
+    if not rows:
+        return {"time_bin_midpoints": midpoint_labels, "fields": {field: [None] * n_bins for field in fields}} if columnar else []
+    timestamps = [row[0] for row in rows]
 
+    # The nearest record is either the first at/after the midpoint or the one just before it
+    nearest_rows = []
     for bin_midpoint in bin_midpoints:
-        closest_record = None
-        smallest_diff = None
-        for record in weather_records:
-            current_diff = abs(record.timestamp - bin_midpoint)
-            if closest_record is None or current_diff < smallest_diff:
-                closest_record = record
-                smallest_diff = current_diff
-        if closest_record:
-            data = {field: getattr(closest_record, field) for field in WeatherRecord.__table__.columns.keys() if getattr(closest_record, field) is not None}
-            if lite:
-                data = {k: v for k, v in data.items() if k in ["cloud_coverage", "wind_speed", "humidity", "temperature", "uv_index"]}
-            closest_records[bin_midpoint.strftime(DATETIME_FORMAT_STRING)] = data
-
-    final_data = [{"time_bin_midpoint": key, "data": value} for key, value in closest_records.items()]
-    final_data_sorted = sorted(final_data, key=lambda x: datetime.datetime.strptime(x["time_bin_midpoint"], DATETIME_FORMAT_STRING))
-
-    return final_data_sorted
-
-
-async def grab_swarm_status(db: AsyncSession):
+        i = bisect.bisect_left(timestamps, bin_midpoint)
+        if i == len(timestamps) or (i > 0 and bin_midpoint - timestamps[i - 1] <= timestamps[i] - bin_midpoint):
+            i -= 1
+        nearest_rows.append(rows[i])
+
+    if columnar:
+        return {"time_bin_midpoints": midpoint_labels,
+                "fields": {field: [row[j] for row in nearest_rows] for j, field in enumerate(fields, start=1)}}
+
+    final_data = []
+    for bin_index, row in enumerate(nearest_rows):
+        data = {field: value for field, value in zip(fields, row[1:]) if value is not None}
+        final_data.append({"time_bin_midpoint": midpoint_labels[bin_index], "data": data})
+
+    return final_data
+
+
+# PodRecord columns read by grab_swarm_status
+SWARM_STATUS_POD_COLUMNS = [
+    PodRecord.name,
+    PodRecord.pod_firmware_version,
+    PodRecord.address,
+    PodRecord.connection_status,
+    PodRecord.rssi,
+    PodRecord.stream_type,
+    PodRecord.location_name,
+    PodRecord.last_S1_class,
+    PodRecord.last_S2_class,
+    PodRecord.total_specimens,
+    PodRecord.last_specimen_created_time,
+    PodRecord.last_seen_time,
+]
+
+# Fields of each grab_swarm_status object
+SWARM_STATUS_FIELDS = [
+    'podID', 'podOS_version', 'pod_address', 'connection_status', 'rssi', 'stream_type', 'loc_name', 'loc_lat',
+    'loc_lon', 'total_frames', 'last_S1_class', 'last_S2_class', 'total_specimens', 'last_specimen_created_time',
+    'last_seen', 'time_since_last_seen', 'time_since_last_specimen',
+]
+
+async def grab_swarm_status(db: AsyncSession, fields: Optional[List[str]] = None):
     '''
     Get swarm status from PodRecord MySQL database records.
+    If fields is given, each object only holds those fields, and the frame count and location
+    queries are skipped unless total_frames or loc_lat/loc_lon are requested.
     Returns JSON swarm_status list with the following object values:
         - podID
         - podOS_version
@@ -221,17 +276,20 @@ async def grab_swarm_status(db: AsyncSession):
         - last_specimen_created_time
         - last_seen
     '''
+    fields = select_fields(fields, SWARM_STATUS_FIELDS)
     try:
         # Calculate the cutoff time for last_seen
         cutoff_time = datetime.datetime.utcnow() - datetime.timedelta(minutes=LAST_SEEN_THRESHOLD_MINUTES)
 
         # Query records from PodRecord table that have a last_seen time greater than the cutoff time
-        # Use select() and await for asynchronous query
-        stmt = select(PodRecord).filter(PodRecord.last_seen_time > cutoff_time)
+        # Only the columns used below are selected; PodRecord is very wide
+        stmt = select(*SWARM_STATUS_POD_COLUMNS).filter(PodRecord.last_seen_time > cutoff_time)
         result = await db.execute(stmt)
-        records = result.scalars().all()
+        records = result.all()
 
         if not records:  # If there are no records, return a list with a single status object with all fields as None
+            if len(fields) < len(SWARM_STATUS_FIELDS):
+                return [{field: None for field in fields}]
             return [{
                 'podID': None,
                 'podOS_version': None,
@@ -252,6 +310,11 @@ async def grab_swarm_status(db: AsyncSession):
                 'time_since_last_specimen': None
             }]
 
+        # Get the 24h frame counts and latest locations for all pods at once, if requested
+        podIDs = [record.name for record in records]
+        total_frames_by_pod = await get_frame_counts_by_pod(db, podIDs, hours=24) if 'total_frames' in fields else {}
+        locations = await get_recent_locations(db, podIDs) if 'loc_lat' in fields or 'loc_lon' in fields else {}
+
         swarm_status = []  # Initialize as a list
         for record in records:
             
@@ -264,11 +327,8 @@ async def grab_swarm_status(db: AsyncSession):
             else:
                 time_since_last_specimen = 0
 
-            # Get the total frames for this podID using the get_frame_counts function
-            total_frames_dict = await get_frame_counts(db, hours=24, podID=record.name, compare=False)
-            total_frames = total_frames_dict['current']
-            
-            location = await get_recent_location(db, record.name)
+            total_frames = total_frames_by_pod.get(record.name)
+            location = locations.get(record.name)
 
             pod_status = {
                 'podID': record.name,
@@ -280,7 +340,7 @@ async def grab_swarm_status(db: AsyncSession):
                 'loc_name': record.location_name,
                 'loc_lat': location['latitude'] if location else None,
                 'loc_lon': location['longitude'] if location else None,
-                'total_frames': total_frames, # total_frames, record.total_frames  # Use the total frames obtained from the get_frame_counts function
+                'total_frames': total_frames, # total_frames, record.total_frames  # Use the total frames obtained from get_frame_counts_by_pod
                 'last_S1_class': record.last_S1_class,
                 'last_S2_class': record.last_S2_class,
                 'total_specimens': record.total_specimens,
@@ -289,6 +349,8 @@ async def grab_swarm_status(db: AsyncSession):
                 'time_since_last_seen': time_since_last_seen.total_seconds() / 60.0 if record.last_seen_time else None,
                 'time_since_last_specimen': time_since_last_specimen.total_seconds() / 60.0 if record.last_specimen_created_time else None
             }
+            if len(fields) < len(SWARM_STATUS_FIELDS):
+                pod_status = {field: pod_status[field] for field in fields}
             swarm_status.append(pod_status)  # Append each status object to the list
 
         return swarm_status
@@ -299,13 +361,20 @@ async def grab_swarm_status(db: AsyncSession):
         raise e
 
 # NOTE: for /specimen-detail-timeline endpoint
-def build_specimen_detail_timeline_query(start_date=None, end_date=None, podID=None, location=None, 
-                             S1_score_thresh=0.0, S2_score_thresh=0.0, S2a_score_thresh=0.0, species_only=False):
+# SpecimenRecord columns returned by the timeline (a subset can be selected with fields=)
+SPECIMEN_DETAIL_TIMELINE_FIELDS = [
+    "timestamp", "podID", "swarm_name", "run_name", "loc_name", "latitude", "longitude",
+    "S2_taxonID_str", "S2_taxonID_score", "S2_taxonRank", "S2a_score", "S1_class",
+]
 
-    # Subquery to get S2_taxonIDs that appear at least 5 times
-    subquery = select(SpecimenRecord.S2_taxonID).group_by(SpecimenRecord.S2_taxonID).having(func.count(SpecimenRecord.S2_taxonID) >= 25)
+def build_specimen_detail_timeline_query(start_date=None, end_date=None, podID=None, location=None, 
+                             S1_score_thresh=0.0, S2_score_thresh=0.0, S2a_score_thresh=0.0, species_only=False,
+                             common_taxonIDs=None, cursor=None, limit=None, fields=SPECIMEN_DETAIL_TIMELINE_FIELDS):
 
-    stmt = select(SpecimenRecord)
+    # Only the selected columns, as plain rows (SpecimenRecord is very wide). timestamp and id are always
+    # selected, for the ordering and the next-page cursor.
+    stmt = select(SpecimenRecord.id, SpecimenRecord.timestamp,
+                  *[getattr(SpecimenRecord, field) for field in fields if field != "timestamp"])
 
     conditions = []
 
@@ -332,16 +401,38 @@ def build_specimen_detail_timeline_query(start_date=None, end_date=None, podID=N
     if species_only:
         conditions.append(SpecimenRecord.S2_taxonRank == 'L10')
 
-    # Add condition to filter S2_taxonID by subquery
-    conditions.append(SpecimenRecord.S2_taxonID.in_(subquery))
+    # Only keep common taxa: an IN list drawn from the catalog's taxon-frequency index (None: any taxon)
+    if common_taxonIDs is not None:
+        conditions.append(SpecimenRecord.S2_taxonID.in_(common_taxonIDs))
+    else:
+        conditions.append(SpecimenRecord.S2_taxonID.isnot(None))
 
-    stmt = stmt.where(and_(*conditions))
+    # Keyset pagination: resume after the last (timestamp, id) of the previous page
+    if cursor:
+        conditions.append(after_cursor(SpecimenRecord.timestamp, SpecimenRecord.id, cursor))
 
-    # Limiting the results as before
-    stmt = stmt.limit(5000)
+    stmt = stmt.where(and_(*conditions)).order_by(SpecimenRecord.timestamp, SpecimenRecord.id)
+
+    if limit is not None:
+        stmt = stmt.limit(limit)
     
     return stmt
 
+def specimen_detail_timeline_row(record, fields: List[str] = SPECIMEN_DETAIL_TIMELINE_FIELDS, incl_images: bool = False) -> dict:
+    record_dict = {field: getattr(record, field) for field in fields}
+    if "timestamp" in record_dict:
+        record_dict["timestamp"] = record.timestamp.strftime(DATETIME_FORMAT_STRING)
+    # DEV: image placeholder. Probably will not be implemented in this function
+    if incl_images:
+        record_dict["image"] = None  # Placeholder, add your image logic here
+    return record_dict
+
+async def _common_taxon_ids(db: AsyncSession, min_taxon_count: Optional[int]) -> Optional[List[str]]:
+    # Taxa with at least min_taxon_count specimens. Every taxon in the index has at least one.
+    if min_taxon_count and min_taxon_count > 1:
+        return (await get_catalog(db)).common_taxon_ids(min_taxon_count)
+    return None
+
 async def grab_specimen_detail_timeline(db: AsyncSession,
                              start_date: Optional[str] = None,
                              end_date: Optional[str] = None,
@@ -351,92 +442,112 @@ async def grab_specimen_detail_timeline(db: AsyncSession,
                              S1_score_thresh: Optional[float] = 0.0,
                              S2_score_thresh: Optional[float] = 0.0,
                              S2a_score_thresh: Optional[float] = 0.0,
-                             incl_images: Optional[bool] = False):
+                             incl_images: Optional[bool] = False,
+                             min_taxon_count: Optional[int] = TIMELINE_MIN_TAXON_COUNT,
+                             cursor: Optional[str] = None,
+                             limit: int = TIMELINE_PAGE_SIZE,
+                             fields: Optional[List[str]] = None):
+    """
+    Fetches one page of the specimen detail timeline, ordered by (timestamp, id).
+    'fields' selects the returned fields (default: SPECIMEN_DETAIL_TIMELINE_FIELDS).
 
+    Returns:
+        Tuple[List[Dict], Optional[str]]: The rows of the page, and the cursor of the next page
+            (None if this is the last page).
+    """
+    fields = select_fields(fields, SPECIMEN_DETAIL_TIMELINE_FIELDS)
+    common_taxonIDs = await _common_taxon_ids(db, min_taxon_count)
+
+    # Fetch one extra row to learn whether there is a next page
     records_query = build_specimen_detail_timeline_query(start_date, end_date, podID, location, 
-                                              S1_score_thresh, S2_score_thresh, S2a_score_thresh, species_only)
+                                              S1_score_thresh, S2_score_thresh, S2a_score_thresh, species_only,
+                                              common_taxonIDs, cursor=cursor, limit=limit + 1, fields=fields)
     
     result = await db.execute(records_query)
-    records = result.scalars().all()
+    records = result.all()
 
-    # DEV: image placeholder. Probably will not be implemented in this function
-    if incl_images:
-        pass
-
-    specimen_detail_timeline = []
-    for record in records:
-        record_dict = {
-            "timestamp": record.timestamp.strftime(DATETIME_FORMAT_STRING),
-            "podID": record.podID,
-            "swarm_name": record.swarm_name,
-            "run_name": record.run_name,
-            "loc_name": record.loc_name,
-            "latitude": record.latitude,
-            "longitude": record.longitude,
-            "S2_taxonID_str": record.S2_taxonID_str,
-            "S2_taxonID_score": record.S2_taxonID_score,
-            "S2_taxonRank": record.S2_taxonRank,
-            "S2a_score": record.S2a_score,
-            "S1_class": record.S1_class,
-        }
-        if incl_images:
-            record_dict["image"] = None  # Placeholder, add your image logic here
-        specimen_detail_timeline.append(record_dict)
+    next_cursor = None
+    if len(records) > limit:
+        records = records[:limit]
+        next_cursor = encode_cursor(records[-1].timestamp, records[-1].id)
+
+    specimen_detail_timeline = [specimen_detail_timeline_row(record, fields, incl_images) for record in records]
     
-    return specimen_detail_timeline
+    return specimen_detail_timeline, next_cursor
 
+async def stream_specimen_detail_timeline(sessionmaker,
+                             start_date: Optional[str] = None,
+                             end_date: Optional[str] = None,
+                             podID: Optional[List[str]] = None,
+                             location: Optional[str] = None,
+                             species_only: Optional[bool] = False,
+                             S1_score_thresh: Optional[float] = 0.0,
+                             S2_score_thresh: Optional[float] = 0.0,
+                             S2a_score_thresh: Optional[float] = 0.0,
+                             incl_images: Optional[bool] = False,
+                             min_taxon_count: Optional[int] = TIMELINE_MIN_TAXON_COUNT,
+                             cursor: Optional[str] = None,
+                             limit: Optional[int] = None,
+                             fields: Optional[List[str]] = None):
+    """
+    Yields the specimen detail timeline as NDJSON (one JSON object per line), ordered by (timestamp, id).
 
+    Rows are read through a server-side cursor TIMELINE_STREAM_BATCH_ROWS at a time and serialized as they
+    arrive, so memory use does not grow with the size of the range. Opens its own session, since the
+    response body is produced after the endpoint has returned.
+    """
+    fields = select_fields(fields, SPECIMEN_DETAIL_TIMELINE_FIELDS)
+    async with sessionmaker() as db:
+        common_taxonIDs = await _common_taxon_ids(db, min_taxon_count)
+        records_query = build_specimen_detail_timeline_query(start_date, end_date, podID, location, 
+                                                  S1_score_thresh, S2_score_thresh, S2a_score_thresh, species_only,
+                                                  common_taxonIDs, cursor=cursor, limit=limit, fields=fields)
+
+        result = await db.stream(records_query.execution_options(yield_per=TIMELINE_STREAM_BATCH_ROWS))
+        async for records in result.partitions():
+            yield ''.join(json.dumps(specimen_detail_timeline_row(record, fields, incl_images)) + '\n' for record in records).encode()
+
+
+# Taxon name column for each clade accepted by /clade-activity-array-data
+CLADE_TAXON_COLUMNS = {
+    'Species': SpecimenRecord.L10_taxonID_str,
+    'Genus': SpecimenRecord.L20_taxonID_str,
+    'Family': SpecimenRecord.L30_taxonID_str,
+    'Order': SpecimenRecord.L40_taxonID_str,
+    'Class': SpecimenRecord.L50_taxonID_str,
+}
 
 async def grab_clade_activity_array_data(db: AsyncSession, clade: str, start_date: str, end_date: str, taxonRank: int, S1_score_thresh: float, S2_score_thresh: float, S2a_score_thresh: float, n_bins: int):
     # Convert start_date and end_date to datetime objects
-    start_datetime = datetime.strptime(start_date, DATETIME_FORMAT_STRING)
-    end_datetime = datetime.strptime(end_date, DATETIME_FORMAT_STRING)
-
-    # Calculate the time difference between start_date and end_date
-    time_diff = end_datetime - start_datetime
-
-    # Calculate the time interval for each bin
-    bin_interval = time_diff / n_bins
-
-    # Initialize the array to store the results
-    activity_array = []
+    if start_date is None or end_date is None:
+        raise ValueError("start_date and end_date are required")
+    start_datetime = datetime.datetime.strptime(start_date, DATETIME_FORMAT_STRING)
+    end_datetime = datetime.datetime.strptime(end_date, DATETIME_FORMAT_STRING)
+    bins = TimeBins(start_datetime, end_datetime, n_bins)
 
     # Determine the taxonID_str column to use based on the clade
-    if clade == 'Species':
-        taxonID_str_column = SpecimenRecord.L10_taxonID_str
-    elif clade == 'Genus':
-        taxonID_str_column = SpecimenRecord.L20_taxonID_str
-    # Add more elif statements for other clade values...
-
-    # Loop over each bin
-    for i in range(n_bins):
-        # Calculate the start and end time for the current bin
-        bin_start_time = start_datetime + i * bin_interval
-        bin_end_time = bin_start_time + bin_interval
-
-        # Build the query
-        query = db.query(taxonID_str_column, func.count(taxonID_str_column)).filter(SpecimenRecord.timestamp.between(bin_start_time, bin_end_time))
-
-        # Apply the score thresholds
-        query = query.filter(SpecimenRecord.S1_score >= S1_score_thresh)
-        query = query.filter(SpecimenRecord.S2_taxonID_score >= S2_score_thresh)
-        query = query.filter(SpecimenRecord.S2a_score >= S2a_score_thresh)
-
-        # Group by the taxonID_str column and order by the count
-        query = query.group_by(taxonID_str_column).order_by(func.count(taxonID_str_column).desc())
-
-        # Execute the query and get the results
-        results = query.all()
-
-        # Calculate the midpoint of the time bin
-        bin_midpoint = bin_start_time + bin_interval / 2
-
-        # Loop over the results and append a dictionary to the activity_array for each one
-        for taxonID_str, count in results:
-            activity_array.append({
-                'time_bin_midpoint': bin_midpoint.strftime(DATETIME_FORMAT_STRING),
-                'taxonID_str': taxonID_str,
-                'count': count
-            })
-
-    return activity_array
\ No newline at end of file
+    if clade not in CLADE_TAXON_COLUMNS:
+        raise ValueError(f"Unsupported clade: {clade}")
+    taxonID_str_column = CLADE_TAXON_COLUMNS[clade]
+
+    # Apply the score thresholds
+    conditions = [
+        SpecimenRecord.S1_score >= S1_score_thresh,
+        SpecimenRecord.S2_taxonID_score >= S2_score_thresh,
+        SpecimenRecord.S2a_score >= S2a_score_thresh,
+    ]
+
+    # Count every (taxon, bin) combination in one grouped query
+    counts = await grab_binned_counts(db, bins, SpecimenRecord.timestamp, group_by=[taxonID_str_column], conditions=conditions)
+
+    # Order by bin, then by count (descending) within each bin
+    midpoint_labels = bins.midpoint_labels(DATETIME_FORMAT_STRING)
+    activity_array = []
+    for (taxonID_str, bin_index), count in sorted(counts.items(), key=lambda item: (item[0][1], -item[1])):
+        activity_array.append({
+            'time_bin_midpoint': midpoint_labels[bin_index],
+            'taxonID_str': taxonID_str,
+            'count': count
+        })
+
+    return activity_array
@@ -0,0 +1,32 @@
+# PolliServer/helpers/pagination.py
+import base64
+import datetime
+from typing import Tuple
+
+from sqlalchemy import and_, or_
+
+from PolliServer.constants import *
+
+
+def encode_cursor(timestamp: datetime.datetime, row_id: int) -> str:
+    """Opaque keyset cursor pointing just past the row with this (timestamp, id)."""
+    raw = f"{timestamp.strftime(DATETIME_FORMAT_STRING)}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime.datetime, int]:
+    """Inverse of encode_cursor. Raises ValueError for a malformed cursor."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        timestamp, row_id = raw.rsplit('|', 1)
+        return datetime.datetime.strptime(timestamp, DATETIME_FORMAT_STRING), int(row_id)
+    except Exception:
+        raise ValueError(f"Invalid cursor: {cursor}")
+
+
+def after_cursor(timestamp_column, id_column, cursor: str):
+    """WHERE condition selecting rows strictly after the cursor in (timestamp, id) order."""
+    timestamp, row_id = decode_cursor(cursor)
+    # Expanded form of (timestamp, id) > (:timestamp, :id), which lets the timestamp index bound the scan
+    return and_(timestamp_column >= timestamp,
+                or_(timestamp_column > timestamp, id_column > row_id))
@@ -0,0 +1,459 @@
+# PolliServer/helpers/rollups.py
+import asyncio
+import datetime
+import time
+from collections import deque
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import and_, or_, case, delete, false, func, literal, literal_column, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from PolliServer.constants import *
+from PolliServer.backend.dialects import SQLITE_MAX_COMPOUND_SELECT, dialect_name, upsert, floor_div, least
+from PolliServer.helpers.binning import TimeBins, grab_binned_counts, grab_window_counts, microseconds_since
+from PolliServer.logger.logger import LoggerSingleton
+from models.models import Base, CountRollup, RollupWatermark, FrameLog, SpecimenRecord
+
+logger = LoggerSingleton().get_logger()
+
+EPOCH = datetime.datetime(1970, 1, 1)
+US_PER_SECOND = 1000000
+
+
+class RollupSource:
+    """A raw table whose rows are counted into count_rollups, with the dimensions kept per bucket."""
+
+    def __init__(self, name: str, model, podID_column, swarm_name_column=None, run_name_column=None):
+        self.name = name
+        self.model = model
+        self.podID_column = podID_column
+        self.swarm_name_column = swarm_name_column
+        self.run_name_column = run_name_column
+
+    def dimension_columns(self):
+        return [self.podID_column, self.swarm_name_column, self.run_name_column]
+
+
+ROLLUP_SOURCES = {
+    # FrameLog has no swarm/run columns (yet), so those dimensions are always ''
+    'frame_log': RollupSource('frame_log', FrameLog, FrameLog.podID),
+    'specimen_record': RollupSource('specimen_record', SpecimenRecord, SpecimenRecord.podID,
+                                    SpecimenRecord.swarm_name, SpecimenRecord.run_name),
+}
+
+
+# --- Maintenance --- #
+
+async def create_rollup_tables(db: AsyncSession):
+    """
+    Creates count_rollups and rollup_watermarks if they do not exist, and a watermark row per source.
+    Leaves PolliOS tables untouched.
+    """
+    tables = [CountRollup.__table__, RollupWatermark.__table__]
+    await db.run_sync(lambda session: Base.metadata.create_all(session.connection(), tables=tables))
+    await db.execute(_insert_watermarks(db))
+    await db.commit()
+
+
+def _insert_watermarks(db: AsyncSession):
+    # MySQL: INSERT IGNORE; SQLite: INSERT ... ON CONFLICT DO NOTHING. Workers starting at once may all run it.
+    stmt = upsert(db, RollupWatermark).values([{'source': name, 'last_id': 0} for name in ROLLUP_SOURCES])
+    if hasattr(stmt, 'on_conflict_do_nothing'):
+        return stmt.on_conflict_do_nothing(index_elements=['source'])
+    return stmt.prefix_with('IGNORE')
+
+
+# Per source, (time.monotonic(), max id) seen by this process's refreshes, oldest first (see _settled_max_id)
+_observed_max_ids: Dict[str, deque] = {}
+
+
+def _settled_max_id(source_name: str, max_id: int, settle_seconds: float) -> Optional[int]:
+    """
+    The highest id that was already the source's max id at least settle_seconds ago, or None if not known yet.
+
+    MySQL assigns auto-increment ids when rows are inserted, not when they are committed, so with many pods
+    writing at once a row can become visible after a row with a higher id. Any row with a lower id than
+    one seen settle_seconds ago was in flight back then, and has committed since (unless its transaction
+    took longer): the rollups only fold up to there, and rows above are counted raw in the meantime.
+    """
+    now = time.monotonic()
+    observed = _observed_max_ids.setdefault(source_name, deque())
+    observed.append((now, max_id))
+    while len(observed) > 1 and now - observed[1][0] >= settle_seconds:
+        observed.popleft()
+    observed_at, settled_id = observed[0]
+    return settled_id if now - observed_at >= settle_seconds else None
+
+
+async def _lock_watermark(db: AsyncSession, source: RollupSource) -> RollupWatermark:
+    # Lock the watermark row (created by create_rollup_tables) so concurrent refreshers cannot fold the same ids twice
+    return (await db.execute(
+        select(RollupWatermark).where(RollupWatermark.source == source.name).
+        with_for_update().execution_options(populate_existing=True)
+    )).scalar_one()
+
+
+async def _fold_rows(db: AsyncSession, source: RollupSource, conditions: List, resolutions: Sequence[int] = ROLLUP_RESOLUTIONS):
+    """Adds the source rows matching `conditions` to their count_rollups buckets at each of `resolutions`."""
+    model = source.model
+    conditions = conditions + [model.timestamp.isnot(None)]
+    dimensions = [func.coalesce(column, '') if column is not None else literal('')
+                  for column in source.dimension_columns()]
+    # Distinct labels, so GROUP BY cannot resolve them to the source table's own columns
+    dimension_labels = ['podID_key', 'swarm_name_key', 'run_name_key']
+    grouped_labels = [label for label, column in zip(dimension_labels, source.dimension_columns()) if column is not None]
+
+    for resolution in resolutions:
+        bucket = floor_div(microseconds_since(EPOCH, model.timestamp), resolution * US_PER_SECOND)
+        new_counts = select(literal(source.name), literal(resolution), bucket.label('bucket_key'),
+                            *[dimension.label(label) for dimension, label in zip(dimensions, dimension_labels)],
+                            func.count()).\
+                     where(and_(*conditions)).\
+                     group_by(*[literal_column(label) for label in ['bucket_key'] + grouped_labels])
+        await db.execute(_upsert_counts(db, new_counts))
+
+
+async def refresh_rollup_source(db: AsyncSession, source: RollupSource,
+                                settle_seconds: float = ROLLUP_SETTLE_SECONDS) -> int:
+    """
+    Folds source rows above the watermark into count_rollups at every resolution, in one transaction
+    per batch of at most ROLLUP_REFRESH_BATCH_ROWS ids. Only ids up to the max id seen settle_seconds
+    ago are folded (see _settled_max_id); pass 0 when nothing writes to the source concurrently.
+
+    Returns:
+        int: The new watermark (highest source id included in the rollups).
+    """
+    model = source.model
+    target_id = None
+    while True:
+        async with db.begin():
+            watermark = await _lock_watermark(db, source)
+            if target_id is None:
+                max_id = (await db.execute(select(func.max(model.id)))).scalar_one()
+                target_id = _settled_max_id(source.name, max_id or 0, settle_seconds)
+            if target_id is None or target_id <= watermark.last_id:
+                return watermark.last_id
+
+            upper_id = min(target_id, watermark.last_id + ROLLUP_REFRESH_BATCH_ROWS)
+            await _fold_rows(db, source, [model.id > watermark.last_id, model.id <= upper_id])
+
+            watermark.last_id = upper_id
+            watermark.updated_at = datetime.datetime.utcnow()
+
+        if upper_id >= target_id:
+            return upper_id
+
+
+async def recount_rollup_source(db: AsyncSession, source: RollupSource, hours: float = ROLLUP_RECOUNT_HOURS,
+                                now: Optional[datetime.datetime] = None):
+    """
+    Recounts the count_rollups buckets overlapping the last <hours> hours from the raw rows at or below
+    the watermark, replacing their folded counts. This repairs buckets that miss rows which committed
+    only after the refresher had folded past their id (see _settled_max_id).
+    """
+    model = source.model
+    since_us = _to_us((now or datetime.datetime.utcnow()) - datetime.timedelta(hours=hours))
+    async with db.begin():
+        watermark = await _lock_watermark(db, source)
+        if not watermark.last_id:
+            return
+        for resolution in ROLLUP_RESOLUTIONS:
+            step = resolution * US_PER_SECOND
+            first_bucket = since_us // step
+            await db.execute(delete(CountRollup).where(CountRollup.source == source.name,
+                                                       CountRollup.resolution == resolution,
+                                                       CountRollup.bucket >= first_bucket))
+            await _fold_rows(db, source, [model.id <= watermark.last_id, model.timestamp >= _from_us(first_bucket * step)],
+                             resolutions=[resolution])
+
+
+def _upsert_counts(db: AsyncSession, new_counts):
+    # MySQL: INSERT ... SELECT ... ON DUPLICATE KEY UPDATE count = count + VALUES(count)
+    # SQLite: INSERT ... SELECT ... ON CONFLICT (<primary key>) DO UPDATE SET count = count + excluded.count
+    columns = ['source', 'resolution', 'bucket', 'podID', 'swarm_name', 'run_name', 'count']
+    stmt = upsert(db, CountRollup).from_select(columns, new_counts)
+    if hasattr(stmt, 'on_duplicate_key_update'):
+        return stmt.on_duplicate_key_update(count=CountRollup.count + stmt.inserted['count'])
+    return stmt.on_conflict_do_update(index_elements=columns[:-1], set_={'count': CountRollup.count + stmt.excluded['count']})
+
+
+async def refresh_rollups(db: AsyncSession, settle_seconds: float = ROLLUP_SETTLE_SECONDS):
+    for source in ROLLUP_SOURCES.values():
+        await refresh_rollup_source(db, source, settle_seconds)
+
+
+async def recount_rollups(db: AsyncSession, hours: float = ROLLUP_RECOUNT_HOURS):
+    for source in ROLLUP_SOURCES.values():
+        await recount_rollup_source(db, source, hours)
+
+
+async def run_rollup_refresher(sessionmaker, interval: float = ROLLUP_REFRESH_INTERVAL_SECONDS,
+                               recount_interval: float = ROLLUP_RECOUNT_INTERVAL_SECONDS):
+    """
+    Background task: creates the rollup tables, then keeps them up to date every <interval> seconds, and
+    recounts the recent buckets from raw rows on startup and every <recount_interval> seconds.
+    """
+    async with sessionmaker() as db:
+        await create_rollup_tables(db)
+    recounted_at = None
+    while True:
+        try:
+            async with sessionmaker() as db:
+                await refresh_rollups(db)
+                if recounted_at is None or time.monotonic() - recounted_at >= recount_interval:
+                    await recount_rollups(db)
+                    recounted_at = time.monotonic()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.server_error(f"Error refreshing rollups: {e}")
+        await asyncio.sleep(interval)
+
+
+# --- Reading --- #
+
+def _to_us(timestamp: datetime.datetime) -> int:
+    return (timestamp - EPOCH) // datetime.timedelta(microseconds=1)
+
+
+def _from_us(us: int) -> datetime.datetime:
+    return EPOCH + datetime.timedelta(microseconds=us)
+
+
+def decompose_interval(start_us: int, end_us: int) -> List[Tuple[Optional[int], int, int]]:
+    """
+    Splits [start_us, end_us) into the coarsest aligned rollup buckets that fit, finer buckets towards
+    the edges and raw rows (resolution None) for the sub-bucket remainders at either end.
+
+    Returns:
+        List[Tuple[Optional[int], int, int]]: (resolution, lo_us, hi_us) pieces covering the interval.
+    """
+    pieces = []
+    finer = None
+    lo, hi = start_us, end_us
+    for resolution in ROLLUP_RESOLUTIONS:
+        step = resolution * US_PER_SECOND
+        aligned_lo, aligned_hi = -(-lo // step) * step, (hi // step) * step
+        if aligned_lo >= aligned_hi:
+            break
+        pieces += [(finer, lo, aligned_lo), (finer, aligned_hi, hi)]
+        lo, hi, finer = aligned_lo, aligned_hi, resolution
+    pieces.append((finer, lo, hi))
+    return [piece for piece in pieces if piece[1] < piece[2]]
+
+
+def _merge_ranges(ranges: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """Sorts [lo, hi) ranges and joins the ones that touch or overlap."""
+    merged = []
+    for lo, hi in sorted(ranges):
+        if merged and lo <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], hi))
+        else:
+            merged.append((lo, hi))
+    return merged
+
+
+def _raw_range_conditions(model, ranges: List[Tuple[int, int]]):
+    return [and_(model.timestamp >= _from_us(lo_us), model.timestamp < _from_us(hi_us)) for lo_us, hi_us in ranges]
+
+
+def _interval_ranges(model, start: datetime.datetime, end: datetime.datetime):
+    """
+    Conditions selecting the rollup buckets that cover [start, end), and the (lo_us, hi_us) remainders
+    to count from raw rows (see _raw_range_conditions).
+    """
+    bucket_ranges = []
+    raw_ranges = []
+    for resolution, lo_us, hi_us in decompose_interval(_to_us(start), _to_us(end)):
+        if resolution is None:
+            raw_ranges.append((lo_us, hi_us))
+        else:
+            step = resolution * US_PER_SECOND
+            bucket_ranges.append(and_(CountRollup.resolution == resolution,
+                                      CountRollup.bucket >= lo_us // step,
+                                      CountRollup.bucket < hi_us // step))
+    return bucket_ranges, raw_ranges
+
+
+def _filter_conditions(source: RollupSource, podIDs: Optional[List[str]], swarm_name: Optional[str], run_name: Optional[str]):
+    """The same filters expressed against the raw source table and against count_rollups."""
+    raw_conditions = []
+    rollup_conditions = [CountRollup.source == source.name]
+    if podIDs is not None:
+        raw_conditions.append(source.podID_column.in_(podIDs))
+        rollup_conditions.append(CountRollup.podID.in_(podIDs))
+    if swarm_name and source.swarm_name_column is not None:
+        raw_conditions.append(source.swarm_name_column == swarm_name)
+        rollup_conditions.append(CountRollup.swarm_name == swarm_name)
+    if run_name and source.run_name_column is not None:
+        raw_conditions.append(source.run_name_column == run_name)
+        rollup_conditions.append(CountRollup.run_name == run_name)
+    return raw_conditions, rollup_conditions
+
+
+async def get_rollup_watermark(db: AsyncSession, source: RollupSource) -> Optional[int]:
+    result = await db.execute(select(RollupWatermark.last_id).where(RollupWatermark.source == source.name))
+    return result.scalar_one_or_none()
+
+
+def _range_subqueries(db: AsyncSession, columns: List, conditions: List, range_conditions: List) -> List:
+    """
+    Subqueries selecting `columns` from the rows that match `conditions` and any of `range_conditions`.
+
+    MySQL's range optimizer reads ORed ranges of an indexed column as separate index intervals, so one
+    subquery does. SQLite would test every row of the table (or span) against the OR, and parses long ORs
+    into trees deeper than it accepts, so there every range is its own SELECT of a UNION ALL instead.
+    """
+    if dialect_name(db) != 'sqlite':
+        return [select(*columns).where(and_(*conditions, or_(*range_conditions))).subquery()]
+
+    subqueries = []
+    for chunk_start in range(0, len(range_conditions), SQLITE_MAX_COMPOUND_SELECT):
+        members = [select(*columns).where(and_(*conditions, range_condition))
+                   for range_condition in range_conditions[chunk_start:chunk_start + SQLITE_MAX_COMPOUND_SELECT]]
+        subqueries.append((union_all(*members) if len(members) > 1 else members[0]).subquery())
+    return subqueries
+
+
+async def grab_rollup_binned_counts(db: AsyncSession,
+                                    source_name: str,
+                                    bins: TimeBins,
+                                    group_by_pod: bool = True,
+                                    podIDs: Optional[List[str]] = None,
+                                    swarm_name: Optional[str] = None,
+                                    run_name: Optional[str] = None) -> Dict[Tuple, int]:
+    """
+    Row counts of a rollup source per (podID, bin), or per (bin,) if group_by_pod is False.
+
+    Each bin is read from the coarsest rollup buckets that fit entirely inside it. Raw rows are only
+    counted for the sub-minute remainders at the bin edges and for rows above the rollup watermark
+    (i.e. not yet folded in). Falls back to counting raw rows if rollups are disabled or not built yet.
+
+    Args:
+        db (AsyncSession): Database session for executing queries.
+        source_name (str): Key of ROLLUP_SOURCES, e.g. 'frame_log'.
+        bins (TimeBins): Time bins to count into.
+        group_by_pod (bool): Whether to count per podID. Default is True.
+        podIDs (Optional[List[str]]): Only count these pods. Default is None (all pods).
+        swarm_name (Optional[str]): Name of the swarm to filter by, if the source has that dimension.
+        run_name (Optional[str]): Name of the run to filter by, if the source has that dimension.
+
+    Returns:
+        Dict[Tuple, int]: Maps (podID, bin_index) or (bin_index,) to a count. Empty bins are absent.
+    """
+    source = ROLLUP_SOURCES[source_name]
+    model = source.model
+    raw_conditions, rollup_conditions = _filter_conditions(source, podIDs, swarm_name, run_name)
+
+    raw_group_by = [source.podID_column] if group_by_pod else []
+    watermark = await get_rollup_watermark(db, source) if ROLLUPS_ENABLED else None
+    if not watermark:
+        return await grab_binned_counts(db, bins, model.timestamp, group_by=raw_group_by, conditions=raw_conditions)
+
+    # Split every bin into rollup bucket ranges and raw edge ranges
+    bucket_ranges = []
+    raw_ranges = []
+    for i in range(bins.n_bins):
+        bin_bucket_ranges, bin_raw_ranges = _interval_ranges(model, bins.bin_start(i), bins.bin_end(i))
+        bucket_ranges += bin_bucket_ranges
+        raw_ranges += bin_raw_ranges
+
+    counts = {}
+
+    bucket_columns = [CountRollup.podID.label('podID'), CountRollup.bucket.label('bucket'),
+                      CountRollup.resolution.label('resolution'), CountRollup.count.label('bucket_count')]
+    for buckets in _range_subqueries(db, bucket_columns, rollup_conditions, bucket_ranges) if bucket_ranges else []:
+        # Every selected bucket lies inside one bin, so its start time determines the bin
+        bucket_start_us = buckets.c.bucket * buckets.c.resolution * US_PER_SECOND
+        bin_index = floor_div(bucket_start_us - _to_us(bins.start), bins.interval_us)
+        bin_index = least(bin_index, bins.n_bins - 1).label('bin_index')
+        rollup_group_by = [buckets.c.podID] if group_by_pod else []
+
+        query = select(*rollup_group_by, bin_index, func.sum(buckets.c.bucket_count)).\
+                group_by(*rollup_group_by, literal_column('bin_index'))
+        result = await db.execute(query)
+        for row in result.all():
+            if group_by_pod:
+                key = (row[0] or None, int(row[1]))
+            else:
+                key = (int(row[0]),)
+            counts[key] = counts.get(key, 0) + int(row[-1])
+
+    # Raw rows: sub-bucket edges, plus anything not folded into the rollups yet. Counted separately,
+    # so each query can use an index (timestamp resp. id) rather than one OR over the whole span.
+    # The remainder at the end of one bin and the one at the start of the next are merged into one range.
+    raw_counts = [await grab_binned_counts(db, bins, model.timestamp, group_by=raw_group_by,
+                                           conditions=raw_conditions + [model.id > watermark])]
+    if raw_ranges:
+        for edges in _range_subqueries(db, [model.timestamp.label('timestamp'), source.podID_column.label('podID')],
+                                       raw_conditions + [model.id <= watermark],
+                                       _raw_range_conditions(model, _merge_ranges(raw_ranges))):
+            raw_counts.append(await grab_binned_counts(db, bins, edges.c.timestamp,
+                                                       group_by=[edges.c.podID] if group_by_pod else []))
+    for partial_counts in raw_counts:
+        for key, count in partial_counts.items():
+            counts[key] = counts.get(key, 0) + count
+
+    return counts
+
+
+async def grab_rollup_window_counts(db: AsyncSession,
+                                    source_name: str,
+                                    windows: List[Tuple[datetime.datetime, datetime.datetime]],
+                                    group_by_pod: bool = False,
+                                    podIDs: Optional[List[str]] = None,
+                                    swarm_name: Optional[str] = None,
+                                    run_name: Optional[str] = None,
+                                    conditions: Sequence = ()) -> Dict[Tuple, int]:
+    """
+    Row counts of a rollup source for any number of (possibly overlapping) [start, end) windows, per
+    (window_index,) or per (podID, window_index) if group_by_pod is True.
+
+    Like grab_rollup_binned_counts, each window is read from the coarsest rollup buckets that fit, with raw
+    rows only for the edges and for rows above the watermark. All windows are computed together with
+    conditional aggregation: one query over count_rollups and one over the raw table.
+
+    Additional conditions on raw columns (e.g. score thresholds) cannot be answered from the rollups; if any
+    are given, all windows are counted from raw rows in a single conditional-aggregation query instead.
+
+    Returns:
+        Dict[Tuple, int]: Maps (window_index,) or (podID, window_index) to a count. Zero counts are absent.
+    """
+    source = ROLLUP_SOURCES[source_name]
+    model = source.model
+    raw_conditions, rollup_conditions = _filter_conditions(source, podIDs, swarm_name, run_name)
+    raw_conditions += list(conditions)
+
+    raw_group_by = [source.podID_column] if group_by_pod else []
+    watermark = await get_rollup_watermark(db, source) if ROLLUPS_ENABLED and not conditions else None
+    if not watermark:
+        return await grab_window_counts(db, model.timestamp, windows, group_by=raw_group_by, conditions=raw_conditions)
+
+    window_ranges = [_interval_ranges(model, start, end) for start, end in windows]
+    all_bucket_ranges = [bucket_range for bucket_ranges, _ in window_ranges for bucket_range in bucket_ranges]
+
+    counts = {}
+
+    if all_bucket_ranges:
+        rollup_group_by = [CountRollup.podID] if group_by_pod else []
+        columns = [func.sum(case((or_(*bucket_ranges) if bucket_ranges else false(), CountRollup.count), else_=0))
+                   for bucket_ranges, _ in window_ranges]
+        query = select(*rollup_group_by, *columns).where(and_(*rollup_conditions, or_(*all_bucket_ranges)))
+        if group_by_pod:
+            query = query.group_by(*rollup_group_by)
+        result = await db.execute(query)
+        for row in result.all():
+            group = (row[0] or None,) if group_by_pod else ()
+            for i, count in enumerate(row[len(rollup_group_by):]):
+                if count:
+                    counts[group + (i,)] = int(count)
+
+    # Raw rows: sub-bucket edges of each window, plus anything not folded into the rollups yet
+    window_conditions = [or_(model.id > watermark, *_raw_range_conditions(model, _merge_ranges(raw_ranges))) for _, raw_ranges in window_ranges]
+    raw_counts = await grab_window_counts(db, model.timestamp, windows, group_by=raw_group_by,
+                                          conditions=raw_conditions, window_conditions=window_conditions)
+    for key, count in raw_counts.items():
+        counts[key] = counts.get(key, 0) + count
+
+    return counts
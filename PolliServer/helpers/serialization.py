@@ -0,0 +1,43 @@
+# PolliServer/helpers/serialization.py
+import datetime
+import decimal
+import json
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+from PolliServer.constants import *
+
+# orjson is optional: several times faster than the standard library encoder, which is used as a fallback
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _default(value: Any):
+    # Types the encoders do not handle natively (MySQL returns DECIMAL for AVG/SUM)
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.strftime(DATETIME_FORMAT_STRING if isinstance(value, datetime.datetime) else DATE_FORMAT_STRING)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    """Encodes content as compact UTF-8 JSON, with orjson if it is installed."""
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSONResponse encoded with orjson (or compact json). Used as the app's default response class.
+
+    Endpoints that build large plain-JSON payloads (lists of dicts of str/int/float) should return
+    FastJSONResponse(data) themselves: FastAPI then skips its jsonable_encoder pass over the content.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -1,73 +1,94 @@
 from datetime import datetime, timedelta
-from typing import Dict, Optional, List
+from typing import Dict, Optional, List, Sequence
 from sqlalchemy import select, and_, func, desc
 from sqlalchemy.ext.asyncio import AsyncSession
 from models.models import FrameLog, SensorRecord, SpecimenRecord
+from PolliServer.helpers.rollups import grab_rollup_window_counts
+
+
+def percent_change(current: int, previous: int) -> float:
+    return ((current - previous) / previous) * 100 if previous else 0
+
+
+async def get_span_counts(db: AsyncSession,
+                          source_name: str,
+                          spans: List[int],
+                          compare: bool = True,
+                          podIDs: Optional[List[str]] = None,
+                          swarm_name: Optional[str] = None,
+                          run_name: Optional[str] = None,
+                          conditions: Sequence = (),
+                          group_by_pod: bool = False) -> Dict:
+    """
+    Counts rows in the current period, and optionally the previous period, of every span at once.
+
+    The current period of a span is the last <span> hours; the previous period is the <span> hours before
+    that. All periods of all spans are counted with one conditional-aggregation query per table (see
+    grab_rollup_window_counts), instead of one COUNT query per period.
+
+    Args:
+        db (AsyncSession): Database session for executing queries.
+        source_name (str): Table to count, 'frame_log' or 'specimen_record'.
+        spans (List[int]): Span lengths in hours.
+        compare (bool): Whether to also count the previous period of each span. Default is True.
+        podIDs (Optional[List[str]]): Only count these pods. Default is None (all pods).
+        swarm_name (Optional[str]): Only count this swarm, if the table has that column. Default is None.
+        run_name (Optional[str]): Only count this run, if the table has that column. Default is None.
+        conditions (Sequence): Additional WHERE conditions on the table (bypasses the rollups).
+        group_by_pod (bool): Whether to count per pod. Default is False.
+
+    Returns:
+        Dict: {span: {'current': count, 'previous': count}} ('previous' only if compare), or
+            {podID: {span: {...}}} if group_by_pod. Every pod in podIDs is included, with zero counts if need be.
+    """
+    now = datetime.utcnow()
+    windows = []
+    for span in spans:
+        windows.append((now - timedelta(hours=span), now))
+        if compare:
+            windows.append((now - timedelta(hours=span * 2), now - timedelta(hours=span)))
+
+    counts = await grab_rollup_window_counts(db, source_name, windows, group_by_pod=group_by_pod, podIDs=podIDs,
+                                             swarm_name=swarm_name, run_name=run_name, conditions=conditions)
+
+    n_periods = 2 if compare else 1
+
+    def spans_for(group: tuple):
+        span_counts = {}
+        for i, span in enumerate(spans):
+            span_counts[span] = {'current': counts.get(group + (i * n_periods,), 0)}
+            if compare:
+                span_counts[span]['previous'] = counts.get(group + (i * n_periods + 1,), 0)
+        return span_counts
+
+    if not group_by_pod:
+        return spans_for(())
+
+    pods = set(podIDs) if podIDs is not None else {key[0] for key in counts}
+    return {podID: spans_for((podID,)) for podID in pods}
 
 
 # NOTE: For /frame-log-stats endpoint
 async def get_frame_log_stats(db: AsyncSession, span: int, swarm_name: Optional[str] = None, run_name: Optional[str] = None):
-    # Calculate the datetime for <span> hours ago
-    span_ago = datetime.utcnow() - timedelta(hours=span)
-
-    # Define the base query
-    base_query = select(func.count()).select_from(FrameLog)
-
     # Future implementation: Filter by swarm_name and run_name if provided
-    # if swarm_name:
-    #     base_query = base_query.where(FrameLog.swarm_name == swarm_name)
-    # if run_name:
-    #     base_query = base_query.where(FrameLog.run_name == run_name)
-
-    # Query for the current period
-    current_query = base_query.where(FrameLog.timestamp >= span_ago)
-    current_result = await db.execute(current_query)
-    current_count = current_result.scalar_one()
-
-    # Calculate the datetime for <span> hours ago from the start of the current period
-    previous_span_ago = span_ago - timedelta(hours=span)
-
-    # Query for the previous period
-    previous_query = base_query.where(and_(FrameLog.timestamp >= previous_span_ago, FrameLog.timestamp < span_ago))
-    previous_result = await db.execute(previous_query)
-    previous_count = previous_result.scalar_one()
+    # counts = (await get_span_counts(db, 'frame_log', [span], swarm_name=swarm_name, run_name=run_name))[span]
 
-    # Calculate the percent difference
-    diff = ((current_count - previous_count) / previous_count) * 100 if previous_count else 0
+    # Count the current and previous periods at once
+    counts = (await get_span_counts(db, 'frame_log', [span]))[span]
+    current_count, previous_count = counts['current'], counts['previous']
 
     # Return the counts for the current and previous periods, and the percent difference
-    return {'current': current_count, 'previous': previous_count, 'change': diff}
+    return {'current': current_count, 'previous': previous_count, 'change': percent_change(current_count, previous_count)}
 
 
 # NOTE: For /specimen-log-stats endpoint
 async def get_specimen_log_stats(db: AsyncSession, span: int, swarm_name: Optional[str] = None, run_name: Optional[str] = None):
-    # Calculate the datetime for <span> hours ago
-    span_ago = datetime.utcnow() - timedelta(hours=span)
-
-    # Define the base query
-    base_query = select(func.count()).select_from(SpecimenRecord)
-
     # Future implementation: Filter by swarm_name and run_name if provided
-    # if swarm_name:
-    #     base_query = base_query.where(SpecimenRecord.swarm_name == swarm_name)
-    # if run_name:
-    #     base_query = base_query.where(SpecimenRecord.run_name == run_name)
-
-    # Query for the current period
-    current_query = base_query.where(SpecimenRecord.timestamp >= span_ago)
-    current_result = await db.execute(current_query)
-    current_count = current_result.scalar_one()
-
-    # Calculate the datetime for <span> hours ago from the start of the current period
-    previous_span_ago = span_ago - timedelta(hours=span)
-
-    # Query for the previous period
-    previous_query = base_query.where(and_(SpecimenRecord.timestamp >= previous_span_ago, SpecimenRecord.timestamp < span_ago))
-    previous_result = await db.execute(previous_query)
-    previous_count = previous_result.scalar_one()
+    # counts = (await get_span_counts(db, 'specimen_record', [span], swarm_name=swarm_name, run_name=run_name))[span]
 
-    # Calculate the percent difference
-    diff = ((current_count - previous_count) / previous_count) * 100 if previous_count else 0
+    # Count the current and previous periods at once
+    counts = (await get_span_counts(db, 'specimen_record', [span]))[span]
+    current_count, previous_count = counts['current'], counts['previous']
 
     # Return the counts for the current and previous periods, and the percent difference
-    return {'current': current_count, 'previous': previous_count, 'change': diff}
\ No newline at end of file
+    return {'current': current_count, 'previous': previous_count, 'change': percent_change(current_count, previous_count)}
@@ -0,0 +1,241 @@
+# PolliServer/helpers/swarm_status_feed.py
+import asyncio
+import time
+from typing import Dict, List, Optional
+
+from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from PolliServer.constants import *
+from PolliServer.helpers.grabbers import SWARM_STATUS_FIELDS, grab_swarm_status
+from PolliServer.helpers.serialization import dumps
+from PolliServer.helpers.versioning import format_token, new_epoch, parse_since
+from PolliServer.logger.logger import LoggerSingleton
+from models.models import PodRecord
+
+logger = LoggerSingleton().get_logger()
+
+# Recomputed from the clock on every refresh, so they never count as a change (clients can derive them from last_seen)
+SWARM_STATUS_DERIVED_FIELDS = ('time_since_last_seen', 'time_since_last_specimen')
+
+
+def _compared(pod_status: dict, fields: List[str]) -> tuple:
+    return tuple(pod_status.get(field) for field in fields if field not in SWARM_STATUS_DERIVED_FIELDS)
+
+
+def _project(pod_status: dict, fields: List[str]) -> dict:
+    if len(fields) == len(SWARM_STATUS_FIELDS):
+        return pod_status
+    return {field: pod_status[field] for field in fields}
+
+
+def _event(name: str, token: str, content) -> bytes:
+    return f"event: {name}\nid: {token}\ndata: ".encode() + dumps(content) + b"\n\n"
+
+
+class Subscriber:
+    """
+    One open /swarm-status/stream: the diffs not sent yet, and whether it needs a (new) snapshot, or
+    only the changes since the version it last saw (since, from Last-Event-ID when it reconnects).
+    """
+    __slots__ = ('fields', 'queue', 'needs_snapshot', 'since')
+
+    def __init__(self, fields: List[str], since: Optional[str] = None):
+        self.fields = fields
+        self.queue = asyncio.Queue(maxsize=SWARM_STATUS_FEED_QUEUE_SIZE)
+        self.needs_snapshot = True
+        self.since = since
+
+
+class SwarmStatusFeedSingleton:
+    """
+    Swarm status computed once per process for every /swarm-status/stream subscriber, rather than once
+    per polling client. run_swarm_status_feed keeps it current while anyone is subscribed; each refresh
+    bumps the version if any pod changed, and subscribers are sent the changed and removed pods only.
+
+    The version each pod last changed in (and the version removed pods were removed in) is kept, so
+    /swarm-status?since=<version token> can answer with just the pods changed since the client's version.
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(SwarmStatusFeedSingleton, cls).__new__(cls)
+            cls._instance.pods = {}  # podID -> status object, as /swarm-status returns it
+            cls._instance.epoch = new_epoch()
+            cls._instance.version = 0
+            cls._instance.pod_versions = {}  # podID -> version the pod last changed in
+            cls._instance.removed = {}  # podID -> version it was removed in, oldest first (at most SWARM_STATUS_MAX_REMOVED_PODS)
+            cls._instance.horizon = 0  # Oldest version deltas can still be computed since (older removals were forgotten)
+            cls._instance.marker = None  # Change marker at the last refresh, see change_marker
+            cls._instance.refreshed_at = None
+            cls._instance.probed_at = None
+            cls._instance.subscribers = set()
+            cls._instance.wakeup = asyncio.Event()  # Set when the first subscriber arrives
+            cls._instance._lock = asyncio.Lock()
+        return cls._instance
+
+    @property
+    def token(self) -> str:
+        return format_token(self.epoch, self.version)
+
+    @staticmethod
+    async def change_marker(db: AsyncSession) -> tuple:
+        # Pods check in by updating their pod_records row, so this changes whenever the status does
+        # (apart from the 24 h frame counts, which the periodic full refresh picks up)
+        result = await db.execute(select(func.max(PodRecord.last_seen_time), func.count()).select_from(PodRecord))
+        return tuple(result.one())
+
+    async def refresh(self, db: AsyncSession, marker: Optional[tuple] = None, max_age: Optional[float] = None):
+        """Recomputes the swarm status, unless max_age is given and it was computed less than max_age seconds ago."""
+        async with self._lock:
+            if max_age is not None and self.refreshed_at is not None and time.monotonic() - self.refreshed_at < max_age:
+                return
+            statuses = await grab_swarm_status(db)
+            pods = {status['podID']: status for status in statuses if status['podID'] is not None}
+            changed = [(self.pods.get(podID), status) for podID, status in pods.items()
+                       if podID not in self.pods or _compared(self.pods[podID], SWARM_STATUS_FIELDS) != _compared(status, SWARM_STATUS_FIELDS)]
+            removed = [podID for podID in self.pods if podID not in pods]
+            self.pods = pods
+            self.marker = marker
+            self.refreshed_at = time.monotonic()
+            if changed or removed:
+                self.version += 1
+                for _, status in changed:
+                    self.pod_versions[status['podID']] = self.version
+                    self.removed.pop(status['podID'], None)
+                for podID in removed:
+                    del self.pod_versions[podID]
+                    self.removed[podID] = self.version
+                while len(self.removed) > SWARM_STATUS_MAX_REMOVED_PODS:
+                    podID = next(iter(self.removed))
+                    self.horizon = self.removed.pop(podID)
+            self.publish(changed, removed)
+
+    async def ensure_fresh(self, db: AsyncSession, max_age: float = SWARM_STATUS_DELTA_MAX_AGE_SECONDS):
+        # A no-op while the feed is live (someone is subscribed); otherwise requests refresh it themselves
+        if not self.is_live():
+            await self.refresh(db, max_age=max_age)
+
+    def delta(self, since: Optional[str], fields: List[str] = SWARM_STATUS_FIELDS) -> Optional[dict]:
+        """
+        The pods changed and removed since the version of the since token, or every pod (with 'full': true)
+        if the token is not one of ours or too old. None if nothing changed.
+        """
+        since_version = parse_since(since, self.epoch, self.version, self.horizon)
+        if since_version is None:
+            return {'version': self.token, 'full': True, 'changed': [_project(status, fields) for status in self.pods.values()],
+                    'removed': []}
+        changed = [_project(status, fields) for podID, status in self.pods.items() if self.pod_versions[podID] > since_version]
+        removed = [podID for podID, version in self.removed.items() if version > since_version]
+        if not changed and not removed:
+            return None
+        return {'version': self.token, 'changed': changed, 'removed': removed}
+
+    def publish(self, changed: list, removed: List[str]):
+        """Queues a diff for every subscriber, and wakes those still waiting for their snapshot."""
+        for subscriber in self.subscribers:
+            if subscriber.needs_snapshot:
+                if subscriber.queue.empty():
+                    subscriber.queue.put_nowait(None)
+            elif changed or removed:
+                if subscriber.queue.full():  # Too far behind: it gets the current snapshot instead
+                    subscriber.needs_snapshot = True
+                    while not subscriber.queue.empty():
+                        subscriber.queue.get_nowait()
+                    subscriber.queue.put_nowait(None)
+                else:
+                    subscriber.queue.put_nowait((self.version, changed, removed))
+
+    def is_live(self) -> bool:
+        # Probed within the last two periods, i.e. the refresher has been running for current subscribers
+        return self.probed_at is not None and time.monotonic() - self.probed_at <= 2 * SWARM_STATUS_FEED_PROBE_SECONDS
+
+    def catch_up_event(self, subscriber: Subscriber) -> Optional[bytes]:
+        """
+        A 'snapshot' of every pod, or, for a subscriber reconnecting with a version we can compute a delta
+        since, a 'diff' with the pods changed since (None if nothing changed).
+        """
+        delta = self.delta(subscriber.since, subscriber.fields)
+        subscriber.since = None
+        if delta is None:
+            return None
+        if delta.get('full'):
+            return _event('snapshot', self.token, {'version': self.token, 'pods': delta['changed']})
+        return _event('diff', self.token, delta)
+
+    def diff_event(self, subscriber: Subscriber, version: int, changed: list, removed: List[str]) -> Optional[bytes]:
+        # Pods whose selected fields did not change are left out; None if that leaves nothing to send
+        if len(subscriber.fields) < len(SWARM_STATUS_FIELDS):
+            changed = [(old, new) for old, new in changed
+                       if old is None or _compared(old, subscriber.fields) != _compared(new, subscriber.fields)]
+        removed = removed if 'podID' in subscriber.fields else []
+        if not changed and not removed:
+            return None
+        token = format_token(self.epoch, version)
+        return _event('diff', token, {'version': token, 'changed': [_project(new, subscriber.fields) for _, new in changed],
+                                      'removed': removed})
+
+    async def stream(self, fields: List[str] = SWARM_STATUS_FIELDS, since: Optional[str] = None):
+        """
+        Server-sent events for one subscriber: a 'snapshot' of every pod (or the changes since `since`), then
+        a 'diff' with the changed and removed pods whenever the status changes, and a comment every
+        SWARM_STATUS_FEED_KEEPALIVE_SECONDS.
+        """
+        subscriber = Subscriber(fields, since)
+        self.subscribers.add(subscriber)
+        self.wakeup.set()
+        try:
+            if self.is_live():  # Otherwise the snapshot may be stale: wait for the refresh the wakeup triggers
+                subscriber.needs_snapshot = False
+                event = self.catch_up_event(subscriber)
+                if event is not None:
+                    yield event
+            while True:
+                try:
+                    message = await asyncio.wait_for(subscriber.queue.get(), SWARM_STATUS_FEED_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield b": keepalive\n\n"
+                    continue
+                if subscriber.needs_snapshot:
+                    subscriber.needs_snapshot = False
+                    event = self.catch_up_event(subscriber)
+                    if event is not None:
+                        yield event
+                elif message is not None:
+                    event = self.diff_event(subscriber, *message)
+                    if event is not None:
+                        yield event
+        finally:
+            self.subscribers.discard(subscriber)
+
+    def stats(self) -> Dict[str, object]:
+        return {'subscribers': len(self.subscribers), 'version': self.token, 'pods': len(self.pods)}
+
+
+async def run_swarm_status_feed(sessionmaker, probe_interval: float = SWARM_STATUS_FEED_PROBE_SECONDS,
+                                refresh_interval: float = SWARM_STATUS_FEED_REFRESH_SECONDS):
+    """
+    Background task: while anyone is subscribed, probes for changes every <probe_interval> seconds and
+    recomputes the swarm status when something changed, or at least every <refresh_interval> seconds.
+    Idle (no DB load) while nobody is subscribed.
+    """
+    feed = SwarmStatusFeedSingleton()
+    while True:
+        if not feed.subscribers:
+            feed.wakeup.clear()
+            await feed.wakeup.wait()
+        try:
+            async with sessionmaker() as db:
+                marker = await feed.change_marker(db)
+                if marker != feed.marker or not feed.is_live():
+                    await feed.refresh(db, marker)
+                else:
+                    await feed.refresh(db, marker, max_age=refresh_interval)
+                feed.probed_at = time.monotonic()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.server_error(f"Error refreshing swarm status feed: {e}")
+        await asyncio.sleep(probe_interval)
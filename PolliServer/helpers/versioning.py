@@ -0,0 +1,43 @@
+# PolliServer/helpers/versioning.py
+import time
+from typing import Optional
+
+from fastapi.responses import Response
+
+from PolliServer.helpers.serialization import FastJSONResponse
+
+# Data version tokens, '<epoch>.<version>'. The version increases with every change of the data it tracks;
+# the epoch identifies the process that counted it, so a token from before a restart (or from another
+# worker) is never mistaken for one of ours: the client is sent everything instead of a delta.
+
+
+def new_epoch() -> str:
+    return f'{int(time.time() * 1000):x}'
+
+
+def format_token(epoch: str, version: int) -> str:
+    return f'{epoch}.{version}'
+
+
+def parse_since(since: Optional[str], epoch: str, version: int, horizon: int = 0) -> Optional[int]:
+    """
+    The version a since= token refers to, or None if the client needs the full data: no token, a token of
+    another epoch (e.g. since=0 on the first request), a malformed one, or one older than `horizon`
+    (the oldest version changes are still known since).
+    """
+    if not since:
+        return None
+    token_epoch, _, token_version = since.partition('.')
+    if token_epoch != epoch or not token_version.isdigit():
+        return None
+    since_version = int(token_version)
+    if since_version > version or since_version < horizon:
+        return None
+    return since_version
+
+
+def delta_response(delta: Optional[dict]) -> Response:
+    """A delta as JSON, or an empty 304 if nothing changed since the client's version."""
+    if delta is None:
+        return Response(status_code=304)
+    return FastJSONResponse(delta)
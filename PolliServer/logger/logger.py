@@ -1,38 +1,99 @@
-import logging
+
+import atexit
 import os
 import sys
+import time
+from collections import deque
 from datetime import datetime
-from threading import Timer
+from threading import Event, Lock, Thread
+
+from PolliServer.constants import LOG_BACKUP_COUNT, LOG_BATCH_RECORDS, LOG_FLUSH_INTERVAL_SECONDS, LOG_MAX_BYTES, \
+    LOG_OVERLOAD_SAMPLE_EVERY, LOG_QUEUE_MAX_RECORDS
+
+# Streams, each written to its own file (see Logger.__init__)
+MAIN, PROFILE, SERVER, STDOUT, STDERR = 'main', 'profile', 'server', 'stdout', 'stderr'
+# Levels that are never sampled away under overload (up to twice the queue limit)
+_KEPT_LEVELS = ('ERROR', 'WARNING')
+
 
 class LoggerSingleton:
     _instance = None
 
     @classmethod
-    def get_logger(cls, log_dir='logs', run_name=None, log_buffer=5):
+    def get_logger(cls, log_dir='logs', run_name=None, log_buffer=LOG_BATCH_RECORDS):
         if cls._instance is None:
             cls._instance = Logger(log_dir, run_name, log_buffer)
         return cls._instance
-    
+
+
 class StreamWriter:
-    def __init__(self, buffer, log_file):
-        if log_file is None:
-            raise ValueError("Logger.StreamWriter: stdout/stderr log_file must be provided")
-        self.buffer = buffer
-        self.log_file = log_file
+    """File-like stand-in for sys.stdout / sys.stderr that hands every write to the logger's writer thread."""
+
+    def __init__(self, logger, stream):
+        self.logger = logger
+        self.stream = stream
 
     def write(self, message):
-        self.buffer.append(message)
+        self.logger._enqueue(self.stream, None, message)
+        return len(message)
 
     def flush(self):
-        with open(self.log_file, 'a') as file:
-            file.writelines(self.buffer)
-        self.buffer.clear()
+        pass  # The writer thread flushes every LOG_FLUSH_INTERVAL_SECONDS
+
+
+class LogFile:
+    """An open append-mode log file, rotated to .1, .2, ... once it exceeds max_bytes."""
+
+    def __init__(self, path, max_bytes=LOG_MAX_BYTES, backup_count=LOG_BACKUP_COUNT):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.file = None
+        self.size = 0
+
+    def write(self, text):
+        if self.file is None:
+            self.file = open(self.path, 'ab')
+            self.size = self.file.tell()
+        data = text.encode('utf-8', 'backslashreplace')  # Encoded here, so size counts bytes rather than characters
+        self.file.write(data)
+        self.size += len(data)
+        if self.max_bytes and self.size >= self.max_bytes:
+            self.rotate()
+
+    def rotate(self):
+        self.close()
+        if self.backup_count > 0:
+            for index in range(self.backup_count - 1, 0, -1):
+                if os.path.exists(f'{self.path}.{index}'):
+                    os.replace(f'{self.path}.{index}', f'{self.path}.{index + 1}')
+            os.replace(self.path, f'{self.path}.1')
+        else:
+            os.remove(self.path)
+
+    def flush(self):
+        if self.file is not None:
+            self.file.flush()
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
 
 
 class Logger:
-    def __init__(self, log_dir='logs', run_name=None, log_buffer=5):
+    """
+    Non-blocking logger. Callers only append (timestamp, stream, level, message) to a deque, which is
+    atomic and never waits on a lock; one daemon thread drains it into open, size-rotated files every
+    LOG_FLUSH_INTERVAL_SECONDS, or sooner once log_buffer records are queued or an error is logged.
+
+    Beyond LOG_QUEUE_MAX_RECORDS queued records (the disk cannot keep up), only one in
+    LOG_OVERLOAD_SAMPLE_EVERY info/debug/profile records is kept; the writer notes how many were dropped.
+    """
+
+    def __init__(self, log_dir='logs', run_name=None, log_buffer=LOG_BATCH_RECORDS):
         os.makedirs(log_dir, exist_ok=True)
-        
+
         run_name = run_name + datetime.now().strftime("_%Y-%m-%d_%H-%M") if run_name else datetime.now().strftime("%Y-%m-%d_%H-%M")
 
         if run_name is None:
@@ -44,134 +105,143 @@ class Logger:
 
         self.log_file = os.path.join(log_dir, f'{run_name}.log')
         self.profile_log_file = os.path.join(log_dir, f'{run_name}_profile.log')
+        self.server_log_file = os.path.join(log_dir, f'{run_name}_server.log')
         self.stdout_log_file = os.path.join(log_dir, f'{run_name}_stdout.log')
         self.stderr_log_file = os.path.join(log_dir, f'{run_name}_stderr.log')
-        self.buffered_logs = []
-        self.profile_buffered_logs = []
-        self.stdout_buffered_logs = []
-        self.stderr_buffered_logs = []
-        self.buffer_limit = log_buffer  # Adjust as needed
+        self.files = {MAIN: LogFile(self.log_file), PROFILE: LogFile(self.profile_log_file),
+                      SERVER: LogFile(self.server_log_file), STDOUT: LogFile(self.stdout_log_file),
+                      STDERR: LogFile(self.stderr_log_file)}
+        self.buffer_limit = log_buffer
+
+        self.queue = deque()
+        # Per stream, records dropped since the writer last reported them. Counted without a lock,
+        # so concurrent drops from several threads may undercount slightly.
+        self.dropped = {stream: 0 for stream in self.files}
+        self.dropped_total = 0
+        self.overflowed = 0  # Records that arrived while overloaded, for sampling
+        self.written_total = 0
+
+        self.stdout_writer = StreamWriter(self, STDOUT)
+        self.stderr_writer = StreamWriter(self, STDERR)
+
+        self.wakeup = Event()
+        self.closed = False
+        self.close_lock = Lock()  # Serializes the writes made without the writer thread, once it has exited
+        self.writer = Thread(target=self._run_writer, name='log-writer', daemon=True)  # Never keeps the process alive on exit
+        self.writer.start()
+        atexit.register(self.close_logs)  # Daemon threads are killed at exit; write what is still queued
 
-        self.logger = logging.getLogger(run_name)
-        self.logger.setLevel(logging.INFO)
-        
-        self.stdout_writer = StreamWriter(self.stdout_buffered_logs, self.stdout_log_file)
-        self.stderr_writer = StreamWriter(self.stderr_buffered_logs, self.stderr_log_file)
-
-        file_handler = logging.FileHandler(self.log_file)
-        formatter = logging.Formatter('%(asctime)s : %(levelname)s : %(name)s : %(message)s')
-        file_handler.setFormatter(formatter)
-
-        self.logger.addHandler(file_handler)
-
-        self.profile_logger = logging.getLogger(f"{run_name}_profile")
-        self.profile_logger.setLevel(logging.INFO)
-
-        profile_file_handler = logging.FileHandler(self.profile_log_file)
-        profile_file_handler.setFormatter(formatter)
-
-        self.profile_logger.addHandler(profile_file_handler)
-        
-        self.server_log_file = os.path.join(log_dir, f'{run_name}_server.log')  # New attribute for server log file
-        self.server_buffered_logs = []  # New buffer for server logs
-
-        self.server_logger = logging.getLogger(f"{run_name}_server")  # New logger instance for server
-        self.server_logger.setLevel(logging.INFO)
-
-        server_file_handler = logging.FileHandler(self.server_log_file)
-        server_file_handler.setFormatter(formatter)
-
-        self.server_logger.addHandler(server_file_handler)
-
-        self.flush_timer = Timer(5, self.flush_logs)
-        self.flush_timer.start()
-        
     def redirect_stdout(self):
         sys.stdout = self.stdout_writer
 
     def redirect_stderr(self):
         sys.stderr = self.stderr_writer
 
+    def _enqueue(self, stream, level, message):
+        queued = len(self.queue)
+        if queued >= LOG_QUEUE_MAX_RECORDS and (level not in _KEPT_LEVELS or queued >= 2 * LOG_QUEUE_MAX_RECORDS):
+            self.overflowed += 1
+            if level is None or self.overflowed % LOG_OVERLOAD_SAMPLE_EVERY:
+                self.dropped[stream] += 1
+                self.dropped_total += 1
+                return
+        self.queue.append((time.time(), stream, level, message))
+        if self.closed:  # No writer thread any more
+            self._write_after_close()
+        elif level == 'ERROR' or queued + 1 == self.buffer_limit:
+            self.wakeup.set()
+
     def info(self, message):
-        self.buffered_logs.append(f'{datetime.now()} : INFO : {message}\n')
-        if len(self.buffered_logs) >= self.buffer_limit:
-            self.flush_logs()
+        self._enqueue(MAIN, 'INFO', message)
 
     def warning(self, message):
-        self.buffered_logs.append(f'{datetime.now()} : WARNING : {message}\n')
-        if len(self.buffered_logs) >= self.buffer_limit:
-            self.flush_logs()
+        self._enqueue(MAIN, 'WARNING', message)
 
     def error(self, message):
-        self.buffered_logs.append(f'{datetime.now()} : ERROR : {message}\n')
-        self.flush_logs()  # You might want to flush immediately on errors
+        self._enqueue(MAIN, 'ERROR', message)  # Written right away rather than at the next interval
 
     def debug(self, message):
-        self.buffered_logs.append(f'{datetime.now()} : DEBUG : {message}\n')
-        if len(self.buffered_logs) >= self.buffer_limit:
-            self.flush_logs()
+        self._enqueue(MAIN, 'DEBUG', message)
 
     def profile(self, message):
-        self.profile_buffered_logs.append(f'{datetime.now()} : PROFILE : {message}\n')
-        if len(self.profile_buffered_logs) >= self.buffer_limit:
-            self.flush_profile_logs()
-            
+        self._enqueue(PROFILE, 'PROFILE', message)
+
     def server_info(self, message):
-        self.server_buffered_logs.append(f'{datetime.now()} : INFO : {message}\n')
-        if len(self.server_buffered_logs) >= self.buffer_limit:
-            self.flush_server_logs()
+        self._enqueue(SERVER, 'INFO', message)
 
     def server_warning(self, message):
-        self.server_buffered_logs.append(f'{datetime.now()} : WARNING : {message}\n')
-        if len(self.server_buffered_logs) >= self.buffer_limit:
-            self.flush_server_logs()
+        self._enqueue(SERVER, 'WARNING', message)
 
     def server_error(self, message):
-        self.server_buffered_logs.append(f'{datetime.now()} : ERROR : {message}\n')
-        self.flush_server_logs()  # Flush immediately on server errors
+        self._enqueue(SERVER, 'ERROR', message)
 
     def server_debug(self, message):
-        self.server_buffered_logs.append(f'{datetime.now()} : DEBUG : {message}\n')
-        if len(self.server_buffered_logs) >= self.buffer_limit:
-            self.flush_server_logs()
+        self._enqueue(SERVER, 'DEBUG', message)
+
+    def stats(self):
+        """Records waiting to be written, written so far, and dropped under overload so far."""
+        return {'queued': len(self.queue), 'written': self.written_total, 'dropped': self.dropped_total}
+
+    # --- Writer thread --- #
+
+    def _run_writer(self):
+        while not self.closed:
+            self.wakeup.wait(LOG_FLUSH_INTERVAL_SECONDS)
+            self.wakeup.clear()
+            self._write_queued()
+
+    def _write_queued(self):
+        """Writes everything queued so far, one write per stream, then flushes the files written to."""
+        batches = {}
+        queue = self.queue
+        records = len(queue)
+        for _ in range(records):
+            timestamp, stream, level, message = queue.popleft()
+            if level is None:  # Redirected stdout / stderr, written verbatim
+                line = message
+            else:
+                line = f'{datetime.fromtimestamp(timestamp)} : {level} : {message}\n'
+            batches.setdefault(stream, []).append(line)
+
+        for stream, count in self.dropped.items():
+            if count:
+                self.dropped[stream] -= count
+                batches.setdefault(stream, []).append(
+                    f'{datetime.now()} : WARNING : Logger overloaded: dropped {count} records, kept 1 in {LOG_OVERLOAD_SAMPLE_EVERY}\n')
+
+        for stream, lines in batches.items():
+            log_file = self.files[stream]
+            try:
+                log_file.write(''.join(lines))
+                log_file.flush()
+            except Exception as e:  # E.g. a full disk: lose this batch, not the writer thread
+                print(f"Logger: could not write {log_file.path}: {e}", file=sys.__stderr__)
+                log_file.close()
+        self.written_total += records
+
+    def _write_after_close(self):
+        # Until the writer thread has exited, it (or close_logs' final drain) writes what is queued
+        if not self.writer.is_alive():
+            with self.close_lock:
+                self._write_queued()
 
     def flush_logs(self):
-        with open(self.log_file, 'a') as log_file:
-            log_file.writelines(self.buffered_logs)
-        self.buffered_logs = []
-        
-        with open(self.stdout_log_file, 'a') as stdout_log_file:
-            stdout_log_file.writelines(self.stdout_buffered_logs)
-        self.stdout_buffered_logs = []
-
-        with open(self.stderr_log_file, 'a') as stderr_log_file:
-            stderr_log_file.writelines(self.stderr_buffered_logs)
-        self.stderr_buffered_logs = []
-        
-        self.flush_timer = Timer(5, self.flush_logs)
-        self.flush_timer.start()
-        self.flush_profile_logs()
-
-    def flush_profile_logs(self):
-        with open(self.profile_log_file, 'a') as profile_log_file:
-            profile_log_file.writelines(self.profile_buffered_logs)
-        self.profile_buffered_logs = []
-
-    def flush_server_logs(self):
-        with open(self.server_log_file, 'a') as server_log_file:
-            server_log_file.writelines(self.server_buffered_logs)
-        self.server_buffered_logs = []
-        
+        """Asks the writer thread to write what is queued now rather than at the next interval."""
+        self.wakeup.set()
+
     def close_logs(self):
         # Called on program exit
-        self.flush_logs()
-        self.flush_profile_logs()
-        self.flush_server_logs()
-        self.logger.removeHandler(self.logger.handlers[0])
-        if self.profile_logger is not None:
-            self.profile_logger.removeHandler(self.profile_logger.handlers[0])
-        if self.server_logger is not None:
-            self.server_logger.removeHandler(self.server_logger.handlers[0])
-        self.logger = None
-        self.profile_logger = None
-        self.server_logger = None
\ No newline at end of file
+        if self.closed:
+            return
+        self.closed = True
+        self.wakeup.set()
+        if self.writer.is_alive():
+            self.writer.join(timeout=5)
+        atexit.unregister(self.close_logs)
+        if self.writer.is_alive():  # Stuck writing (e.g. a stalled disk): it still owns the queue and the files
+            print("Logger: writer thread did not exit, records still queued are not written", file=sys.__stderr__)
+            return
+        with self.close_lock:
+            self._write_queued()
+            for log_file in self.files.values():
+                log_file.close()
@@ -0,0 +1,271 @@
+# PolliServer/metrics/metrics.py
+import time
+from bisect import bisect_left
+from typing import List, Optional, Sequence, Tuple
+
+from starlette.routing import Match
+
+from PolliServer.constants import *
+from PolliServer.backend.ServerBackendSingleton import ServerBackendSingleton
+from PolliServer.backend.profiling import QueryProfilerSingleton, RequestStatements, current_statements
+from PolliServer.cache.response_cache import ResponseCacheSingleton
+from PolliServer.helpers.swarm_status_feed import SwarmStatusFeedSingleton
+from PolliServer.logger.logger import LoggerSingleton
+
+logger = LoggerSingleton().get_logger()
+
+# Prometheus text exposition format (Starlette appends the charset)
+CONTENT_TYPE = 'text/plain; version=0.0.4'
+PREFIX = 'polliserver'
+UNMATCHED_ROUTE = '<unmatched>'  # Label of requests no route matches, so unknown paths cannot grow the series
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names: Sequence[str], values: Sequence, extra: Optional[str] = None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value) -> str:
+    if value is None:
+        return 'NaN'
+    if isinstance(value, float):
+        return '+Inf' if value == float('inf') else repr(value)
+    return str(int(value))
+
+
+def _header(name: str, metric_type: str, help_text: str) -> List[str]:
+    return [f'# HELP {name} {help_text}', f'# TYPE {name} {metric_type}']
+
+
+class Histogram:
+    """Fixed-bucket histogram per label tuple. Observing is a bisect and two additions."""
+
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str], buckets: Sequence[float]):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self.series = {}  # labels -> [per-bucket counts (last one is +Inf), sum]
+
+    def observe(self, labels: Tuple, value: float):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [[0] * (len(self.buckets) + 1), 0]
+        # Buckets are upper bounds (le): the first bound >= value
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def render(self) -> List[str]:
+        lines = _header(self.name, 'histogram', self.help_text)
+        bounds = [_format_value(float(bound)) for bound in self.buckets] + ['+Inf']
+        for labels, (counts, total) in self.series.items():
+            cumulative = 0
+            for bound, count in zip(bounds, counts):
+                cumulative += count
+                le = 'le="' + bound + '"'
+                lines.append(f'{self.name}_bucket{_format_labels(self.label_names, labels, le)} {cumulative}')
+            label_string = _format_labels(self.label_names, labels)
+            lines.append(f'{self.name}_sum{label_string} {_format_value(total)}')
+            lines.append(f'{self.name}_count{label_string} {cumulative}')
+        return lines
+
+
+def _render_samples(name: str, metric_type: str, help_text: str, label_names: Sequence[str],
+                    samples: List[Tuple[Tuple, object]]) -> List[str]:
+    """Lines for values read at scrape time (pool and cache state)."""
+    lines = _header(name, metric_type, help_text)
+    for labels, value in samples:
+        lines.append(f'{name}{_format_labels(label_names, labels)} {_format_value(value)}')
+    return lines
+
+
+class RequestMetrics:
+    """What one request cost. Its DB statements are counted by the QueryProfilerSingleton, through current_statements."""
+    __slots__ = ('statements', 'status', 'response_bytes')
+
+    def __init__(self, label: str):
+        self.statements = RequestStatements(label)
+        self.status = 500  # Until the app starts a response
+        self.response_bytes = 0
+
+
+# Request path -> route template. Matching costs tens of microseconds, a lookup next to nothing; bounded, since paths are client-chosen.
+_route_templates = {}
+_ROUTE_TEMPLATES_MAX_SIZE = 4096
+
+
+def route_of(scope) -> str:
+    """Path template of the route serving the request (e.g. '/export/{record_type}'), for low-cardinality labels."""
+    path = scope['path']
+    template = _route_templates.get(path)
+    if template is not None:
+        return template
+    template = UNMATCHED_ROUTE
+    for route in getattr(scope.get('app'), 'routes', ()):
+        match, _ = route.matches(scope)
+        if match != Match.NONE:
+            template = route.path
+            break
+    if len(_route_templates) < _ROUTE_TEMPLATES_MAX_SIZE:
+        _route_templates[path] = template
+    return template
+
+
+class MetricsSingleton:
+    """
+    Request, database, cache and connection pool metrics for /metrics.
+
+    Per-request values are collected by MetricsMiddleware, with DB statements timed by the
+    QueryProfilerSingleton; DB totals, pool and cache state are read when /metrics is scraped.
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(MetricsSingleton, cls).__new__(cls)
+            cls._instance._setup()
+        return cls._instance
+
+    def _setup(self):
+        route_labels = ('route', 'method', 'status')
+        self.request_duration = Histogram(f'{PREFIX}_request_duration_seconds',
+                                          'Time from receiving a request until its last response byte was sent.',
+                                          route_labels, METRICS_LATENCY_BUCKETS)
+        self.response_size = Histogram(f'{PREFIX}_response_size_bytes', 'Response body bytes sent, after compression.',
+                                       route_labels, METRICS_SIZE_BUCKETS)
+        self.request_queries = Histogram(f'{PREFIX}_request_db_queries', 'DB statements executed per request.',
+                                         route_labels, METRICS_QUERY_COUNT_BUCKETS)
+        self.request_db_time = Histogram(f'{PREFIX}_request_db_seconds', 'Time spent executing DB statements per request.',
+                                         route_labels, METRICS_DB_TIME_BUCKETS)
+        self.request_rows = Histogram(f'{PREFIX}_request_db_rows', 'Result rows returned by the DB per request (where the driver reports them).',
+                                      route_labels, METRICS_ROW_COUNT_BUCKETS)
+
+    def observe_request(self, scope, request: RequestMetrics, duration: float):
+        route = route_of(scope)
+        labels = (route, scope['method'], str(request.status))
+        self.request_duration.observe(labels, duration)
+        self.response_size.observe(labels, request.response_bytes)
+        statements = request.statements
+        self.request_queries.observe(labels, statements.count)
+        self.request_db_time.observe(labels, statements.seconds)
+        self.request_rows.observe(labels, statements.rows)
+        if duration >= METRICS_SLOW_REQUEST_SECONDS:
+            query_string = scope.get('query_string', b'').decode('latin-1')
+            logger.profile(f"Slow request {scope['method']} {scope['path']}{'?' + query_string if query_string else ''} "
+                           f"({route}) -> {request.status} in {duration * 1000:.0f} ms: {statements.count} DB statements "
+                           f"taking {statements.seconds * 1000:.0f} ms, {request.response_bytes} bytes")
+
+    # --- Exposition --- #
+
+    def _db_lines(self) -> List[str]:
+        databases = QueryProfilerSingleton().stats()
+        lines = []
+        for key, name, help_text in (
+                ('statements', 'db_queries_total', 'DB statements executed, including background tasks.'),
+                ('seconds', 'db_query_seconds_total', 'Time spent executing DB statements, including background tasks.'),
+                ('errors', 'db_query_errors_total', 'DB statements that raised an error.'),
+                ('slow', 'db_slow_queries_total', 'DB statements over the slow statement threshold (see the profile log).')):
+            lines += _render_samples(f'{PREFIX}_{name}', 'counter', help_text, ('database',),
+                                     [((database,), stats[key]) for database, stats in databases.items()])
+        return lines
+
+    def _pool_lines(self) -> List[str]:
+        status = ServerBackendSingleton().pool_status()
+        if status is None:
+            return []
+        databases = status['databases']
+        lines = []
+        for key, metric_type, help_text in (
+                ('size', 'gauge', 'Configured pool_size.'),
+                ('checked_out', 'gauge', 'Connections currently in use.'),
+                ('idle', 'gauge', 'Connections idle in the pool.'),
+                ('overflow', 'gauge', 'Connections opened beyond pool_size.'),
+                ('connects', 'counter', 'Connections opened.'),
+                ('checkouts', 'counter', 'Connection checkouts.'),
+                ('timeouts', 'counter', 'Requests that timed out waiting for a connection.')):
+            name = f'{PREFIX}_db_pool_{key}' + ('_total' if metric_type == 'counter' else '')
+            samples = [((database,), node[key]) for database, node in databases.items() if key in node]
+            lines += _render_samples(name, metric_type, help_text, ('database',), samples)
+        lines += _render_samples(f'{PREFIX}_db_pool_checkout_wait_p95_seconds', 'gauge',
+                                 'p95 of the recent connection checkout waits of requests.', ('database',),
+                                 [((database,), node['wait_ms']['p95'] / 1000 if node['wait_ms']['p95'] is not None else None)
+                                  for database, node in databases.items()])
+        lines += _render_samples(f'{PREFIX}_db_healthy', 'gauge', 'Whether the database is in rotation (1) or cooling down (0).',
+                                 ('database', 'role'), [((database, node['role']), node['healthy']) for database, node in databases.items()])
+        lines += _render_samples(f'{PREFIX}_db_replica_lag_seconds', 'gauge', 'Last measured replica lag.', ('database',),
+                                 [((database,), node['lag_seconds']) for database, node in databases.items() if node['lag_seconds'] is not None])
+        lines += _render_samples(f'{PREFIX}_db_reads_total', 'counter', 'Read sessions routed to each database.', ('database',),
+                                 [((database,), reads) for database, reads in status['routing']['reads'].items()])
+        return lines
+
+    def _cache_lines(self) -> List[str]:
+        endpoints = ResponseCacheSingleton().stats()['endpoints']
+        lookups = [((endpoint, result), stats[key]) for endpoint, stats in endpoints.items()
+                   for result, key in (('hit', 'hits'), ('miss', 'misses'), ('bypass', 'bypasses'), ('coalesced', 'coalesced'))]
+        return (_render_samples(f'{PREFIX}_response_cache_lookups_total', 'counter', 'Response cache lookups by result (coalesced lookups are also counted as misses).',
+                                ('endpoint', 'result'), lookups) +
+                _render_samples(f'{PREFIX}_response_cache_hit_ratio', 'gauge', 'Response cache hits / (hits + misses).',
+                                ('endpoint',), [((endpoint,), stats['hit_rate']) for endpoint, stats in endpoints.items()]) +
+                _render_samples(f'{PREFIX}_response_cache_entries', 'gauge', 'Responses currently cached.',
+                                ('endpoint',), [((endpoint,), stats['size']) for endpoint, stats in endpoints.items()]) +
+                _render_samples(f'{PREFIX}_response_cache_evictions_total', 'counter', 'Cached responses evicted by the LRU limit.',
+                                ('endpoint',), [((endpoint,), stats['evictions']) for endpoint, stats in endpoints.items()]))
+
+    def _log_lines(self) -> List[str]:
+        stats = logger.stats()
+        return (_render_samples(f'{PREFIX}_log_queued_records', 'gauge', 'Log records waiting for the writer thread.', (), [((), stats['queued'])]) +
+                _render_samples(f'{PREFIX}_log_written_records_total', 'counter', 'Log records written.', (), [((), stats['written'])]) +
+                _render_samples(f'{PREFIX}_log_dropped_records_total', 'counter', 'Log records dropped while the log queue was full.',
+                                (), [((), stats['dropped'])]))
+
+    def render(self) -> str:
+        lines = []
+        for metric in (self.request_duration, self.response_size, self.request_queries, self.request_db_time, self.request_rows):
+            lines += metric.render()
+        lines += self._db_lines()
+        lines += self._pool_lines()
+        lines += self._cache_lines()
+        lines += self._log_lines()
+        lines += _render_samples(f'{PREFIX}_swarm_status_subscribers', 'gauge', 'Open /swarm-status/stream connections.',
+                                 (), [((), SwarmStatusFeedSingleton().stats()['subscribers'])])
+        return '\n'.join(lines) + '\n'
+
+
+class MetricsMiddleware:
+    """
+    Records every HTTP request's latency, status, response size and DB usage.
+
+    A plain ASGI middleware rather than a BaseHTTPMiddleware: it only wraps `send`, so it adds no task
+    or body buffering, and streamed responses are measured until their last chunk.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or not METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        request = RequestMetrics(f"{scope['method']} {scope['path']}")
+        token = current_statements.set(request.statements)
+        started = time.perf_counter()
+
+        async def send_and_record(message):
+            if message['type'] == 'http.response.start':
+                request.status = message['status']
+            elif message['type'] == 'http.response.body':
+                request.response_bytes += len(message.get('body', b''))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_and_record)
+        finally:
+            current_statements.reset(token)
+            MetricsSingleton().observe_request(scope, request, time.perf_counter() - started)
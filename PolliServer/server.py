@@ -1,12 +1,13 @@
 # PolliServer.server.py
 import os
+import asyncio
 import signal
 import subprocess
 from typing import Optional, List
 from aiohttp import ClientSession, ClientTimeout
 from fastapi import HTTPException
-from fastapi import FastAPI, Query, Depends, HTTPException
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi import FastAPI, Query, Depends, HTTPException, Header
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
 from fastapi import Request
 from starlette.middleware.base import BaseHTTPMiddleware
 from fastapi.middleware.cors import CORSMiddleware
@@ -19,17 +20,35 @@ import datetime
 
 
 from PolliServer.constants import *
-from PolliServer.backend.get_db import get_db
+from PolliServer.backend.get_db import get_db, get_swarm_status_db
+from PolliServer.backend.replicas import run_replica_prober
+from PolliServer.backend.ServerBackendSingleton import ServerBackendSingleton
 from PolliServer.helpers.grabbers import *
-from PolliServer.helpers.getters import get_frame_counts, get_specimen_counts
+from PolliServer.helpers.getters import get_frame_counts, get_specimen_counts, get_frame_span_counts, get_specimen_span_counts, get_frame_span_counts_by_pod
 from PolliServer.helpers.stat_getters import get_frame_log_stats, get_specimen_log_stats
+from PolliServer.helpers.rollups import run_rollup_refresher
+from PolliServer.helpers.catalog import get_catalog, run_catalog_refresher
+from PolliServer.helpers.swarm_status_feed import SwarmStatusFeedSingleton, run_swarm_status_feed
+from PolliServer.helpers.versioning import delta_response
+from PolliServer.helpers.pagination import decode_cursor
+from PolliServer.helpers.serialization import FastJSONResponse
+from PolliServer.helpers import export
+from PolliServer.cache.response_cache import ResponseCacheMiddleware, ResponseCacheSingleton
+from PolliServer.cache.http_encoding import HTTPEncodingMiddleware
+from PolliServer.metrics.metrics import MetricsMiddleware, MetricsSingleton, CONTENT_TYPE as METRICS_CONTENT_TYPE
 from models.models import SpecimenRecord
 from PolliServer.logger.logger import LoggerSingleton
 
 logger = LoggerSingleton().get_logger()
 
 
-app = FastAPI(debug=True)
+app = FastAPI(debug=True, default_response_class=FastJSONResponse)
+
+# Innermost, so cached responses never carry another request's CORS headers
+app.add_middleware(ResponseCacheMiddleware)
+
+# ETag/304 handling and compression, outside the cache so cache hits are validated (and compressed) too
+app.add_middleware(HTTPEncodingMiddleware)
 
 app.add_middleware(
     CORSMiddleware,
@@ -37,6 +56,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],  # Pagination cursor of /specimen-detail-timeline, read by the cross-origin dashboard
 )
 
 class StripAPIPrefixMiddleware(BaseHTTPMiddleware):
@@ -50,11 +70,41 @@ class StripAPIPrefixMiddleware(BaseHTTPMiddleware):
         response = await call_next(request)
         return response
 
+# Outside the cache, compression and CORS, so latency and response sizes are as the client sees them (cache hits
+# and compression included); inside the /api/ prefix stripping, so requests are recorded under their route's path
+app.add_middleware(MetricsMiddleware)
+
 app.add_middleware(StripAPIPrefixMiddleware)
 
 time = datetime.datetime.now()
 print(f"Server started at {time.strftime('%Y-%m-%d %H:%M:%S')}")
 
+# --- Background tasks --- #
+
+background_tasks = []
+
+@app.on_event("startup")
+async def start_background_tasks():
+    backend = ServerBackendSingleton()
+    if backend.async_sessionmaker is None:
+        logger.server_warning("No database backend configured; background tasks not started")
+        return
+    await backend.create_tables()
+    await backend.warm_up()
+    if backend.router.replicas:
+        background_tasks.append(asyncio.create_task(run_replica_prober(backend.router)))
+    background_tasks.append(asyncio.create_task(run_catalog_refresher(backend.async_sessionmaker)))
+    background_tasks.append(asyncio.create_task(run_swarm_status_feed(backend.async_sessionmaker)))
+    if ROLLUPS_ENABLED:
+        background_tasks.append(asyncio.create_task(run_rollup_refresher(backend.async_sessionmaker)))
+
+@app.on_event("shutdown")
+async def stop_background_tasks():
+    for task in background_tasks:
+        task.cancel()
+    background_tasks.clear()
+    await ServerBackendSingleton().dispose()
+
 # --- Management API endpoints --- #
 
 @app.get("/shutdown")
@@ -73,6 +123,26 @@ async def set_debug_mode():
     os.kill(os.getpid(), signal.SIGHUP)
     return {"message": "Debug mode set and server restarting"}
 
+@app.get("/cache/stats")
+async def cache_stats():
+    return ResponseCacheSingleton().stats()
+
+@app.get("/cache/purge")
+async def cache_purge(endpoint: Optional[str] = None):
+    purged = ResponseCacheSingleton().purge(endpoint)
+    return {"message": f"Purged {purged} cached responses", "endpoint": endpoint}
+
+@app.get("/db/pool")
+async def db_pool_status():
+    status = ServerBackendSingleton().pool_status()
+    if status is None:
+        raise HTTPException(status_code=503, detail="No database backend configured")
+    return status
+
+@app.get("/metrics")
+async def metrics():
+    return Response(content=MetricsSingleton().render(), media_type=METRICS_CONTENT_TYPE)
+
 # --- Minor (utility) API endpoints --- #
 
 @app.get("/check_hub_connection")
@@ -103,12 +173,16 @@ async def check_hub_connection(hub_address: Optional[str] = "hub0"):
 #         print(f"Getter /podIDs SQLAlchemyError: {e}")
 #         raise HTTPException(status_code=500, detail=str(e))
 
+# The distinct-value getters take since=<version token> (since=0 at first): they then return
+## {version, added: [values added since that version]} ({version, full: true, added: [all values]} for an
+## unknown or other process's token), or an empty 304 if nothing was added
 @app.get("/podIDs")
-async def get_pod_ids(db: AsyncSession = Depends(get_db)):
+async def get_pod_ids(since: Optional[str] = None, db: AsyncSession = Depends(get_db)):
     try:
-        values = await db.execute(select(SpecimenRecord.podID).distinct())
-        values_list = [item for item in values.scalars().all() if item is not None]
-        return sorted(values_list)
+        catalog = await get_catalog(db)
+        if since is not None:
+            return delta_response(catalog.added_since('podIDs', since))
+        return catalog.pod_ids()
     except SQLAlchemyError as e:
         logger.server_error(f"Getter /podIDs SQLAlchemyError: {e}")
         print(f"Getter /podIDs SQLAlchemyError: {e}")
@@ -125,21 +199,23 @@ async def get_pod_ids(db: AsyncSession = Depends(get_db)):
 #         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/swarms")
-async def get_swarms(db: AsyncSession = Depends(get_db)):
+async def get_swarms(since: Optional[str] = None, db: AsyncSession = Depends(get_db)):
     try:
-        values = await db.execute(select(SpecimenRecord.swarm_name).distinct())
-        values_list = [item for item in values.scalars().all()]
-        return sorted(values_list)
+        catalog = await get_catalog(db)
+        if since is not None:
+            return delta_response(catalog.added_since('swarms', since))
+        return catalog.swarms()
     except SQLAlchemyError as e:
         logger.server_error(f"Getter /swarms SQLAlchemyError: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/runs")
-async def get_runs(db: AsyncSession = Depends(get_db)):
+async def get_runs(since: Optional[str] = None, db: AsyncSession = Depends(get_db)):
     try:
-        values = await db.execute(select(SpecimenRecord.run_name).distinct())
-        values_list = [item for item in values.scalars().all()]
-        return sorted(values_list)
+        catalog = await get_catalog(db)
+        if since is not None:
+            return delta_response(catalog.added_since('runs', since))
+        return catalog.runs()
     except SQLAlchemyError as e:
         logger.server_error(f"Getter /runs SQLAlchemyError: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -148,37 +224,63 @@ async def get_runs(db: AsyncSession = Depends(get_db)):
 
 
 @app.get("/dates")
-async def get_dates(db: AsyncSession = Depends(get_db)):
+async def get_dates(since: Optional[str] = None, db: AsyncSession = Depends(get_db)):
     try:
-        # Extract distinct dates (ignoring time)
-        dates = await db.execute(select(func.date(SpecimenRecord.timestamp)).distinct())
-        # Convert datetime.date objects to string and sort them
-        dates_list = sorted([date_obj.strftime('%Y-%m-%d') for date_obj in dates.scalars().all()])
-        return dates_list
+        # Distinct dates (ignoring time) as sorted 'YYYY-MM-DD' strings
+        catalog = await get_catalog(db)
+        if since is not None:
+            return delta_response(catalog.added_since('dates', since))
+        return catalog.dates()
     except SQLAlchemyError as e:
         logger.server_error(f"Getter /dates SQLAlchemyError: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+
+
+# S2 taxa with their specimen counts and first/last seen times, from the catalog's taxon-frequency index
+## Params: min_count (int, default=1), taxonRank (str, optional, e.g. 'L10'), limit (int, optional)
+@app.get("/taxa")
+async def get_taxa(min_count: int = Query(1),
+                   taxonRank: Optional[str] = Query(None),
+                   limit: Optional[int] = Query(None),
+                   db: AsyncSession = Depends(get_db)):
+    try:
+        taxa = (await get_catalog(db)).taxa_list(min_count=min_count, taxonRank=taxonRank)
+        return taxa[:limit] if limit else taxa
+    except SQLAlchemyError as e:
+        logger.server_error(f"Getter /taxa SQLAlchemyError: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
     
     
     
     
+# Frame counts per pod for one or more spans, in one grouped query regardless of the number of pods.
+## Params: podIDs (list, default: all pods with frames), hours (list of spans in hours, default=[24]),
+##         swarm_name / run_name (str, optional; restricts to pods that have specimens in that swarm/run),
+##         compare (bool, default=False; also count the previous period of each span)
+## Returns: {podID: {'current', 'span'[, 'previous', 'diff']}} for a single span,
+##          or {podID: {'<hours>_hours': {...}}} for several spans
 @app.get("/frame_counts")
 async def frame_counts_endpoint(podIDs: Optional[List[str]] = Query(None), 
-                                hours: Optional[int] = Query(24),
+                                hours: List[int] = Query([24]),
+                                swarm_name: Optional[str] = Query(None),
+                                run_name: Optional[str] = Query(None),
+                                compare: bool = Query(False),
                                 db: AsyncSession = Depends(get_db)):
     try:
-        # Initialize an empty dictionary to store the frame counts
-        frame_counts = {}
-
-        # Iterate over each podID
-        for podID in podIDs:
-            # Get the frame count for this podID
-            count = await get_frame_counts(db, podID, hours)
-            # Store the count in the dictionary
-            frame_counts[podID] = count
-
-        # Return the dictionary of frame counts
-        return frame_counts
+        catalog = await get_catalog(db)
+        if not podIDs:
+            podIDs = [podID for podID in catalog.frame_pod_ids() if podID is not None]
+        # FrameLog has no swarm/run columns, so those filters select pods via the specimen catalog
+        if swarm_name or run_name:
+            pods_in_swarm = set(catalog.specimen_pod_ids(swarm_name, run_name))
+            podIDs = [podID for podID in podIDs if podID in pods_in_swarm]
+
+        frame_counts = await get_frame_span_counts_by_pod(db, podIDs, hours, compare=compare)
+
+        if len(hours) == 1:
+            return {podID: span_counts[hours[0]] for podID, span_counts in frame_counts.items()}
+        return {podID: {f'{span}_hours': counts for span, counts in span_counts.items()}
+                for podID, span_counts in frame_counts.items()}
     except SQLAlchemyError as e:
         logger.server_error(f"Getter /frame_counts SQLAlchemyError: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -188,16 +290,47 @@ async def frame_counts_endpoint(podIDs: Optional[List[str]] = Query(None),
 # --- Major (grabber) API endpoints --- #
 
 # Returns a swarm_status JSON swarm_status list
+## Params: fields (list or comma-separated, optional; subset of SWARM_STATUS_FIELDS),
+##         since (version token, optional; since=0 at first): returns {version, changed: [status objects],
+##         removed: [podIDs]} with the pods changed since that version ('full': true and every pod for an
+##         unknown or other process's token), or an empty 304 if nothing changed
 @app.get("/swarm-status")
-async def swarm_status(db: AsyncSession = Depends(get_db)):
+async def swarm_status(fields: Optional[List[str]] = Query(None), since: Optional[str] = None,
+                       db: AsyncSession = Depends(get_swarm_status_db)):
     try:
-        return await grab_swarm_status(db)
+        if since is not None:
+            fields = select_fields(fields, SWARM_STATUS_FIELDS)
+            feed = SwarmStatusFeedSingleton()
+            await feed.ensure_fresh(db)
+            return delta_response(feed.delta(since, fields))
+        return await grab_swarm_status(db, fields=fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.server_error(f"Error in swarm_status endpoint: {e}")
         traceback.print_exc()  # This will print the traceback to the console.
         raise HTTPException(status_code=500, detail="Internal server error")
 
+# Swarm status pushed as server-sent events, computed once per process for all subscribers
+## Params: fields (list or comma-separated, optional; subset of SWARM_STATUS_FIELDS)
+## Events: 'snapshot' {version, pods} first, then 'diff' {version, changed: [status objects], removed: [podIDs]}
+## Reconnecting with Last-Event-ID (or since=<version token>) starts with a 'diff' since that version instead
+@app.get("/swarm-status/stream")
+async def swarm_status_stream(fields: Optional[List[str]] = Query(None), since: Optional[str] = None,
+                              last_event_id: Optional[str] = Header(None)):
+    if ServerBackendSingleton().async_sessionmaker is None:
+        raise HTTPException(status_code=503, detail="No database backend configured")
+    try:
+        fields = select_fields(fields, SWARM_STATUS_FIELDS)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return StreamingResponse(SwarmStatusFeedSingleton().stream(fields, last_event_id or since), media_type="text/event-stream",
+                             headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 # For SpecimenDetailHorizon
+## Paginated by (timestamp, id): pass the X-Next-Cursor response header back as 'cursor' to get the next page.
+## With stream=true, returns every matching row (up to 'limit', if given) as NDJSON instead.
+## fields (list or comma-separated, optional) selects a subset of SPECIMEN_DETAIL_TIMELINE_FIELDS.
 @app.get("/specimen-detail-timeline")
 async def specimen_detail_timeline(start_date: Optional[str] = Query(None),
                         end_date: Optional[str] = Query(None),
@@ -208,20 +341,66 @@ async def specimen_detail_timeline(start_date: Optional[str] = Query(None),
                         location: Optional[str] = Query(None),
                         S2a_score_thresh: Optional[float] = Query(0.0),
                         incl_images: Optional[bool] = Query(False),
+                        min_taxon_count: Optional[int] = Query(TIMELINE_MIN_TAXON_COUNT),
+                        cursor: Optional[str] = Query(None),
+                        limit: Optional[int] = Query(None, ge=1, le=TIMELINE_MAX_PAGE_SIZE),
+                        stream: bool = Query(False),
+                        fields: Optional[List[str]] = Query(None),
                         db: AsyncSession = Depends(get_db)):
 
+    filters = dict(start_date=start_date, end_date=end_date, podID=podID, 
+                   location=location, species_only=species_only, 
+                   S1_score_thresh=S1_score_thresh, S2_score_thresh=S2_score_thresh, 
+                   S2a_score_thresh=S2a_score_thresh, incl_images=incl_images,
+                   min_taxon_count=min_taxon_count, fields=fields)
     try:
-        specimen_detail_timeline = await grab_specimen_detail_timeline(db, start_date=start_date, end_date=end_date, podID=podID, 
-                                                 location=location, species_only=species_only, 
-                                                 S1_score_thresh=S1_score_thresh, S2_score_thresh=S2_score_thresh, 
-                                                 S2a_score_thresh=S2a_score_thresh, incl_images=incl_images)
-        return specimen_detail_timeline
+        # Reject malformed cursors and unknown fields before streaming starts
+        if cursor:
+            decode_cursor(cursor)
+        select_fields(fields, SPECIMEN_DETAIL_TIMELINE_FIELDS)
+        if stream:
+            rows = stream_specimen_detail_timeline(ServerBackendSingleton().read_sessionmaker(), cursor=cursor, limit=limit, **filters)
+            return StreamingResponse(rows, media_type="application/x-ndjson")
+
+        specimen_detail_timeline, next_cursor = await grab_specimen_detail_timeline(db, cursor=cursor, limit=limit or TIMELINE_PAGE_SIZE, **filters)
+        return FastJSONResponse(specimen_detail_timeline, headers={'X-Next-Cursor': next_cursor} if next_cursor else None)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.server_error(f"Error in specimen_detail_timeline endpoint: {e}")
         traceback.print_exc()  # This will print the traceback to the console.
         raise HTTPException(status_code=500, detail="Internal server error")
 
 
+# Bulk export of specimen, frame, sensor or pollination records as an Arrow IPC stream or a Parquet file
+## Params: record_type ('specimen', 'frame', 'sensor' or 'pollination'), format ('arrow' or 'parquet', default='arrow'),
+##         start / end (ISO date or datetime, optional), podID (list, optional), swarm_name, run_name (optional),
+##         fields (list or comma-separated, optional; default: every column)
+## Returns: The records ordered by (timestamp, id), streamed in batches. 501 if pyarrow is not installed.
+@app.get("/export/{record_type}")
+async def export_records(record_type: str,
+                         export_format: str = Query('arrow', alias='format', pattern="^(arrow|parquet)$"),
+                         start: Optional[str] = Query(None),
+                         end: Optional[str] = Query(None),
+                         podID: Optional[List[str]] = Query(None),
+                         swarm_name: Optional[str] = Query(None),
+                         run_name: Optional[str] = Query(None),
+                         fields: Optional[List[str]] = Query(None)):
+    if export.pa is None:
+        raise HTTPException(status_code=501, detail="Export requires pyarrow, which is not installed")
+    try:
+        start_datetime = datetime.datetime.fromisoformat(start) if start else None
+        end_datetime = datetime.datetime.fromisoformat(end) if end else None
+        query, columns = export.build_export_query(record_type, start_datetime, end_datetime, podID, swarm_name, run_name, fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    media_type, extension = export.EXPORT_FORMATS[export_format]
+    batches = export.stream_export(ServerBackendSingleton().read_sessionmaker(), query, columns, export_format)
+    return StreamingResponse(batches, media_type=media_type,
+                             headers={'Content-Disposition': f'attachment; filename="{record_type}.{extension}"'})
+
+
 @app.get("/clade-activity-array-data")
 async def clade_activity_array_data(clade: str,
                                     start_date: Optional[str] = Query(None),
@@ -233,7 +412,9 @@ async def clade_activity_array_data(clade: str,
                                     n_bins: Optional[int] = Query(10),
                                     db: AsyncSession = Depends(get_db)):
     try:
-        return await grab_clade_activity_array_data(db, clade, start_date, end_date, taxonRank, S1_score_thresh, S2_score_thresh, S2a_score_thresh, n_bins)
+        return FastJSONResponse(await grab_clade_activity_array_data(db, clade, start_date, end_date, taxonRank, S1_score_thresh, S2_score_thresh, S2a_score_thresh, n_bins))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.server_error(f"Error in clade_activity_array_data endpoint: {e}")
         traceback.print_exc()  # This will print the traceback to the console.
@@ -246,12 +427,16 @@ async def clade_activity_array_data(clade: str,
 ## Params: span (int, hours), n_bins (int, default=10), swarm_name (str, default=None), run_name (str, default=None)
 ## Returns: frame_log_array_data (list of lists). Each list contains: [time_bin_midpoint, count, podID]
 @app.get("/frame-log-array-data")
-async def frame_log_array_data(span: int = 24, n_bins: int = 10, swarm_name: Optional[str] = None, run_name: Optional[str] = None, db: AsyncSession = Depends(get_db)):
+async def frame_log_array_data(span: int = 24, n_bins: int = 10, swarm_name: Optional[str] = None, run_name: Optional[str] = None,
+                               response_format: str = Query('rows', alias='format', pattern=ARRAY_DATA_FORMAT_PATTERN), db: AsyncSession = Depends(get_db)):
     try:
-        return await grab_frame_log_array_data(db, span, n_bins, swarm_name, run_name)
+        return FastJSONResponse(await grab_frame_log_array_data(db, span, n_bins, swarm_name, run_name, columnar=response_format == 'columnar'))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.server_error(f"Error in frame_log_array_data endpoint: {e}")
         traceback.print_exc()
+        raise HTTPException(status_code=500, detail="Internal server error")
         
 
 # For FrameLogStats
@@ -275,12 +460,16 @@ async def frame_log_stats(span: int, swarm_name: Optional[str] = None, run_name:
 ## Params: span (int, hours), n_bins (int, default =10), swarm_name (str, default=None), run_name (str, default=None)
 ## Returns: specimen_log_array_data (list of lists). Each list contains: [time_bin_midpoint, count, podID]
 @app.get("/specimen-log-array-data")
-async def specimen_log_array_data(span: int = 24, n_bins: int = 10, swarm_name: Optional[str] = None, run_name: Optional[str] = None, db: AsyncSession = Depends(get_db)):
+async def specimen_log_array_data(span: int = 24, n_bins: int = 10, swarm_name: Optional[str] = None, run_name: Optional[str] = None,
+                                  response_format: str = Query('rows', alias='format', pattern=ARRAY_DATA_FORMAT_PATTERN), db: AsyncSession = Depends(get_db)):
     try:
-        return await grab_specimen_log_array_data(db, span, n_bins, swarm_name, run_name)
+        return FastJSONResponse(await grab_specimen_log_array_data(db, span, n_bins, swarm_name, run_name, columnar=response_format == 'columnar'))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.server_error(f"Error in specimen_log_array_data endpoint: {e}")
         traceback.print_exc()
+        raise HTTPException(status_code=500, detail="Internal server error")
 
 # For SpecimenLogStats
 ## Get the total no. specimens for a given time span and the previous time span. Optionally filter by swarm_name and run_name.
@@ -302,7 +491,9 @@ async def specimen_log_stats(span: int, swarm_name: Optional[str] = None, run_na
 ## Params: span (int, hours), n_bins (int, default=10), swarm_name (str, default=None)
 ## Returns: weather_log_array_data (list of lists). Each list contains: [time_bin_midpoint, cloud_coverage, rain_last_3h, wind_degree, wind_speed, humidity, pressure, temperature, aqi, coi, nh3i, noi, no2i, o3i, so2i, pm2_5i, pm10i, uv_index]
 @app.get("/weather-log-array-data")
-async def weather_log_array_data(span: int = 24, n_bins: int = 10, swarm_name: Optional[str] = None, lite: bool = False, db: AsyncSession = Depends(get_db)):
+async def weather_log_array_data(span: int = 24, n_bins: int = 10, swarm_name: Optional[str] = None, lite: bool = False, aggregate: Optional[str] = None,
+                                 fields: Optional[List[str]] = Query(None),
+                                 response_format: str = Query('rows', alias='format', pattern=ARRAY_DATA_FORMAT_PATTERN), db: AsyncSession = Depends(get_db)):
     """
     Endpoint to fetch weather log data, aggregated into time bins, optionally filtered by swarm_name.
     If 'lite' is True, only returns a subset of the weather data.
@@ -312,13 +503,18 @@ async def weather_log_array_data(span: int = 24, n_bins: int = 10, swarm_name: O
         n_bins (int): Number of bins to divide the time span into.
         swarm_name (Optional[str]): Name of the swarm to filter by. Default is None.
         lite (bool): Whether to return a lite version of the data. Default is False.
+        aggregate (Optional[str]): 'mean', 'min' or 'max' to aggregate each bin instead of taking the nearest record.
+        fields (Optional[List[str]]): Weather fields to return (repeated or comma-separated), overriding 'lite'.
+        format (str): 'rows' (default) or 'columnar' (one array per field).
     
     Returns:
         JSON response containing the weather data for each time bin.
     """
     try:
-        weather_data = await grab_weather_log_array_data(db, span, n_bins, swarm_name, lite)
-        return weather_data
+        weather_data = await grab_weather_log_array_data(db, span, n_bins, swarm_name, lite, aggregate, fields, columnar=response_format == 'columnar')
+        return FastJSONResponse(weather_data)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.server_error(f"Error in weather_log_array_data endpoint: {e}")
         traceback.print_exc()
@@ -331,16 +527,19 @@ async def swarm_stats(podID: Optional[str] = Query(None), db: AsyncSession = Dep
     try:
         # Initialize an empty dictionary to store the results
         results = {'podID': podID, 'frames': {}, 'specimens': {}}
-
-        # Get the frame counts for the 24 and 72 hour spans
-        for hours in [24, 72]:
-            frame_counts = await get_frame_counts(db, hours, podID, compare=True)
-            results['frames'][f'{hours}_hours'] = frame_counts
-
-        # Get the specimen counts for the 24 and 72 hour spans
-        for hours in [24, 72]:
-            specimen_counts = await get_specimen_counts(db, hours, podID, compare=True)
-            results['specimens'][f'{hours}_hours'] = specimen_counts
+        spans = [24, 72]
+
+        # Get the frame and specimen counts for the 24 and 72 hour spans (one query per table),
+        # concurrently on separate sessions
+        async with ServerBackendSingleton().read_sessionmaker()() as specimen_db:
+            frame_counts, specimen_counts = await asyncio.gather(
+                get_frame_span_counts(db, spans, podID, compare=True),
+                get_specimen_span_counts(specimen_db, spans, podID, compare=True),
+            )
+
+        for hours in spans:
+            results['frames'][f'{hours}_hours'] = frame_counts[hours]
+            results['specimens'][f'{hours}_hours'] = specimen_counts[hours]
 
         # Return the results
         return results
@@ -1,5 +1,5 @@
 # PolliOS.backend.models.models.py
-from sqlalchemy import create_engine, Column, Integer, String, Float, Boolean, DateTime, ForeignKey
+from sqlalchemy import create_engine, Column, Integer, BigInteger, String, Float, Boolean, DateTime, ForeignKey
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 
@@ -316,3 +316,28 @@ class WeatherRecord(Base):
     pm2_5i = Column(Float)
     pm10i = Column(Float)
     uv_index = Column(Float)
+
+
+# --- PolliServer-maintained tables --- #
+# These are written only by PolliServer (see PolliServer/helpers/rollups.py), never by PolliOS pods.
+
+class CountRollup(Base):
+    __tablename__ = 'count_rollups'
+
+    # Pre-aggregated row counts of a source table at minute/hour/day resolution.
+    # NULL dimensions are stored as '' so they can be part of the primary key.
+    source = Column(String(32), primary_key=True)  # Source table name, e.g. 'frame_log'
+    resolution = Column(Integer, primary_key=True)  # Bucket width in seconds
+    bucket = Column(BigInteger, primary_key=True)  # Seconds since the epoch (UTC) // resolution
+    podID = Column(String(64), primary_key=True, default='')
+    swarm_name = Column(String(64), primary_key=True, default='')
+    run_name = Column(String(64), primary_key=True, default='')
+    count = Column(BigInteger, nullable=False, default=0)
+
+class RollupWatermark(Base):
+    __tablename__ = 'rollup_watermarks'
+
+    # Highest source row id folded into count_rollups, per source table
+    source = Column(String(32), primary_key=True)
+    last_id = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime)
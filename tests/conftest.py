@@ -0,0 +1,51 @@
+# tests/conftest.py
+import asyncio
+import os
+import tempfile
+
+import httpx
+import pytest
+
+# Before any PolliServer module creates the logger, so test runs do not write to ./logs
+from PolliServer.logger.logger import LoggerSingleton
+
+LoggerSingleton.get_logger(log_dir=os.path.join(tempfile.gettempdir(), 'polliserver-test-logs'))
+
+from PolliServer.backend.ServerBackendSingleton import ServerBackendSingleton
+from PolliServer.bench.generate import generate, init_backend, parse_args
+
+
+@pytest.fixture(scope='session')
+def fleet_app(tmp_path_factory):
+    """The app, on a small synthetic fleet (see PolliServer.bench.generate) in a SQLite file."""
+    args = parse_args(['--sqlite', str(tmp_path_factory.mktemp('fleet') / 'fleet.db'),
+                       '--pods', '4', '--swarms', '2', '--days', '1', '--seed', '1'])
+    init_backend(args)
+
+    async def fill():
+        try:
+            await generate(args)
+        finally:
+            await ServerBackendSingleton().dispose()
+
+    asyncio.run(fill())
+    from PolliServer.server import app  # After the backend is initialized, as start_server.py does
+    return app
+
+
+@pytest.fixture
+def run_with_client(fleet_app):
+    """
+    Runs scenario(client) against the fleet app in a fresh event loop, then closes the pooled
+    connections, which belong to that loop.
+    """
+    def run(scenario):
+        async def main():
+            try:
+                async with httpx.AsyncClient(transport=httpx.ASGITransport(app=fleet_app), base_url='http://test') as client:
+                    return await scenario(client)
+            finally:
+                await ServerBackendSingleton().dispose()
+
+        return asyncio.run(main())
+    return run
@@ -0,0 +1,40 @@
+# tests/test_response_cache.py
+import asyncio
+
+from sqlalchemy import event
+
+from PolliServer.backend.ServerBackendSingleton import ServerBackendSingleton
+from PolliServer.bench.run import StatementCounter
+from PolliServer.cache.response_cache import ResponseCacheSingleton
+
+PATH = '/frame-log-stats'
+PARAMS = {'span': 24}
+
+
+def test_concurrent_misses_share_one_computation(run_with_client):
+    caches = ResponseCacheSingleton({'endpoints': {PATH: {'ttl': 60}}})
+
+    async def scenario(client):
+        backend = ServerBackendSingleton()
+        counter = StatementCounter(backend)
+        try:
+            # Statements one computation of the response takes (bypassing, then dropping, the cache)
+            expected = await client.get(PATH, params=PARAMS, headers={'cache-control': 'no-cache'})
+            assert expected.status_code == 200
+            per_computation = counter.count
+            assert per_computation > 0
+            caches.purge(PATH)
+
+            responses = await asyncio.gather(*[client.get(PATH, params=PARAMS) for _ in range(10)])
+            assert counter.count == 2 * per_computation
+            assert [response.status_code for response in responses] == [200] * 10
+            assert len({response.content for response in responses}) == 1
+            assert sorted(response.headers['x-cache'] for response in responses).count('MISS') == 1
+        finally:
+            for node in backend.nodes():
+                event.remove(node.engine.sync_engine, 'before_cursor_execute', counter.on_execute)
+
+    try:
+        run_with_client(scenario)
+    finally:
+        caches.configure({})
@@ -0,0 +1,118 @@
+# tests/test_rollups.py
+import asyncio
+import datetime
+import random
+
+import pytest
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from PolliServer.helpers import rollups
+from PolliServer.helpers.binning import TimeBins, grab_binned_counts, grab_window_counts
+from PolliServer.helpers.rollups import ROLLUP_SOURCES, create_rollup_tables, grab_rollup_binned_counts, \
+    grab_rollup_window_counts, recount_rollup_source, refresh_rollup_source
+from models.models import Base, FrameLog, SpecimenRecord
+
+NOW = datetime.datetime(2024, 6, 1, 12, 0, 0)
+SPAN = datetime.timedelta(hours=3)
+
+# Neither edge on a minute: every bin has partial first and last rollup buckets
+BIN_LAYOUTS = [
+    TimeBins(NOW - datetime.timedelta(hours=2, minutes=17, seconds=13, microseconds=500), NOW - datetime.timedelta(seconds=7.25), 7),
+    TimeBins(NOW - SPAN, NOW, 1),
+    TimeBins(NOW - datetime.timedelta(minutes=90, seconds=30), NOW, 181),  # 30 s bins: edges only, no whole bucket
+]
+WINDOWS = [(NOW - datetime.timedelta(hours=2, seconds=0.5), NOW), (NOW - datetime.timedelta(minutes=61, seconds=59), NOW - datetime.timedelta(minutes=1, seconds=1))]
+
+
+def frame_rows(ids, seed=0):
+    rng = random.Random(seed)
+    return [{'id': i, 'timestamp': NOW - datetime.timedelta(microseconds=rng.randrange(int(SPAN / datetime.timedelta(microseconds=1)))),
+             'podID': f'pod{i % 3}'} for i in ids]
+
+
+def specimen_rows(ids, seed=0):
+    return [dict(row, swarm_name=f'swarm{row["id"] % 2}', run_name='run1') for row in frame_rows(ids, seed)]
+
+
+@pytest.fixture
+def run_with_db(tmp_path):
+    """Runs scenario(db) against an empty SQLite database with every table, in a fresh event loop."""
+    def run(scenario):
+        async def main():
+            engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'rollups.db'}")
+            try:
+                async with engine.begin() as connection:
+                    await connection.run_sync(Base.metadata.create_all)
+                async with async_sessionmaker(engine, expire_on_commit=False)() as db:
+                    await create_rollup_tables(db)
+                    return await scenario(db)
+            finally:
+                await engine.dispose()
+
+        rollups._observed_max_ids.clear()
+        return asyncio.run(main())
+    return run
+
+
+async def assert_rollup_counts_match_raw(db, source_name, model, **filters):
+    raw_filters = [getattr(model, name) == value for name, value in filters.items()]
+    for bins in BIN_LAYOUTS:
+        for group_by_pod in (True, False):
+            raw = await grab_binned_counts(db, bins, model.timestamp, group_by=[model.podID] if group_by_pod else [],
+                                           conditions=raw_filters)
+            assert await grab_rollup_binned_counts(db, source_name, bins, group_by_pod=group_by_pod, **filters) == raw
+    raw = await grab_window_counts(db, model.timestamp, WINDOWS, conditions=raw_filters)
+    assert await grab_rollup_window_counts(db, source_name, WINDOWS, **filters) == raw
+
+
+def test_rollup_counts_match_raw_counts(run_with_db):
+    async def scenario(db):
+        await db.execute(insert(FrameLog), frame_rows(range(1, 3001)))
+        await db.execute(insert(SpecimenRecord), specimen_rows(range(1, 1001)))
+        await db.commit()
+        assert await refresh_rollup_source(db, ROLLUP_SOURCES['frame_log'], settle_seconds=0) == 3000
+        assert await refresh_rollup_source(db, ROLLUP_SOURCES['specimen_record'], settle_seconds=0) == 1000
+
+        # Rows above the watermark, not folded into the rollups yet
+        await db.execute(insert(FrameLog), frame_rows(range(3001, 3501), seed=1))
+        await db.execute(insert(SpecimenRecord), specimen_rows(range(1001, 1201), seed=1))
+        await db.commit()
+
+        await assert_rollup_counts_match_raw(db, 'frame_log', FrameLog)
+        await assert_rollup_counts_match_raw(db, 'specimen_record', SpecimenRecord)
+        await assert_rollup_counts_match_raw(db, 'specimen_record', SpecimenRecord, swarm_name='swarm1')
+
+    run_with_db(scenario)
+
+
+def test_refresh_folds_only_settled_ids(run_with_db):
+    async def scenario(db):
+        await db.execute(insert(FrameLog), frame_rows(range(1, 501)))
+        await db.commit()
+        # The max id has not been seen settle_seconds ago yet: nothing is folded, everything is counted raw
+        assert await refresh_rollup_source(db, ROLLUP_SOURCES['frame_log'], settle_seconds=60) == 0
+        await assert_rollup_counts_match_raw(db, 'frame_log', FrameLog)
+
+    run_with_db(scenario)
+
+
+def test_recount_repairs_rows_committed_below_watermark(run_with_db):
+    async def scenario(db):
+        late_ids = set(range(10, 2001, 10))
+        await db.execute(insert(FrameLog), frame_rows([i for i in range(1, 2001) if i not in late_ids]))
+        await db.commit()
+        await refresh_rollup_source(db, ROLLUP_SOURCES['frame_log'], settle_seconds=0)
+
+        # Ids assigned before the refresh, committed after it: below the watermark, but not in the rollups
+        await db.execute(insert(FrameLog), [row for row in frame_rows(range(1, 2001)) if row['id'] in late_ids])
+        await db.commit()
+        bins = BIN_LAYOUTS[0]
+        raw = await grab_binned_counts(db, bins, FrameLog.timestamp, group_by=[FrameLog.podID])
+        assert await grab_rollup_binned_counts(db, 'frame_log', bins) != raw
+
+        await db.commit()
+        await recount_rollup_source(db, ROLLUP_SOURCES['frame_log'], hours=6, now=NOW)
+        await assert_rollup_counts_match_raw(db, 'frame_log', FrameLog)
+
+    run_with_db(scenario)
@@ -0,0 +1,53 @@
+# tests/test_versioning.py
+from PolliServer.helpers.versioning import format_token, new_epoch, parse_since
+
+NO_CACHE = {'cache-control': 'no-cache'}
+
+
+def older_epoch(token: str) -> str:
+    """The same version, counted by a process that started earlier (e.g. before a restart)."""
+    epoch, _, version = token.partition('.')
+    return f'{int(epoch, 16) - 1:x}.{version}'
+
+
+def test_parse_since():
+    epoch = new_epoch()
+    assert parse_since(format_token(epoch, 3), epoch, 5) == 3
+    assert parse_since(older_epoch(format_token(epoch, 3)), epoch, 5) is None
+    assert parse_since(format_token(epoch, 6), epoch, 5) is None  # Newer than ours
+    assert parse_since(format_token(epoch, 1), epoch, 5, horizon=2) is None  # Older than what is still known
+    assert parse_since('0', epoch, 5) is None
+    assert parse_since('garbage', epoch, 5) is None
+
+
+def test_swarm_status_since_older_epoch_returns_full_snapshot(run_with_client):
+    async def scenario(client):
+        full = (await client.get('/swarm-status', params={'since': '0'}, headers=NO_CACHE)).json()
+        assert full['full'] is True and full['changed']
+        unchanged = await client.get('/swarm-status', params={'since': full['version']}, headers=NO_CACHE)
+        assert unchanged.status_code == 304
+
+        response = await client.get('/swarm-status', params={'since': older_epoch(full['version'])}, headers=NO_CACHE)
+        assert response.status_code == 200
+        resync = response.json()
+        assert resync['full'] is True
+        assert resync['removed'] == []
+        assert sorted(pod['podID'] for pod in resync['changed']) == sorted(pod['podID'] for pod in full['changed'])
+
+    run_with_client(scenario)
+
+
+def test_distinct_values_since_older_epoch_return_full_list(run_with_client):
+    async def scenario(client):
+        for path in ('/podIDs', '/swarms'):
+            full = (await client.get(path, params={'since': '0'}, headers=NO_CACHE)).json()
+            assert full['full'] is True and full['added']
+            unchanged = await client.get(path, params={'since': full['version']}, headers=NO_CACHE)
+            assert unchanged.status_code == 304
+
+            response = await client.get(path, params={'since': older_epoch(full['version'])}, headers=NO_CACHE)
+            assert response.status_code == 200
+            assert response.json()['full'] is True
+            assert response.json()['added'] == (await client.get(path, headers=NO_CACHE)).json()
+
+    run_with_client(scenario)